@@ -2,6 +2,8 @@
 ASGI config for ExpenseTracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The Procfile serves the WSGI application; ``main.handlers.ASGIHandler``
+keeps the streamed exports working when this one is served.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -9,8 +11,11 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+
+from main.handlers import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ExpenseTracker.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+application = ASGIHandler()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 import os
+import dj_database_url
 import django_heroku
 # from pathlib import Path
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -34,6 +35,7 @@ INSTALLED_APPS = [
     'accounts',
     'userincome',
     'expenses',
+    'userpreferences',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -43,12 +45,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it times everything below it. Server-Timing of a streaming
+    # response (exports) leaves out its body; see the middleware's docstring.
+    'main.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    'main.middleware.StaticFilesMiddleware',
+    'main.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -66,6 +72,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'userpreferences.context_processors.currency',
             ],
         },
     },
@@ -99,6 +106,68 @@ else:
         }
     }
 
+# Read replicas, as comma separated database URLs (e.g. Heroku followers).
+# Summaries, search, trends and exports read from them; see main.routers.
+# Tests mirror them to the default test database.
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))):
+    DATABASES['replica_%d' % index] = dict(dj_database_url.parse(url.strip()), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append('replica_%d' % index)
+DATABASE_ROUTERS = ['main.routers.ReplicaRouter']
+
+# Seconds a user reads from the primary after writing, so they see their
+# own writes while the replicas catch up.
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+REPLICA_PIN_COOKIE = 'pin_primary'
+
+
+# Cache
+# Redis (e.g. Heroku Redis) when REDIS_URL is set, a file cache when
+# CACHE_DIR is set, process-local memory otherwise.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'IGNORE_EXCEPTIONS': True,
+            },
+        }
+    }
+elif os.environ.get('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a cached summary/stats response lives; writes invalidate it sooner.
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 60 * 60))
+
+# Sessions are read from the cache and written through to the database;
+# the logged-in user is cached for AUTH_USER_CACHE_TIMEOUT seconds (see
+# accounts.auth), so a page needs no queries to authenticate the request.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 60 * 60))
+
+# Seconds a process trusts its copy of the categories and sources before
+# checking the shared cache for changes made by other processes.
+LOOKUP_CACHE_TIMEOUT = int(os.environ.get('LOOKUP_CACHE_TIMEOUT', 5 * 60))
+
+
+# Async views run their queries in the shared thread pool so concurrent
+# requests do not queue on one thread. Tests set it to True: their data is
+# only visible on the test thread's connection.
+ASYNC_DB_THREAD_SENSITIVE = os.environ.get('ASYNC_DB_THREAD_SENSITIVE') == 'True'
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -138,6 +207,13 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 EMAIL_PORT = 587
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+
+# Outbound email queue drained by `manage.py send_queued_email`.
+EMAIL_QUEUE_BATCH_SIZE = int(os.environ.get('EMAIL_QUEUE_BATCH_SIZE', 50))
+EMAIL_QUEUE_MAX_ATTEMPTS = int(os.environ.get('EMAIL_QUEUE_MAX_ATTEMPTS', 5))
+EMAIL_QUEUE_RETRY_DELAY = int(os.environ.get('EMAIL_QUEUE_RETRY_DELAY', 60))
+EMAIL_QUEUE_MAX_RETRY_DELAY = int(os.environ.get('EMAIL_QUEUE_MAX_RETRY_DELAY', 60 * 60))
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/3.1/howto/static-files/
@@ -149,5 +225,70 @@ STATICFILES_STORAGE = 'whitenoise.django.GzipManifestStaticFilesStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
+# List pages count at most this many rows per user; 0 disables the count.
+PAGINATION_COUNT_LIMIT = int(os.environ.get('PAGINATION_COUNT_LIMIT', 1000))
+
+# Type-ahead keeps the newest TYPEAHEAD_CANDIDATES matches of each of the
+# last TYPEAHEAD_CACHE_PREFIXES prefixes typed, for the most recent
+# TYPEAHEAD_CACHE_USERS users of the process.
+TYPEAHEAD_CANDIDATES = int(os.environ.get('TYPEAHEAD_CANDIDATES', 100))
+TYPEAHEAD_CACHE_PREFIXES = int(os.environ.get('TYPEAHEAD_CACHE_PREFIXES', 8))
+TYPEAHEAD_CACHE_USERS = int(os.environ.get('TYPEAHEAD_CACHE_USERS', 200))
+
+# Rows per INSERT when importing CSV/OFX/QIF files.
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+
+# Rows fetched per round trip when streaming exports.
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# Per-request timing, SQL accounting and Server-Timing headers; off by default.
+REQUEST_METRICS = (os.environ.get('REQUEST_METRICS') == 'True')
+# Requests slower than this many milliseconds are logged to `main.metrics`.
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+
+# Most create/update/delete operations accepted in one API batch request.
+API_BATCH_LIMIT = int(os.environ.get('API_BATCH_LIMIT', 500))
+
+# /sync returns at most SYNC_PAGE_SIZE changed rows per resource and page,
+# and only rows last written SYNC_SETTLE_SECONDS ago or earlier, so a write
+# committing late cannot land behind a token already handed out. Tombstones
+# older than SYNC_TOMBSTONE_DAYS are purged (purge_tombstones) and tokens
+# older than that answer 410 Gone.
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+SYNC_SETTLE_SECONDS = int(os.environ.get('SYNC_SETTLE_SECONDS', 2))
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', 30))
+
+# Amounts are stored in minor units of their currency (see main.money).
+# Transactions may be in any of CURRENCIES; totals are converted into each
+# user's preferred currency (DEFAULT_CURRENCY until they pick one) with the
+# daily rates loaded by load_fx_rates. Rates are cached per (date, pair)
+# for FX_RATE_CACHE_TIMEOUT seconds, or until the next load.
+DEFAULT_CURRENCY = os.environ.get('DEFAULT_CURRENCY', 'INR')
+CURRENCIES = os.environ.get('CURRENCIES', 'INR,USD,EUR,GBP,JPY').split(',')
+if DEFAULT_CURRENCY not in CURRENCIES:
+    CURRENCIES.insert(0, DEFAULT_CURRENCY)
+FX_RATE_CACHE_TIMEOUT = int(os.environ.get('FX_RATE_CACHE_TIMEOUT', 60 * 60 * 24))
+
 # Activate Django-Heroku.
 django_heroku.settings(locals())
+# It prepends WhiteNoise's own middleware, which is sync only; static files
+# are served by main.middleware.StaticFilesMiddleware in the list above.
+MIDDLEWARE = [name for name in MIDDLEWARE if name != 'whitenoise.middleware.WhiteNoiseMiddleware']
+
+# Database connections stay open DB_CONN_MAX_AGE seconds for later requests
+# (0 closes them after each request); with DB_HEALTH_CHECKS a kept
+# connection is pinged before a request reuses it. DB_POOL=True shares at
+# most DB_POOL_SIZE PostgreSQL connections between the threads of a worker
+# (the ASGI thread pool), waiting up to DB_POOL_TIMEOUT seconds for one.
+# Applied after Django-Heroku, which sets its own CONN_MAX_AGE.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DB_HEALTH_CHECKS = (os.environ.get('DB_HEALTH_CHECKS', 'True') == 'True')
+DB_POOL = (os.environ.get('DB_POOL') == 'True')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+for database in DATABASES.values():
+    if DB_POOL and database['ENGINE'] in ('django.db.backends.postgresql', 'django.db.backends.postgresql_psycopg2'):
+        database['ENGINE'] = 'main.backends.pooled_postgresql'
+        database['CONN_MAX_AGE'] = 0
+    else:
+        database['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
@@ -6,42 +6,78 @@ const paginationContainer = document.querySelector(".pagination-container");
 tableOutput.style.display = "none";
 const noResults = document.querySelector(".no-results");
 const tbody = document.querySelector(".table-body");
+const searchTotal = document.querySelector(".search-total");
 
-searchField.addEventListener("keyup", (e) => {
+const DEBOUNCE_MS = 200;
+const RESULT_LIMIT = 20;
+let debounceTimer = null;
+let pending = null;
+
+const rowTemplate = document.createElement("template");
+rowTemplate.innerHTML = "<tr><td></td><td></td><td></td><td></td><td></td></tr>";
+
+const renderRows = (rows) => {
+  // Build every row off-document, then swap them in at once.
+  const fragment = document.createDocumentFragment();
+  rows.forEach((item) => {
+    const row = rowTemplate.content.firstElementChild.cloneNode(true);
+    const cells = row.children;
+    cells[0].textContent = `${item.amount} ${item.currency}`;
+    cells[1].textContent = item.category_name;
+    cells[2].textContent = item.description;
+    cells[3].textContent = item.date;
+    fragment.appendChild(row);
+  });
+  tbody.replaceChildren(fragment);
+};
+
+const showResults = (data) => {
+  appTable.style.display = "none";
+  if (data.results.length === 0) {
+    noResults.style.display = "block";
+    tableOutput.style.display = "none";
+    return;
+  }
+  noResults.style.display = "none";
+  tableOutput.style.display = "block";
+  renderRows(data.results);
+  searchTotal.textContent = `Showing ${data.results.length} of ${data.total_is_exact ? "" : "about "}${data.total}`;
+};
+
+const search = (searchValue) => {
+  // Only the latest search matters; drop the one still on its way.
+  if (pending) {
+    pending.abort();
+  }
+  pending = new AbortController();
+  const params = new URLSearchParams({ q: searchValue, limit: RESULT_LIMIT });
+  fetch(`/expenses/typeahead?${params}`, { signal: pending.signal })
+    // 409: a newer search from this user replaced this one.
+    .then((res) => (res.ok ? res.json() : null))
+    .then((data) => {
+      if (data !== null) {
+        showResults(data);
+      }
+    })
+    .catch((error) => {
+      if (error.name !== "AbortError") {
+        throw error;
+      }
+    });
+};
+
+searchField.addEventListener("input", (e) => {
   const searchValue = e.target.value;
+  clearTimeout(debounceTimer);
 
   if (searchValue.trim().length > 0) {
     paginationContainer.style.display = "none";
-    tbody.innerHTML = "";
-    fetch("search-expenses", {
-      body: JSON.stringify({ searchText: searchValue }),
-      method: "POST",
-    })
-      .then((res) => res.json())
-      .then((data) => {
-        console.log("data", data);
-        appTable.style.display = "none";
-        tableOutput.style.display = "block";
-
-        console.log("data.length", data.length);
-
-        if (data.length === 0) {
-          noResults.style.display = "block";
-          tableOutput.style.display = "none";
-        } else {
-          noResults.style.display = "none";
-          data.forEach((item) => {
-            tbody.innerHTML += `
-                <tr>
-                <td>${item.amount}</td>
-                <td>${item.category}</td>
-                <td>${item.description}</td>
-                <td>${item.date}</td>
-                </tr>`;
-          });
-        }
-      });
+    debounceTimer = setTimeout(() => search(searchValue), DEBOUNCE_MS);
   } else {
+    if (pending) {
+      pending.abort();
+    }
+    noResults.style.display = "none";
     tableOutput.style.display = "none";
     appTable.style.display = "block";
     paginationContainer.style.display = "block";
@@ -6,55 +6,96 @@ const paginationContainer = document.querySelector(".pagination-container");
 tableOutput.style.display = "none";
 const noResults = document.querySelector(".no-results");
 const tbody = document.querySelector(".table-body");
+const searchTotal = document.querySelector(".search-total");
 
-searchField.addEventListener("keyup", (e) => {
+const DEBOUNCE_MS = 200;
+const RESULT_LIMIT = 20;
+let debounceTimer = null;
+let pending = null;
+
+const rowTemplate = document.createElement("template");
+rowTemplate.innerHTML = `
+  <tr>
+    <td></td>
+    <td></td>
+    <td></td>
+    <td>
+      <div>
+        <a class="btn btn-outline-primary btn-sm">
+          <span font-size="20px">View</span>
+          <svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" fill="currentColor" class="bi bi-eye" viewBox="0 0 16 16">
+            <path d="M16 8s-3-5.5-8-5.5S0 8 0 8s3 5.5 8 5.5S16 8 16 8zM1.173 8a13.133 13.133 0 0 1 1.66-2.043C4.12 4.668 5.88 3.5 8 3.5c2.12 0 3.879 1.168 5.168 2.457A13.133 13.133 0 0 1 14.828 8c-.058.087-.122.183-.195.288-.335.48-.83 1.12-1.465 1.755C11.879 11.332 10.119 12.5 8 12.5c-2.12 0-3.879-1.168-5.168-2.457A13.134 13.134 0 0 1 1.172 8z"/>
+            <path d="M8 5.5a2.5 2.5 0 1 0 0 5 2.5 2.5 0 0 0 0-5zM4.5 8a3.5 3.5 0 1 1 7 0 3.5 3.5 0 0 1-7 0z"/>
+          </svg>
+        </a>
+      </div>
+    </td>
+  </tr>`;
+
+const renderRows = (rows) => {
+  // Build every row off-document, then swap them in at once.
+  const fragment = document.createDocumentFragment();
+  rows.forEach((item) => {
+    const row = rowTemplate.content.firstElementChild.cloneNode(true);
+    const cells = row.children;
+    cells[0].textContent = `${item.amount} ${item.currency}`;
+    cells[1].textContent = item.source_name;
+    cells[2].textContent = item.date;
+    row.querySelector("a").href = `/income/edit-income/${item.id}`;
+    fragment.appendChild(row);
+  });
+  tbody.replaceChildren(fragment);
+};
+
+const showResults = (data) => {
+  appTable.style.display = "none";
+  if (data.results.length === 0) {
+    noResults.style.display = "block";
+    tableOutput.style.display = "none";
+    return;
+  }
+  noResults.style.display = "none";
+  tableOutput.style.display = "block";
+  renderRows(data.results);
+  searchTotal.textContent = `Showing ${data.results.length} of ${data.total_is_exact ? "" : "about "}${data.total}`;
+};
+
+const search = (searchValue) => {
+  // Only the latest search matters; drop the one still on its way.
+  if (pending) {
+    pending.abort();
+  }
+  pending = new AbortController();
+  const params = new URLSearchParams({ q: searchValue, limit: RESULT_LIMIT });
+  fetch(`/income/typeahead?${params}`, { signal: pending.signal })
+    // 409: a newer search from this user replaced this one.
+    .then((res) => (res.ok ? res.json() : null))
+    .then((data) => {
+      if (data !== null) {
+        showResults(data);
+      }
+    })
+    .catch((error) => {
+      if (error.name !== "AbortError") {
+        throw error;
+      }
+    });
+};
+
+searchField.addEventListener("input", (e) => {
   const searchValue = e.target.value;
+  clearTimeout(debounceTimer);
 
   if (searchValue.trim().length > 0) {
     paginationContainer.style.display = "none";
-    tbody.innerHTML = "";
-    fetch("/income/search-income", {
-      body: JSON.stringify({ searchText: searchValue }),
-      method: "POST",
-    })
-      .then((res) => res.json())
-      .then((data) => {
-        console.log("data", data);
-        appTable.style.display = "none";
-        tableOutput.style.display = "block";
-
-        if (data.length === 0) {
-          noResults.style.display = "block";
-          tableOutput.style.display = "none";
-        } else {
-          noResults.style.display = "none";
-          data.forEach((item) => {
-            tbody.innerHTML += `
-              <tr>
-                <td>${item.amount}</td>
-                <td>${item.source}</td>
-                <td>${item.date}</td>
-                <td>
-                  <div>
-                    <a
-                      href="/income/edit-income/${item.id}"
-                      class="btn btn-outline-primary btn-sm"
-                    >
-                      <span font-size="20px">View</span> 
-                      <svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" fill="currentColor" class="bi bi-eye" viewBox="0 0 16 16">
-                        <path d="M16 8s-3-5.5-8-5.5S0 8 0 8s3 5.5 8 5.5S16 8 16 8zM1.173 8a13.133 13.133 0 0 1 1.66-2.043C4.12 4.668 5.88 3.5 8 3.5c2.12 0 3.879 1.168 5.168 2.457A13.133 13.133 0 0 1 14.828 8c-.058.087-.122.183-.195.288-.335.48-.83 1.12-1.465 1.755C11.879 11.332 10.119 12.5 8 12.5c-2.12 0-3.879-1.168-5.168-2.457A13.134 13.134 0 0 1 1.172 8z"/>
-                        <path d="M8 5.5a2.5 2.5 0 1 0 0 5 2.5 2.5 0 0 0 0-5zM4.5 8a3.5 3.5 0 1 1 7 0 3.5 3.5 0 0 1-7 0z"/>
-                      </svg>
-                    </a>
-                  </div>
-                </td>
-              </tr>`;
-          });
-        }
-      });
+    debounceTimer = setTimeout(() => search(searchValue), DEBOUNCE_MS);
   } else {
+    if (pending) {
+      pending.abort();
+    }
+    noResults.style.display = "none";
     tableOutput.style.display = "none";
     appTable.style.display = "block";
     paginationContainer.style.display = "block";
   }
-});
\ No newline at end of file
+});
@@ -1,13 +1,18 @@
-const renderChart = (data, labels) => {
+let myChart = null;
+
+const renderChart = (data, labels, windowLabel) => {
+    if (myChart) {
+      myChart.destroy();
+    }
     var ctx = document.getElementById("myChart").getContext("2d");
-    var myChart = new Chart(ctx, {
+    myChart = new Chart(ctx, {
      
       type: "pie",
       data: {
         labels: labels,
         datasets: [
           {
-            label: "Last 6 months expenses",
+            label: windowLabel,
             data: data,
             backgroundColor: [
               "rgba(255, 99, 132, 0.2)",
@@ -39,23 +44,106 @@ const renderChart = (data, labels) => {
     });
   };
   
+  const windowSelect = document.querySelector("#summaryWindow");
+  const notice = document.querySelector("#summaryNotice");
+  const notices = {};
+
+  // Errors and amounts left out for want of an exchange rate, per chart.
+  const showNotice = (chart, results) => {
+    if (results.error) {
+      notices[chart] = results.error;
+    } else if (!results.complete) {
+      const amounts = Object.entries(results.unconverted).map(([code, amount]) => amount + " " + code);
+      notices[chart] = "Not included, no exchange rate to " + results.currency + " yet: " + amounts.join(", ");
+    } else {
+      delete notices[chart];
+    }
+    const text = [...new Set(Object.values(notices))].join(". ");
+    notice.textContent = text;
+    notice.style.display = text ? "" : "none";
+  };
+
   const getChartData = () => {
-    // console.log("fetching");
-    fetch("income_source_summary")
+    const params = new URLSearchParams(window.location.search);
+    if (windowSelect) {
+      params.set("days", windowSelect.value);
+    }
+    fetch("income_source_summary?" + params.toString())
       .then((res) => res.json())
       .then((results) => {
-        console.log("results", results);
+        showNotice("summary", results);
+        if (results.error) {
+          if (myChart) {
+            myChart.destroy();
+            myChart = null;
+          }
+          return;
+        }
         const category_data = results.income_source_data;
         const [labels, data] = [
           Object.keys(category_data),
-          Object.values(category_data),
+          Object.values(category_data).map(Number),
         ];
-  
-        renderChart(data, labels);
+
+        renderChart(data, labels, "Income (" + results.currency + ") from " + results.start + " to " + results.end);
       });
   };
-  
-  document.onload = getChartData();
 
+  let trendChart = null;
+  const granularitySelect = document.querySelector("#trendGranularity");
 
+  const renderTrend = (results) => {
+    showNotice("trend", results);
+    if (trendChart) {
+      trendChart.destroy();
+      trendChart = null;
+    }
+    if (results.error) {
+      return;
+    }
+    const ctx = document.getElementById("trendChart").getContext("2d");
+    trendChart = new Chart(ctx, {
+      type: "line",
+      data: {
+        labels: results.points.map((point) => point.date),
+        datasets: [
+          {
+            label: "Income from " + results.start + " to " + results.end,
+            data: results.points.map((point) => Number(point.total)),
+            backgroundColor: "rgba(54, 162, 235, 0.2)",
+            borderColor: "rgba(54, 162, 235, 1)",
+            borderWidth: 1,
+            lineTension: 0,
+            pointRadius: 2,
+          },
+        ],
+      },
+      options: {
+        title: {
+          display: true,
+          // The server coarsens the granularity when the window has too many points.
+          text: "Income per " + results.granularity,
+        },
+      },
+    });
+  };
+
+  const getTrendData = () => {
+    const params = new URLSearchParams(window.location.search);
+    if (windowSelect) {
+      params.set("days", windowSelect.value);
+    }
+    params.set("granularity", granularitySelect.value);
+    fetch("income_trend?" + params.toString())
+      .then((res) => res.json())
+      .then(renderTrend);
+  };
+
+  if (windowSelect) {
+    windowSelect.addEventListener("change", getChartData);
+    windowSelect.addEventListener("change", getTrendData);
+  }
+  granularitySelect.addEventListener("change", getTrendData);
 
+  document.onload = getChartData();
+  getTrendData();
@@ -22,4 +22,6 @@ urlpatterns = [
     path('auth/', include('accounts.urls')),
     path('income/', include('userincome.urls')),
     path('expenses/', include('expenses.urls')),
+    path('preferences/', include('userpreferences.urls')),
+    path('api/', include('main.api_urls')),
 ]
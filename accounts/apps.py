@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
 
 
 class AccountsConfig(AppConfig):
     name = 'accounts'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from .auth import user_changed, user_logged_out as logged_out
+        post_save.connect(user_changed, sender=User, dispatch_uid='auth_version_post_save')
+        post_delete.connect(user_changed, sender=User, dispatch_uid='auth_version_post_delete')
+        user_logged_out.connect(logged_out, dispatch_uid='auth_version_logged_out')
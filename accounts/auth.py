@@ -0,0 +1,56 @@
+"""
+Cached loading of the logged-in user.
+
+``django.contrib.auth`` fetches the user row on every request. Here the
+user is cached under the session's auth hash (derived from the password
+hash) and a per-user auth version, after Django has loaded and verified it
+once. Any save or delete of the user (a password change, activation in
+``VerificationView``, ``last_login`` on login) and logging out bump the
+version, which orphans every cached copy of that user at once.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+
+from main.cache import _fresh_version
+
+AUTH_VERSION_KEY = 'auth-version:%s'
+USER_KEY = 'auth-user:%s:%s:%s'
+
+
+def auth_version(user_id):
+    return cache.get_or_set(AUTH_VERSION_KEY % user_id, _fresh_version, None)
+
+
+def bump_auth_version(user_id):
+    try:
+        cache.incr(AUTH_VERSION_KEY % user_id)
+    except ValueError:
+        cache.set(AUTH_VERSION_KEY % user_id, _fresh_version(), None)
+
+
+def get_user(request):
+    """Like ``django.contrib.auth.get_user``, from the cache when possible."""
+    session = request.session
+    if SESSION_KEY not in session or BACKEND_SESSION_KEY not in session:
+        return AnonymousUser()
+    user_id = session[SESSION_KEY]
+    key = USER_KEY % (user_id, auth_version(user_id), session.get(HASH_SESSION_KEY, ''))
+    user = cache.get(key)
+    if user is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+def user_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_auth_version(instance.pk)
+
+
+def user_logged_out(sender, request, user, **kwargs):
+    if user is not None:
+        bump_auth_version(user.pk)
@@ -0,0 +1,81 @@
+"""
+Durable outbound email queue.
+
+Views call ``enqueue_email`` instead of sending inline; the
+``send_queued_email`` management command drains due messages in batches
+over a single backend connection, retrying failures with exponential
+backoff until ``EMAIL_QUEUE_MAX_ATTEMPTS`` is reached.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils.timezone import now
+
+from .models import OutboundEmail
+
+
+def enqueue_email(subject, body, from_email, to):
+    return OutboundEmail.objects.create(subject=subject, body=body, from_email=from_email, to=','.join(to))
+
+
+def retry_delay(attempts):
+    delay = settings.EMAIL_QUEUE_RETRY_DELAY * 2 ** (attempts - 1)
+    return datetime.timedelta(seconds=min(delay, settings.EMAIL_QUEUE_MAX_RETRY_DELAY))
+
+
+def record_failure(email, error, sent_at):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+        email.status = OutboundEmail.FAILED
+    else:
+        email.next_attempt_at = sent_at + retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def send_due_emails(batch_size=None, connection=None):
+    """
+    Send one batch of due messages; returns (sent, failed) counts.
+
+    Rows are locked with SKIP LOCKED where the database supports it, so
+    several workers can drain the queue without sending a message twice.
+    """
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+    sent = failed = 0
+    with transaction.atomic():
+        started = now()
+        due = list(OutboundEmail.objects
+                   .select_for_update(skip_locked=True)
+                   .filter(status=OutboundEmail.PENDING, next_attempt_at__lte=started)
+                   .order_by('next_attempt_at', 'id')[:batch_size])
+        if not due:
+            return sent, failed
+
+        connection = connection or get_connection()
+        try:
+            connection.open()
+        except Exception as ex:
+            for email in due:
+                record_failure(email, ex, started)
+            return sent, len(due)
+
+        try:
+            for email in due:
+                message = EmailMessage(email.subject, email.body, email.from_email, email.recipients,
+                                       connection=connection)
+                try:
+                    message.send(fail_silently=False)
+                except Exception as ex:
+                    record_failure(email, ex, started)
+                    failed += 1
+                    continue
+                email.status = OutboundEmail.SENT
+                email.attempts += 1
+                email.sent_at = now()
+                email.save(update_fields=['status', 'attempts', 'sent_at'])
+                sent += 1
+        finally:
+            connection.close()
+    return sent, failed
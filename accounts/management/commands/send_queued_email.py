@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.mail import send_due_emails
+
+
+class Command(BaseCommand):
+    help = 'Send due messages from the outbound email queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls of an empty queue.')
+        parser.add_argument('--batch-size', type=int, help='Messages per SMTP connection.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_due_emails(options['batch_size'])
+            if sent or failed:
+                self.stdout.write('Sent %d, failed %d' % (sent, failed))
+            if not options['loop']:
+                return
+            if not sent and not failed:
+                time.sleep(options['interval'])
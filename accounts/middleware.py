@@ -0,0 +1,17 @@
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from .auth import get_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """``AuthenticationMiddleware`` loading ``request.user`` through accounts.auth."""
+
+    def process_request(self, request):
+        super().process_request(request)
+
+        def load():
+            if not hasattr(request, '_cached_user'):
+                request._cached_user = get_user(request)
+            return request._cached_user
+        request.user = SimpleLazyObject(load)
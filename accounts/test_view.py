@@ -4,7 +4,11 @@ from django.contrib.messages import get_messages
 from django.contrib.auth.models import User
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
+from django.core import mail
+from accounts.models import OutboundEmail
 from accounts.utils import token_generator
+from main.benchmark import BENCHMARK_PASSWORD
+from main.testing import QueryBudgetMixin
 
 
 class RegistrationView(TestCase):
@@ -22,6 +26,11 @@ class RegistrationView(TestCase):
         }
         response = self.client.post(reverse("register"), self.user)
         self.assertEquals(response.status_code, 200)
+        # the activation email is queued, not sent inside the request
+        self.assertEqual(mail.outbox, [])
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.recipients, ["email@hmail2.com"])
+        self.assertIn("/auth/activate/", queued.body)
 
     def test_should_not_signup_with_invalid_password(self):
         self.user = {
@@ -164,3 +173,48 @@ class VerificationView(TestCase):
         self.assertEqual(response.status_code, 302)
         user = User.objects.get(email='test@gmail.com')
         self.assertFalse(user.is_active)
+
+
+class TestCachedAuthentication(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cached', 'cached@gmail.com', 'password123')
+        self.client.force_login(self.user)
+        self.client.get(reverse('main'))
+
+    def test_cached_session_and_user_need_no_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('main'))
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_password_change_logs_the_session_out(self):
+        self.user.set_password('another-password')
+        self.user.save()
+        self.assertRedirects(self.client.get(reverse('main')), '/auth/login?next=/',
+                             fetch_redirect_response=False)
+
+    def test_deactivation_and_logout_invalidate_the_cached_user(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(reverse('main')).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('main')).status_code, 302)
+
+        self.user.is_active = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.client.post(reverse('logout'))
+        self.assertEqual(self.client.get(reverse('main')).status_code, 302)
+
+
+class AccountsQueryBudgets(QueryBudgetMixin, TestCase):
+
+    def test_views_stay_within_query_budgets(self):
+        user = self.grow_budget_data(0)
+        self.assertQueryBudgets({
+            'login-page': (0, lambda: self.client.get(reverse('login'))),
+            'register-page': (0, lambda: self.client.get(reverse('register'))),
+            'login': (9, lambda: self.client.post(reverse('login'), {'username': user.username,
+                                                                     'password': BENCHMARK_PASSWORD})),
+            'logout': (4, lambda: self.client.post(reverse('logout'))),
+        })
@@ -1,3 +1,51 @@
-# from django.test import TestCase
+import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+
+from accounts.mail import enqueue_email, send_due_emails
+from accounts.models import OutboundEmail
+
+
+@override_settings(EMAIL_QUEUE_MAX_ATTEMPTS=3, EMAIL_QUEUE_RETRY_DELAY=60, EMAIL_QUEUE_MAX_RETRY_DELAY=90)
+class TestEmailQueue(TestCase):
+
+    def test_batch_is_sent_over_one_connection(self):
+        for index in range(3):
+            enqueue_email('Subject %d' % index, 'Body', 'noreply@localhost.com', ['user%d@localhost.com' % index])
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as open_connection:
+            call_command('send_queued_email', batch_size=2, stdout=mock.Mock())
+        self.assertEqual(open_connection.call_count, 1)
+        self.assertEqual([message.to for message in mail.outbox],
+                         [['user0@localhost.com'], ['user1@localhost.com']])
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.SENT).count(), 2)
+
+        self.assertEqual(send_due_emails(), (1, 0))
+        self.assertEqual(send_due_emails(), (0, 0))
+
+    def test_failures_back_off_then_give_up(self):
+        email = enqueue_email('Subject', 'Body', 'noreply@localhost.com', ['user@localhost.com'])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=ConnectionError('smtp down')):
+            self.assertEqual(send_due_emails(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 1, 'smtp down'))
+            self.assertAlmostEqual(email.next_attempt_at, now() + datetime.timedelta(seconds=60),
+                                   delta=datetime.timedelta(seconds=5))
+
+            # not due yet
+            self.assertEqual(send_due_emails(), (0, 0))
+
+            for delay in (90, None):
+                OutboundEmail.objects.update(next_attempt_at=now())
+                send_due_emails()
+                email.refresh_from_db()
+                if delay:
+                    self.assertAlmostEqual(email.next_attempt_at, now() + datetime.timedelta(seconds=delay),
+                                           delta=datetime.timedelta(seconds=5))
+        self.assertEqual((email.status, email.attempts), ('failed', 3))
+        self.assertEqual(mail.outbox, [])
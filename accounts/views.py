@@ -1,13 +1,13 @@
 from django.shortcuts import render, redirect
 from django.views import View
 from django.contrib.auth.models import User
-from django.core.mail import EmailMessage
 from django.contrib import messages
 from django.contrib.sites.shortcuts import get_current_site
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from django.utils.encoding import force_bytes, force_text
 # from django.utils.encoding import force_bytes, force_text, DjangoUnicodeDecodeError
 from django.urls import reverse
+from .mail import enqueue_email
 from .utils import token_generator
 from django.contrib import auth
 # Create your views here.
@@ -47,13 +47,7 @@ class RegistrationView(View):
                 activate_url = 'http://'+domain+link
                 EmailSub = 'Activate your ExpenseTracker account'
                 EmailBody = 'Hi ' + user.username + " Please use this link to verify your account\n" + activate_url
-                email_temp = EmailMessage(
-                    EmailSub,
-                    EmailBody,
-                    'djproject77@gmail.com',
-                    [email],
-                )
-                email_temp.send(fail_silently=False)
+                enqueue_email(EmailSub, EmailBody, 'djproject77@gmail.com', [email])
                 messages.success(request, 'Account successfully created')
                 return render(request, 'accounts/register.html')
             else:
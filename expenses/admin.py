@@ -5,7 +5,8 @@ from .models import Expense, Category
 
 class ExpenseAdmin(admin.ModelAdmin):
     list_display = ('amount', 'description', 'owner', 'category', 'date',)
-    search_fields = ('description', 'category', 'date',)
+    list_select_related = ('owner', 'category')
+    search_fields = ('description', 'category__name', 'date',)
 
     list_per_page = 5
 
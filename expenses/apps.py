@@ -3,3 +3,14 @@ from django.apps import AppConfig
 
 class ExpensesConfig(AppConfig):
     name = 'expenses'
+
+    def ready(self):
+        from main.cache import track_data_version, track_label_version
+        from main.lookups import track_lookup
+        from main.rollups import track_rollups
+        from .models import Category, Expense, ExpenseRollup
+
+        track_rollups(Expense, ExpenseRollup, 'category')
+        track_data_version(Expense)
+        track_label_version(Expense, 'category')
+        track_lookup(Category)
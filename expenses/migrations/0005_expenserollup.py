@@ -0,0 +1,48 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+import django.db.models.deletion
+
+
+def populate_rollups(apps, schema_editor):
+    Expense = apps.get_model('expenses', 'Expense')
+    ExpenseRollup = apps.get_model('expenses', 'ExpenseRollup')
+    grouped = (Expense.objects.order_by()
+               .annotate(rollup_month=TruncMonth('date'))
+               .values('owner_id', 'rollup_month', 'category')
+               .annotate(rollup_total=Sum('amount'), rollup_count=Count('id')))
+    ExpenseRollup.objects.bulk_create(
+        [ExpenseRollup(owner_id=row['owner_id'], month=row['rollup_month'], category=row['category'],
+                       total=row['rollup_total'], count=row['rollup_count']) for row in grouped.iterator()],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('expenses', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('total', models.FloatField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.CharField(max_length=266)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                                            to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='expenserollup',
+            constraint=models.UniqueConstraint(fields=('owner', 'month', 'category'), name='expense_rollup_unique'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
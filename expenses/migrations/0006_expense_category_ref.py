@@ -0,0 +1,26 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+from main.search import install_sqlite_fts
+
+
+def reinstall_search_index(apps, schema_editor):
+    # Undoing this migration remakes expenses_expense on SQLite, dropping the FTS triggers.
+    install_sqlite_fts(schema_editor, 'expenses_expense')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0005_expenserollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.AddField(
+            model_name='expense',
+            name='category_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+',
+                                    to='expenses.category'),
+        ),
+    ]
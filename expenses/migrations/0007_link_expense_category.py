@@ -0,0 +1,53 @@
+from django.db import migrations, transaction
+
+BATCH_SIZE = 5000
+
+
+def link_category_rows(apps, schema_editor):
+    """
+    Point every expense at the Category row named by its text column.
+
+    Works in id-ordered batches of BATCH_SIZE rows and only picks rows
+    that are not linked yet.
+    """
+    Expense = apps.get_model('expenses', 'Expense')
+    Category = apps.get_model('expenses', 'Category')
+    names = set(Expense.objects.order_by().values_list('category', flat=True).distinct())
+    existing = set(Category.objects.values_list('name', flat=True))
+    Category.objects.bulk_create([Category(name=name) for name in sorted(names - existing)])
+    ids = {}
+    for pk, name in Category.objects.order_by('-id').values_list('id', 'name'):
+        ids[name] = pk  # the oldest row wins where names repeat
+
+    pending = Expense.objects.filter(category_ref__isnull=True).order_by('id')
+    while True:
+        batch = list(pending.values_list('id', 'category')[:BATCH_SIZE])
+        if not batch:
+            break
+        by_name = {}
+        for pk, name in batch:
+            by_name.setdefault(name, []).append(pk)
+        with transaction.atomic():
+            for name, pks in by_name.items():
+                Expense.objects.filter(id__in=pks).update(category_ref=ids[name])
+
+
+def unlink_category_rows(apps, schema_editor):
+    Expense = apps.get_model('expenses', 'Expense')
+    Category = apps.get_model('expenses', 'Category')
+    for pk, name in Category.objects.values_list('id', 'name'):
+        Expense.objects.filter(category_ref=pk).update(category=name)
+
+
+class Migration(migrations.Migration):
+    # Not atomic: every batch commits on its own, so a run interrupted on a
+    # large table keeps its progress and `migrate` picks up from there.
+    atomic = False
+
+    dependencies = [
+        ('expenses', '0006_expense_category_ref'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_category_rows, unlink_category_rows),
+    ]
@@ -0,0 +1,83 @@
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+import django.db.models.deletion
+
+from main.search import install_sqlite_fts
+
+
+def populate_rollups(apps, schema_editor):
+    Expense = apps.get_model('expenses', 'Expense')
+    ExpenseRollup = apps.get_model('expenses', 'ExpenseRollup')
+    ExpenseRollup.objects.all().delete()
+    grouped = (Expense.objects.order_by()
+               .annotate(rollup_month=TruncMonth('date'))
+               .values('owner_id', 'rollup_month', 'category_id')
+               .annotate(rollup_total=Sum('amount'), rollup_count=Count('id')))
+    ExpenseRollup.objects.bulk_create(
+        [ExpenseRollup(owner_id=row['owner_id'], month=row['rollup_month'], category_id=row['category_id'],
+                       total=row['rollup_total'], count=row['rollup_count']) for row in grouped.iterator()],
+        batch_size=1000)
+
+
+def clear_rollups(apps, schema_editor):
+    # Rollups are rebuilt from the linked rows below; undoing leaves them empty
+    # until `manage.py rebuild_rollups` runs against the restored schema.
+    apps.get_model('expenses', 'ExpenseRollup').objects.all().delete()
+
+
+def reinstall_search_index(apps, schema_editor):
+    # SQLite remade expenses_expense above, which dropped the FTS triggers.
+    install_sqlite_fts(schema_editor, 'expenses_expense')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0007_link_expense_category'),
+    ]
+
+    operations = [
+        # A default lets the text column be re-added to existing rows when
+        # this migration is undone; the link migration then refills it.
+        migrations.AlterField(
+            model_name='expense',
+            name='category',
+            field=models.CharField(default='', max_length=266),
+        ),
+        migrations.RemoveField(
+            model_name='expense',
+            name='category',
+        ),
+        migrations.RenameField(
+            model_name='expense',
+            old_name='category_ref',
+            new_name='category',
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='expenses.category'),
+        ),
+        migrations.RunPython(clear_rollups, clear_rollups),
+        migrations.RemoveConstraint(
+            model_name='expenserollup',
+            name='expense_rollup_unique',
+        ),
+        migrations.RemoveField(
+            model_name='expenserollup',
+            name='category',
+        ),
+        migrations.AddField(
+            model_name='expenserollup',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                                    to='expenses.category'),
+        ),
+        migrations.AddConstraint(
+            model_name='expenserollup',
+            constraint=models.UniqueConstraint(fields=('owner', 'month', 'category'), name='expense_rollup_unique'),
+        ),
+        migrations.RunPython(populate_rollups, clear_rollups),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:49
+
+from django.db import migrations, models
+import main.money
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0010_amount_minor_units'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='expenserollup',
+            name='expense_rollup_unique',
+        ),
+        migrations.AddField(
+            model_name='expenserollup',
+            name='currency',
+            field=models.CharField(default='INR', max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='currency',
+            field=models.CharField(default='INR', max_length=3, validators=[main.money.validate_currency]),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', 'currency', 'date'], name='expense_owner_currency_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='expenserollup',
+            constraint=models.UniqueConstraint(
+                fields=('owner', 'month', 'category', 'currency'),
+                name='expense_rollup_unique',
+            ),
+        ),
+    ]
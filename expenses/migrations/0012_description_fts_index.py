@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from main.search import drop_postgres_fts, install_postgres_fts
+
+
+def create_fts_index(apps, schema_editor):
+    install_postgres_fts(schema_editor, 'expenses_expense')
+
+
+def drop_fts_index(apps, schema_editor):
+    drop_postgres_fts(schema_editor, 'expenses_expense')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0011_currency_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -1,22 +1,32 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.timezone import now
+from main.models import MoneyAmount, MonthlyRollup, SyncedTransaction
 
 # Create your models here.
 
 
-class Expense(models.Model):
-    amount = models.FloatField()
+class Expense(MoneyAmount, SyncedTransaction):
     date = models.DateField(default=now)
     description = models.TextField()
     owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
-    category = models.CharField(max_length=266)
+    category = models.ForeignKey(to='Category', on_delete=models.PROTECT)
 
     def __str__(self):
-        return self.category
+        return str(self.category)
+
+    @property
+    def category_name(self):
+        return self.category.name
 
     class Meta:
-        ordering: ['-date']  # noqa: F821
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['owner', 'date', 'id'], name='expense_owner_date_idx'),
+            models.Index(fields=['owner', 'updated_at', 'id'], name='expense_owner_updated_idx'),
+            models.Index(fields=['owner', 'amount_minor'], name='expense_owner_amount_idx'),
+            models.Index(fields=['owner', 'currency', 'date'], name='expense_owner_currency_idx'),
+        ]
 
 
 class Category(models.Model):
@@ -27,3 +37,15 @@ class Category(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class ExpenseRollup(MonthlyRollup):
+    category = models.ForeignKey(to=Category, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'month', 'category', 'currency'], name='expense_rollup_unique'),
+        ]
+
+    def __str__(self):
+        return '%s %s' % (self.month, self.category_id)
@@ -1,6 +1,13 @@
+import datetime
+from unittest import skipUnless
+from django.db import connection
 from django.test import TestCase
 from django.contrib.auth.models import User
-from expenses.models import Expense, Category
+from io import StringIO
+from django.core.management import call_command
+from expenses.models import Expense, ExpenseRollup, Category
+from main.search import PostgresSearchBackend, parse_query
+from main.summary import totals_by
 
 
 class TestSourceModel(TestCase):
@@ -28,7 +35,7 @@ class TestUserIncomeModel(TestCase):
     def setUp(self):
         self.owner = User.objects.create(username='admin')
         self.data1 = Expense.objects.create(amount=1, description='test description',
-                                            owner=self.owner, category="django")
+                                            owner=self.owner, category=Category.objects.create(name='django'))
 
     def test_source_model_entry(self):
         """
@@ -37,3 +44,125 @@ class TestUserIncomeModel(TestCase):
         data = self.data1
         self.assertTrue(isinstance(data, Expense))
         self.assertEqual(str(data), 'django')
+
+
+class TestExpenseQuerySet(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create(username='admin')
+        self.other = User.objects.create(username='other')
+        food = Category.objects.create(name='FOOD')
+        for day in (1, 10, 20):
+            Expense.objects.create(amount=day, description='d', owner=self.owner,
+                                   category=food, date=datetime.date(2021, 5, day))
+        Expense.objects.create(amount=5, description='d', owner=self.other,
+                               category=food, date=datetime.date(2021, 5, 10))
+
+    def test_for_owner_between(self):
+        """
+        Test owner/date range filtering and default newest-first ordering
+        """
+        expenses = Expense.objects.for_owner(self.owner).between(
+            datetime.date(2021, 5, 5), datetime.date(2021, 5, 31))
+        self.assertEqual([e.amount for e in expenses], [20, 10])
+
+    def test_owner_date_range_uses_index(self):
+        """
+        Test the owner/date range query is answered from the composite index
+        """
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan TO off')
+        plan = Expense.objects.for_owner(self.owner).between(
+            datetime.date(2021, 5, 5), datetime.date(2021, 5, 31)).explain()
+        self.assertIn('expense_owner_date_idx', plan)
+
+    @skipUnless(connection.vendor == 'postgresql', 'the full-text index is Postgres only')
+    def test_full_text_match_uses_index(self):
+        """
+        Test the full-text match is answered from the GIN index on its tsvector
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan TO off')
+        backend, query = PostgresSearchBackend(), parse_query('dinner')
+        expenses = backend.prepare(Expense.objects.all(), query)
+        plan = expenses.filter(backend.text_filter(expenses, query)).explain()
+        self.assertIn('expenses_expense_description_fts', plan)
+
+
+class TestExpenseRollup(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create(username='admin')
+        self.food = Category.objects.create(name='FOOD')
+        self.rent = Category.objects.create(name='RENT')
+
+    def rollups(self):
+        return sorted(ExpenseRollup.objects.filter(owner=self.owner)
+                      .values_list('month', 'category__name', 'total_minor', 'count'))
+
+    def test_rollups_follow_create_edit_delete(self):
+        """
+        Test rollup buckets are adjusted incrementally on every write
+        """
+        may, june = datetime.date(2021, 5, 1), datetime.date(2021, 6, 1)
+        rent = Expense.objects.create(amount=700, description='rent', owner=self.owner,
+                                      category=self.rent, date=datetime.date(2021, 5, 2))
+        food = Expense.objects.create(amount=20, description='food', owner=self.owner,
+                                      category=self.food, date=datetime.date(2021, 5, 3))
+        self.assertEqual(self.rollups(), [(may, 'FOOD', 2000, 1), (may, 'RENT', 70000, 1)])
+
+        food.amount = '25'
+        food.save()
+        rent.date = '2021-06-02'
+        rent.category_id = str(self.food.pk)
+        rent.save()
+        self.assertEqual(self.rollups(), [(may, 'FOOD', 2500, 1), (june, 'FOOD', 70000, 1)])
+
+        food.delete()
+        self.assertEqual(self.rollups(), [(june, 'FOOD', 70000, 1)])
+
+    def test_rebuild_command_matches_incremental_state(self):
+        """
+        Test rebuild_rollups recomputes the table from raw rows
+        """
+        Expense.objects.create(amount=5, description='a', owner=self.owner,
+                               category=self.food, date=datetime.date(2021, 5, 2))
+        Expense.objects.bulk_create([Expense(amount=1, description='b', owner=self.owner,
+                                             category=self.food, date=datetime.date(2021, 5, 9))])
+        self.assertEqual(self.rollups(), [(datetime.date(2021, 5, 1), 'FOOD', 500, 1)])
+
+        call_command('rebuild_rollups', user='admin', stdout=StringIO())
+        self.assertEqual(self.rollups(), [(datetime.date(2021, 5, 1), 'FOOD', 600, 2)])
+
+    def test_summary_combines_rollups_and_edge_days(self):
+        """
+        Test summaries read whole months from rollups and partial months from raw rows
+        """
+        for day, amount in [(datetime.date(2021, 4, 30), 1), (datetime.date(2021, 5, 1), 10),
+                            (datetime.date(2021, 6, 30), 100), (datetime.date(2021, 7, 1), 1000),
+                            (datetime.date(2021, 7, 2), 10000)]:
+            Expense.objects.create(amount=amount, description='x', owner=self.owner, category=self.food, date=day)
+        expenses = Expense.objects.for_owner(self.owner)
+        rollups = ExpenseRollup.objects.filter(owner=self.owner)
+        for start, end, total in [(datetime.date(2021, 4, 30), datetime.date(2021, 7, 1), 1111),
+                                  (datetime.date(2021, 5, 1), datetime.date(2021, 6, 30), 110),
+                                  (datetime.date(2021, 5, 2), datetime.date(2021, 6, 29), None),
+                                  (datetime.date(2021, 4, 1), datetime.date(2021, 7, 31), 11111)]:
+            expected = {'FOOD': total} if total else {}
+            self.assertEqual(totals_by(expenses, 'category', start, end, rollups, 'category__name'), expected)
+            self.assertEqual(totals_by(expenses, 'category', start, end, label='category__name'), expected)
+
+    def test_category_rename_updates_one_row(self):
+        """
+        Test renaming a category touches only its own row and shows up in summaries
+        """
+        Expense.objects.create(amount=5, description='a', owner=self.owner,
+                               category=self.food, date=datetime.date(2021, 5, 2))
+        self.food.name = 'Groceries'
+        with self.assertNumQueries(2):  # its row; the owners whose cached responses name it
+            self.food.save()
+        expenses = Expense.objects.for_owner(self.owner)
+        rollups = ExpenseRollup.objects.filter(owner=self.owner)
+        self.assertEqual(totals_by(expenses, 'category', datetime.date(2021, 5, 1), datetime.date(2021, 5, 31),
+                                   rollups, 'category__name'), {'Groceries': 5})
@@ -1,17 +1,30 @@
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 from expenses.models import Expense, Category
 from django.test import Client
+from django.core.cache import cache
 import datetime
+from decimal import Decimal
+from django.core.files.uploadedfile import SimpleUploadedFile
+from expenses.models import ExpenseRollup
+from main.testing import QueryBudgetMixin
+from main.typeahead import prefix_cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 
+@override_settings(ASYNC_DB_THREAD_SENSITIVE=True)
 class TestExpense(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.user = User.objects.create_user("sahil", "sahilharpal1234@gmail.com", "password123")
         self.user2 = User.objects.create_user("sahil2", "sahilharpal12345@gmail.com", "password1234")
         self.source = Category.objects.create(name='django')
+        self.rent = Category.objects.create(name='RENT')
+        self.food = Category.objects.create(name='FOOD')
         self.view_expense_url = reverse('expenses')
         self.add_expense_url = reverse('add-expenses')
 
@@ -19,7 +32,7 @@ class TestExpense(TestCase):
               'amount': 1000,
               'description': "Hello World",
               'date': datetime.date.today(),
-              'category': 'RENT',
+              'category': self.rent.pk,
               'owner': User.objects.first(),
         }
         self.updated_expense = {'amount': 500,
@@ -30,7 +43,7 @@ class TestExpense(TestCase):
         ex = Expense(amount=1000,
                      description="Hello World",
                      date=datetime.date.today(),
-                     category='RENT',
+                     category=self.rent,
                      owner=self.user)
         ex.save()
 
@@ -62,7 +75,7 @@ class TestExpense(TestCase):
                 'amount': 1000,
                 'description': "Hello World",
                 'expense_date': datetime.date.today(),
-                'category': 'RENT',
+                'category': self.rent.pk,
                 'owner': self.user,
             }, format='text/html')
         created_expense = Expense.objects.filter(owner=self.user).order_by('-id')
@@ -72,7 +85,24 @@ class TestExpense(TestCase):
         self.assertEqual(created_expense[0].owner, self.user)
         self.assertEqual(created_expense[0].amount, 1000)
         self.assertEqual(created_expense[0].description, 'Hello World')
-        self.assertEqual(created_expense[0].category, 'RENT')
+        self.assertEqual(created_expense[0].category.name, 'RENT')
+
+    def test_add_expense_rejects_invalid_amount(self):
+        self.client.login(username='sahil', password='password123')
+        response = self.client.post(reverse('add-expenses'), {
+            'amount': '12,50', 'description': 'Lunch', 'expense_date': datetime.date.today(),
+            'category': self.rent.pk})
+        self.assertContains(response, 'Amount must be a number')
+        self.assertFalse(Expense.objects.filter(owner=self.user).exists())
+
+    def test_add_expense_validates_category_from_lookup_cache(self):
+        self.client.login(username='sahil', password='password123')
+        self.client.get(reverse('add-expenses'))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('add-expenses'), {
+                'amount': 10, 'description': 'Lunch', 'expense_date': datetime.date.today(), 'category': 999})
+        self.assertContains(response, 'Choose a category')
+        self.assertFalse([query for query in context if 'expenses_category' in query['sql']])
 
     # def test_get_edit_others_expense(self):
     #     self.client.login(username='sahil2', password='password1234')
@@ -106,7 +136,7 @@ class TestExpense(TestCase):
                 'amount': 500,
                 'description': "Update Hello World",
                 'expense_date': datetime.date.today(),
-                'category': 'RENT',
+                'category': self.rent.pk,
                 'owner': self.user,
             }, format='text/html')
         updated_expense = Expense.objects.filter(owner=self.user).order_by('-id')
@@ -115,7 +145,7 @@ class TestExpense(TestCase):
         self.assertEqual(updated_expense[0].owner, self.user)
         self.assertEqual(updated_expense[0].amount, 500)
         self.assertEqual(updated_expense[0].description, 'Update Hello World')
-        self.assertEqual(updated_expense[0].category, 'RENT')
+        self.assertEqual(updated_expense[0].category.name, 'RENT')
         self.assertEqual(updated_expense[0].date, datetime.date.today())
 
     # def test_delete_own_expense(self):
@@ -166,3 +196,370 @@ class TestExpense(TestCase):
     #                           format='json')
     #     self.assertEqual(res.data['id'], created_expense.id)
     #     self.assertEqual(res.status_code, 200)
+
+    def test_category_summary_groups_in_one_query(self):
+        self.client.login(username='sahil', password='password123')
+        today = datetime.date.today()
+        for amount, category in [(10, self.rent), (15, self.rent), (7, self.food)]:
+            Expense.objects.create(amount=amount, description='x', date=today,
+                                   category=category, owner=self.user)
+        Expense.objects.create(amount=99, description='old', category=self.rent, owner=self.user,
+                               date=today - datetime.timedelta(days=400))
+        Expense.objects.create(amount=99, description='other', date=today,
+                               category=self.rent, owner=self.user2)
+
+        with self.assertNumQueries(5):  # user, base currency, rollup months, edge days, other currencies
+            response = self.client.get(reverse('expense_category_summary'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['expense_category_data'], {'RENT': '25.00', 'FOOD': '7.00'})
+
+        response = self.client.get(reverse('expense_category_summary'), {'days': 500})
+        self.assertEqual(response.json()['expense_category_data'], {'RENT': '124.00', 'FOOD': '7.00'})
+
+    async def test_search_and_summary_over_asgi(self):
+        await sync_to_async(self.create_expense)()
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.post(reverse('search_expenses'), {'searchText': 'hello'},
+                                                content_type='application/json')
+        self.assertEqual([row['category_name'] for row in response.json()], ['RENT'])
+        response = await self.async_client.get(reverse('expense_category_summary'))
+        self.assertEqual(response.json()['expense_category_data'], {'RENT': '1000.00'})
+
+    def test_typeahead_narrows_cached_prefix(self):
+        self.client.login(username='sahil', password='password123')
+        prefix_cache.clear()
+        today = datetime.date.today()
+        for description, category in [('Coffee beans', self.food), ('Cola', self.food), ('Corner shop', self.rent)]:
+            Expense.objects.create(amount=5, description=description, date=today, category=category,
+                                   owner=self.user)
+
+        response = self.client.get(reverse('typeahead_expenses'), {'q': 'co'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual((response.json()['total'], response.json()['total_is_exact']), (3, True))
+        with self.assertNumQueries(0):  # session and user cached
+            response = self.client.get(reverse('typeahead_expenses'), {'q': 'Cof'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual([row['description'] for row in response.json()['results']], ['Coffee beans'])
+        response = self.client.get(reverse('typeahead_expenses'), {'q': 'co', 'limit': 1})
+        self.assertEqual((len(response.json()['results']), response.json()['total']), (1, 3))
+
+        self.create_expense()
+        response = self.client.get(reverse('typeahead_expenses'), {'q': 'cof'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    @override_settings(TYPEAHEAD_CANDIDATES=4)
+    def test_typeahead_estimates_total_from_cut_off_candidates(self):
+        self.client.login(username='sahil', password='password123')
+        prefix_cache.clear()
+        for day in range(10):
+            Expense.objects.create(amount=5, description='Food market' if day % 2 else 'Foot massage',
+                                   date=datetime.date(2021, 5, day + 1), category=self.rent, owner=self.user)
+
+        response = self.client.get(reverse('typeahead_expenses'), {'q': 'foo'})
+        self.assertEqual((len(response.json()['results']), response.json()['total']), (4, 10))
+        response = self.client.get(reverse('typeahead_expenses'), {'q': 'food', 'limit': 2})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual([row['date'] for row in response.json()['results']], ['2021-05-10', '2021-05-08'])
+        self.assertEqual((response.json()['total'], response.json()['total_is_exact']), (5, False))
+        # Too few cached candidates left for the limit: ask the database.
+        response = self.client.get(reverse('typeahead_expenses'), {'q': 'food', 'limit': 3})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual((response.json()['total'], response.json()['total_is_exact']), (5, True))
+
+    def test_search_requires_login(self):
+        response = self.client.post(reverse('search_expenses'), {'searchText': 'hello'},
+                                    content_type='application/json')
+        self.assertRedirects(response, '/auth/login?next=/expenses/search-expenses', fetch_redirect_response=False)
+
+    def test_expense_trend_buckets_in_the_database(self):
+        self.client.login(username='sahil', password='password123')
+        for month, day, amount in [(5, 4, 10), (5, 4, 5), (5, 13, 7), (6, 10, 1)]:
+            Expense.objects.create(amount=amount, description='x', date=datetime.date(2021, month, day),
+                                   category=self.rent, owner=self.user)
+        window = {'start': '2021-05-01', 'end': '2021-06-30'}
+
+        with self.assertNumQueries(4):  # user, base currency, grouped sums, other currencies
+            response = self.client.get(reverse('expense_trend'), dict(window, granularity='month'))
+        self.assertEqual(response.json()['points'], [{'date': '2021-05-01', 'total': '22.00', 'count': 3},
+                                                     {'date': '2021-06-01', 'total': '1.00', 'count': 1}])
+
+        response = self.client.get(reverse('expense_trend'), dict(window, granularity='day', points=10))
+        self.assertEqual(response.json()['granularity'], 'week')
+        points = response.json()['points']
+        self.assertEqual((len(points), points[0]['date']), (10, '2021-04-26'))
+        self.assertEqual([point['total'] for point in points[1:3]], ['15.00', '7.00'])
+        self.assertEqual(sum(Decimal(point['total']) for point in points), 23)
+
+        response = self.client.get(reverse('expense_trend'), dict(window, granularity='hour'))
+        self.assertEqual(response.status_code, 400)
+
+        for url_name in ('expense_trend', 'expense_category_summary'):
+            response = self.client.get(reverse(url_name), {'end': '9999-12-31', 'days': 30, 'granularity': 'month'})
+            self.assertEqual(response.status_code, 200)
+
+    def test_category_summary_rejects_bad_window(self):
+        self.client.login(username='sahil', password='password123')
+        response = self.client.get(reverse('expense_category_summary'),
+                                   {'start': '2021-05-01', 'end': '2021-04-01'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('expense_category_summary'), {'end': '0001-01-05', 'days': 10})
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_expenses_matches_text_amount_and_date(self):
+        self.client.login(username='sahil', password='password123')
+        groceries = Expense.objects.create(amount=12.5, description='Groceries at the market',
+                                           date=datetime.date(2021, 5, 3), category=self.food, owner=self.user)
+        rent = Expense.objects.create(amount=700, description='May rent',
+                                      date=datetime.date(2021, 6, 1), category=self.rent, owner=self.user)
+        Expense.objects.create(amount=12, description='Groceries', date=datetime.date(2021, 5, 3),
+                               category=self.food, owner=self.user2)
+
+        def ids(search_text, **extra):
+            response = self.client.post(reverse('search_expenses'), dict(searchText=search_text, **extra),
+                                        content_type='application/json')
+            return [row['id'] for row in response.json()]
+
+        self.assertEqual(ids('groc'), [groceries.id])
+        self.assertEqual(ids('market'), [groceries.id])
+        self.assertEqual(ids('12'), [groceries.id])
+        self.assertEqual(ids('2021-06'), [rent.id])
+        self.assertEqual(ids('rent'), [rent.id])
+        self.assertEqual(ids('2021', limit=1), [rent.id])
+        self.assertEqual(ids('2021', limit=1, offset=1), [groceries.id])
+
+        groceries.description = 'Weekly shop'
+        groceries.save()
+        self.assertEqual(ids('groc'), [])
+        self.assertEqual(ids('weekly'), [groceries.id])
+
+    def test_expense_pages_walk_by_cursor(self):
+        self.client.login(username='sahil', password='password123')
+        start = datetime.date(2021, 1, 1)
+        created = [Expense.objects.create(amount=i, description='d', category=self.food, owner=self.user,
+                                          date=start + datetime.timedelta(days=i // 2))
+                   for i in range(7)]
+        newest_first = [e.id for e in sorted(created, key=lambda e: (e.date, e.id), reverse=True)]
+
+        first = self.client.get(reverse('expenses-page'), {'limit': 3}).json()
+        self.assertEqual([row['id'] for row in first['results']], newest_first[:3])
+        self.assertEqual((first['previous'], first['count']), (None, 7))
+
+        second = self.client.get(reverse('expenses-page'), {'limit': 3, 'cursor': first['next']}).json()
+        self.assertEqual([row['id'] for row in second['results']], newest_first[3:6])
+
+        last = self.client.get(reverse('expenses-page'), {'limit': 3, 'cursor': second['next']}).json()
+        self.assertEqual([row['id'] for row in last['results']], newest_first[6:])
+        self.assertIsNone(last['next'])
+
+        back = self.client.get(reverse('expenses-page'), {'limit': 3, 'cursor': last['previous']}).json()
+        self.assertEqual(back['results'], second['results'])
+
+    def test_expense_index_query_count_is_constant(self):
+        self.client.login(username='sahil', password='password123')
+        Expense.objects.bulk_create([Expense(amount=i, description='d', category=self.food, owner=self.user)
+                                     for i in range(50)])
+        # user, base currency, one page of rows, one bounded count; the session is cached
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('expenses'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 5)
+        self.assertContains(response, 'Showing 5 of 50 expenses')
+
+    def test_category_summary_is_cached_until_the_next_write(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.login(username='sahil', password='password123')
+        Expense.objects.create(amount=10, description='x', category=self.food, owner=self.user)
+
+        first = self.client.get(reverse('expense_category_summary'))
+        with self.assertNumQueries(0):  # session and user cached
+            second = self.client.get(reverse('expense_category_summary'))
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first.content, second.content)
+
+        self.client.post(reverse('add-expenses'), {'amount': 5, 'description': 'more', 'category': self.food.pk,
+                                                   'expense_date': datetime.date.today()})
+        third = self.client.get(reverse('expense_category_summary'))
+        self.assertEqual(third['X-Cache'], 'MISS')
+        self.assertEqual(third.json()['expense_category_data'], {'FOOD': '15.00'})
+
+        self.food.name = 'GROCERIES'
+        self.food.save()
+        fourth = self.client.get(reverse('expense_category_summary'))
+        self.assertEqual(fourth['X-Cache'], 'MISS')
+        self.assertEqual(fourth.json()['expense_category_data'], {'GROCERIES': '15.00'})
+
+        stats = self.client.get(reverse('cache-stats')).json()['response_cache']
+        self.assertEqual(stats['expense_category_summary'], {'hits': 1, 'misses': 3})
+
+    def test_import_expenses_from_csv(self):
+        self.client.login(username='sahil', password='password123')
+        csv_file = SimpleUploadedFile('history.csv', (
+            'date,amount,description,category\n'
+            '2021-05-01,12.50,Lunch,FOOD\n'
+            '2021-05-02,abc,Broken,FOOD\n'
+            '2021-05-03,7,Unknown,TOYS\n'
+            '2021-05-04,3,Fallback,\n'
+            '2021-06-01,8,Dinner,django\n').encode())
+
+        with self.settings(IMPORT_BATCH_SIZE=2):
+            response = self.client.post(reverse('import-expenses'), {'file': csv_file, 'category': self.food.pk})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 3)
+        self.assertEqual(response.context['result'].errors,
+                         [(3, "invalid amount 'abc'"), (4, "unknown category 'TOYS'")])
+        self.assertEqual(sorted(Expense.objects.filter(owner=self.user).values_list('description', 'category__name')),
+                         [('Dinner', 'django'), ('Fallback', 'FOOD'), ('Lunch', 'FOOD')])
+        rollups = ExpenseRollup.objects.filter(owner=self.user).values_list('category__name', 'total_minor')
+        self.assertEqual(sorted(rollups), [('FOOD', 1550), ('django', 800)])
+
+    def test_import_expenses_rejects_csv_without_header(self):
+        self.client.login(username='sahil', password='password123')
+        csv_file = SimpleUploadedFile('history.csv', b'2021-05-01,12.50,Lunch,FOOD\n')
+        response = self.client.post(reverse('import-expenses'), {'file': csv_file})
+        self.assertEqual(Expense.objects.count(), 0)
+        self.assertContains(response, 'CSV header is missing')
+
+    def test_import_expenses_rejects_unreadable_csv(self):
+        self.client.login(username='sahil', password='password123')
+        csv_file = SimpleUploadedFile('history.csv', ('date,amount,description,category\n'
+                                                      '2021-05-01,12.50,Lunch,FOOD\n'
+                                                      '2021-05-02,3,"%s",FOOD\n' % ('x' * 200000)).encode())
+        response = self.client.post(reverse('import-expenses'), {'file': csv_file})
+        self.assertEqual(Expense.objects.count(), 0)
+        self.assertContains(response, 'field larger than field limit')
+
+    def test_export_expenses_streams_filtered_csv(self):
+        self.client.login(username='sahil', password='password123')
+        for day, category in [(1, self.food), (2, self.rent), (3, self.food), (20, self.food)]:
+            Expense.objects.create(amount=day, description='item, %d' % day, category=category,
+                                   owner=self.user, date=datetime.date(2021, 5, day))
+        Expense.objects.create(amount=99, description='other', category=self.food, owner=self.user2,
+                               date=datetime.date(2021, 5, 2))
+
+        response = self.client.get(reverse('export-expenses'),
+                                   {'start': '2021-05-01', 'end': '2021-05-10', 'category': self.food.pk})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="expenses.csv"')
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), [
+            'Date,Category,Description,Amount,Currency',
+            '2021-05-01,FOOD,"item, 1",1.00,INR',
+            '2021-05-03,FOOD,"item, 3",3.00,INR',
+        ])
+
+    def test_api_lists_selected_fields_with_etag(self):
+        self.assertEqual(self.client.get(reverse('api-expenses')).status_code, 401)
+        self.client.login(username='sahil', password='password123')
+        for day in (1, 2, 3):
+            Expense.objects.create(amount=day, description='item %d' % day, category=self.source,
+                                   owner=self.user, date=datetime.date(2021, 5, day))
+
+        response = self.client.get(reverse('api-expenses'), {'fields': 'id,amount', 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([set(row) for row in data['results']], [{'id', 'amount'}] * 2)
+        self.assertEqual([row['amount'] for row in data['results']], ['3.00', '2.00'])
+        self.assertIsNotNone(data['next'])
+
+        etag = response['ETag']
+        response = self.client.get(reverse('api-expenses'), {'fields': 'id,amount', 'limit': 2},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        self.create_expense()
+        response = self.client.get(reverse('api-expenses'), {'fields': 'id,amount', 'limit': 2},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.client.get(reverse('api-expenses'), {'fields': 'id,owner'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_batch_applies_all_operations_or_none(self):
+        self.client.login(username='sahil', password='password123')
+        keep = Expense.objects.create(amount=10, description='keep', category=self.source, owner=self.user,
+                                      date=datetime.date(2021, 5, 1))
+        drop = Expense.objects.create(amount=20, description='drop', category=self.source, owner=self.user,
+                                      date=datetime.date(2021, 5, 2))
+        foreign = Expense.objects.create(amount=30, description='foreign', category=self.source, owner=self.user2,
+                                         date=datetime.date(2021, 5, 3))
+        batch_url = reverse('api-expenses-batch')
+
+        response = self.client.post(batch_url, {
+            'create': [{'amount': 5, 'date': '2021-05-04', 'description': 'new', 'category': self.source.pk}],
+            'update': [{'id': keep.pk, 'amount': 11}, {'id': foreign.pk, 'amount': 0}],
+            'delete': [drop.pk],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'],
+                         [{'operation': 'update', 'index': 1, 'errors': {'id': ['not found']}}])
+        self.assertEqual(Expense.objects.filter(owner=self.user).count(), 2)
+
+        response = self.client.post(batch_url + '?fields=id,amount', {
+            'create': [{'amount': 5, 'date': '2021-05-04', 'description': 'new', 'category': self.source.pk},
+                       {'amount': 'x', 'date': '2021-05-04', 'description': 'bad', 'category': 'nope'}],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors'][0]['errors']), {'amount'})
+        self.assertFalse(Expense.objects.filter(description='new').exists())
+
+        response = self.client.post(batch_url + '?fields=id,amount', {
+            'create': [{'amount': 5, 'date': '2021-05-04', 'description': 'new', 'category': self.source.pk}],
+            'update': [{'id': keep.pk, 'amount': 11}],
+            'delete': [drop.pk],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        created = Expense.objects.get(description='new')
+        self.assertEqual(data, {'created': [{'id': created.pk, 'amount': '5.00'}],
+                                'updated': [{'id': keep.pk, 'amount': '11.00'}],
+                                'deleted': [drop.pk]})
+        self.assertEqual(sorted(ExpenseRollup.objects.filter(owner=self.user).values_list('month', 'total_minor')),
+                         [(datetime.date(2021, 5, 1), 1600)])
+
+    def test_api_batch_ids_are_not_booleans(self):
+        self.client.login(username='sahil', password='password123')
+        Expense.objects.create(pk=1, amount=10, description='first', category=self.source, owner=self.user,
+                               date=datetime.date(2021, 5, 1))
+        response = self.client.post(reverse('api-expenses-batch'), {
+            'update': [{'id': True, 'amount': 11}],
+            'delete': [True],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'],
+                         [{'operation': 'update', 'index': 0, 'errors': {'id': ['not found']}},
+                          {'operation': 'delete', 'index': 0, 'errors': {'id': ['not found']}}])
+        self.assertTrue(Expense.objects.filter(pk=1, amount_minor=1000).exists())
+
+    def test_api_batch_requires_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.login(username='sahil', password='password123')
+        response = client.post(reverse('api-expenses-batch'), {'delete': []}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(ASYNC_DB_THREAD_SENSITIVE=True)
+class TestExpenseQueryBudgets(QueryBudgetMixin, TestCase):
+
+    def test_views_stay_within_query_budgets(self):
+        user = self.grow_budget_data(0)
+        food = Category.objects.get(name='Food')
+        expense = Expense.objects.create(amount=1, description='edit me', category=food, owner=user)
+        self.client.force_login(user)
+        self.assertQueryBudgets({
+            'expenses': (4, lambda: self.client.get(reverse('expenses'))),
+            'expenses-page': (4, lambda: self.client.get(reverse('expenses-page'), {'limit': 50})),
+            'add-expenses': (3, lambda: self.client.get(reverse('add-expenses'))),
+            'import-expenses': (3, lambda: self.client.get(reverse('import-expenses'))),
+            'export-expenses': (3, lambda: self.client.get(reverse('export-expenses'))),
+            'expense-edit': (4, lambda: self.client.get(reverse('expense-edit', args=[expense.pk]))),
+            'search_expenses': (4, lambda: self.client.post(reverse('search_expenses'), {'searchText': 'coffee'},
+                                                            content_type='application/json')),
+            'typeahead_expenses': (3, lambda: self.client.get(reverse('typeahead_expenses'), {'q': 'coffee'})),
+            'expense_category_summary': (4, lambda: self.client.get(reverse('expense_category_summary'))),
+            'expense_trend': (3, lambda: self.client.get(reverse('expense_trend'), {'days': 365})),
+            'stat_exp': (0, lambda: self.client.get(reverse('stat_exp'))),
+            'api-expenses': (4, lambda: self.client.get(reverse('api-expenses'))),
+        })
@@ -1,15 +1,20 @@
 from django.urls import path
 from . import views
 
-from django.views.decorators.csrf import csrf_exempt
+from main.aio import async_csrf_exempt
 
 urlpatterns = [
     path('', views.index, name="expenses"),
+    path('page', views.expenses_page, name="expenses-page"),
     path('add-expense', views.add_expense, name="add-expenses"),
+    path('import-expenses', views.import_expenses, name="import-expenses"),
+    path('export-expenses', views.export_expenses, name="export-expenses"),
     path('edit-expense/<int:id>', views.expense_edit, name="expense-edit"),
     path('expense-delete/<int:id>', views.delete_expense, name="expense-delete"),
-    path('search-expenses', csrf_exempt(views.search_expenses),
+    path('typeahead', views.typeahead_expenses, name="typeahead_expenses"),
+    path('search-expenses', async_csrf_exempt(views.search_expenses),
          name="search_expenses"),
+    path('expense_trend', views.expense_trend, name="expense_trend"),
     path('expense_category_summary', views.expense_category_summary,
          name="expense_category_summary"),
     path('stat_exp', views.stats_vie,
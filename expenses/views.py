@@ -1,41 +1,87 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from .models import Category, Expense
+from .models import Category, Expense, ExpenseRollup
 from django.contrib import messages
-from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
+import csv
 import json
+from django.db.models import F
+from django.conf import settings
 from django.http import JsonResponse
-import datetime
+from main.aio import Superseded, async_login_required, database_sync_to_async, latest_only
+from main.cache import cache_per_user
+from main.exports import export_response
+from main.fx import base_currency
+from main.importers import FORMATS as IMPORT_FORMATS, ImportFormatError, import_file
+from main.lookups import lookup
+from main.money import money_rows, to_minor
+from main.pagination import KeysetPaginator, page_payload
+from main.routers import read_replica
+from main.search import clamp_window, search
+from main.summary import date_window, parse_date, totals_by
+from main.trends import parse_points, trend
+from main.typeahead import clamp_limit, typeahead
 
 
-def search_expenses(request):
+@async_login_required
+@read_replica
+async def search_expenses(request):
     if request.method == 'POST':
-        search_str = json.loads(request.body).get('searchText')
-        expenses = Expense.objects.filter(
-            amount__istartswith=search_str, owner=request.user) | Expense.objects.filter(
-            date__istartswith=search_str, owner=request.user) | Expense.objects.filter(
-            description__icontains=search_str, owner=request.user) | Expense.objects.filter(
-            category__icontains=search_str, owner=request.user)
-        data = expenses.values()
-        return JsonResponse(list(data), safe=False)
+        params = json.loads(request.body)
+        limit, offset = clamp_window(params)
+
+        def rows():
+            expenses = search(Expense.objects.for_owner(request.user), params.get('searchText'), 'category__name')
+            return money_rows(expenses.values('id', 'amount_minor', 'currency', 'date', 'description', 'category',
+                                              category_name=F('category__name'))[offset:offset + limit])
+        try:
+            data = await latest_only(('search_expenses', request.user.pk), rows)
+        except Superseded:
+            return JsonResponse({'error': 'superseded by a newer search'}, status=409)
+        return JsonResponse(data, safe=False)
+
+
+@async_login_required
+@read_replica
+async def typeahead_expenses(request):
+    limit = clamp_limit(request.GET.get('limit'))
+
+    def find():
+        return typeahead(Expense.objects.for_owner(request.user), request.user.pk, 'expenses', request.GET.get('q'),
+                         'category', ('id', 'amount_minor', 'currency', 'date', 'description', 'category'), limit)
+    try:
+        rows, total, total_is_exact, cached = await latest_only(('typeahead_expenses', request.user.pk), find)
+    except Superseded:
+        return JsonResponse({'error': 'superseded by a newer search'}, status=409)
+    response = JsonResponse({'results': money_rows(rows), 'total': total, 'total_is_exact': total_is_exact})
+    response['X-Cache'] = 'HIT' if cached else 'MISS'
+    return response
 
 
 @login_required(login_url='/auth/login')
 def index(request):
-    expenses = Expense.objects.filter(owner=request.user)
-    paginator = Paginator(expenses, 5)
-    page_number = request.GET.get('page')
-    page_obj = Paginator.get_page(paginator, page_number)
+    expenses = Expense.objects.for_owner(request.user).select_related('category')
+    paginator = KeysetPaginator(expenses, 5, count_limit=settings.PAGINATION_COUNT_LIMIT or None)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     context = {
-        'expenses': expenses,
         'page_obj': page_obj,
     }
     return render(request, 'expenses/index.html', context)
 
 
+@login_required(login_url='/auth/login')
+def expenses_page(request):
+    limit, _ = clamp_window(request.GET)
+    paginator = KeysetPaginator(Expense.objects.for_owner(request.user).select_related('category'), limit,
+                                count_limit=settings.PAGINATION_COUNT_LIMIT or None)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    return JsonResponse(page_payload(page_obj, ('id', 'amount', 'currency', 'date', 'description', 'category',
+                                                'category_name')))
+
+
 @login_required(login_url='/auth/login')
 def add_expense(request):
-    categories = Category.objects.all()
+    categories = lookup(Category).all()
     context = {
         'categories': categories,
         'values': request.POST
@@ -48,30 +94,92 @@ def add_expense(request):
 
         description = request.POST['description']
         date = request.POST['expense_date']
-        category = request.POST['category']
+        category = request.POST.get('category', '')
 
-        Expense.objects.create(owner=request.user, amount=amount, date=date,
-                               category=category, description=description)
+        if lookup(Category).get(category) is None:
+            messages.error(request, 'Choose a category')
+            return render(request, 'expenses/add_expense.html', context)
+        currency = request.POST.get('currency') or base_currency(request.user.pk)
+        if currency not in settings.CURRENCIES:
+            messages.error(request, 'Choose a currency')
+            return render(request, 'expenses/add_expense.html', context)
+        try:
+            to_minor(amount, currency)
+        except ValidationError:
+            messages.error(request, 'Amount must be a number')
+            return render(request, 'expenses/add_expense.html', context)
+
+        Expense.objects.create(owner=request.user, currency=currency, amount=amount, date=date,
+                               category_id=category, description=description)
         messages.success(request, 'Expense saved successfully')
 
         return redirect('expenses')
 
 
+@login_required(login_url='/auth/login')
+def import_expenses(request):
+    categories = lookup(Category).all()
+    context = {
+        'categories': categories,
+        'formats': IMPORT_FORMATS,
+    }
+    if request.method == 'GET':
+        return render(request, 'expenses/import.html', context)
+
+    upload = request.FILES.get('file')
+    default = request.POST.get('category', '')
+    if not upload:
+        messages.error(request, 'Choose a file to import')
+        return render(request, 'expenses/import.html', context)
+    try:
+        result = import_file(Expense, request.user, 'category', upload, request.POST.get('format'),
+                             labels=lookup(Category).ids(),
+                             default_label=int(default) if default.isdigit() else None,
+                             currency=base_currency(request.user.pk))
+    except (ImportFormatError, csv.Error) as ex:
+        messages.error(request, str(ex))
+        return render(request, 'expenses/import.html', context)
+
+    context['result'] = result
+    if result.created:
+        messages.success(request, '%d expenses imported' % result.created)
+    if result.error_count:
+        messages.warning(request, '%d rows could not be imported' % result.error_count)
+    return render(request, 'expenses/import.html', context)
+
+
+@login_required(login_url='/auth/login')
+@read_replica
+def export_expenses(request):
+    try:
+        start = parse_date(request.GET['start']) if request.GET.get('start') else None
+        end = parse_date(request.GET['end']) if request.GET.get('end') else None
+    except ValueError:
+        return JsonResponse({'error': 'start and end must be YYYY-MM-DD dates'}, status=400)
+    rows = Expense.objects.for_owner(request.user).between(start, end).order_by('date', 'id')
+    category = request.GET.getlist('category')
+    if not all(pk.isdigit() for pk in category):
+        return JsonResponse({'error': 'category must be category ids'}, status=400)
+    if category:
+        rows = rows.filter(category__in=category)
+    return export_response(rows, ('date', 'category__name', 'description', 'amount_minor', 'currency'),
+                           ('Date', 'Category', 'Description', 'Amount', 'Currency'),
+                           request.GET.get('format', 'csv'), 'expenses')
+
+
 @login_required(login_url='/auth/login')
 def expense_edit(request, id):
-    expense = Expense.objects.get(pk=id)
-    categories = Category.objects.all()
+    expense = Expense.objects.for_owner(request.user).select_related('category').filter(pk=id).first()
+    if expense is None:
+        return redirect('expenses')
+    categories = lookup(Category).all()
     context = {
         'expense': expense,
         'values': expense,
         'categories': categories
     }
     if request.method == 'GET':
-        requested_user = request.user
-        if expense.owner == requested_user:
-            return render(request, 'expenses/edit-expense.html', context)
-        else:
-            return redirect('expenses')
+        return render(request, 'expenses/edit-expense.html', context)
     if request.method == 'POST':
         amount = request.POST['amount']
 
@@ -80,16 +188,29 @@ def expense_edit(request, id):
             return render(request, 'expenses/edit-expense.html', context)
         description = request.POST['description']
         date = request.POST['expense_date']
-        category = request.POST['category']
+        category = request.POST.get('category', '')
 
         if not description:
             messages.error(request, 'description is required')
             return render(request, 'expenses/edit-expense.html', context)
+        if lookup(Category).get(category) is None:
+            messages.error(request, 'Choose a category')
+            return render(request, 'expenses/edit-expense.html', context)
+        currency = request.POST.get('currency') or expense.currency
+        if currency not in settings.CURRENCIES:
+            messages.error(request, 'Choose a currency')
+            return render(request, 'expenses/edit-expense.html', context)
+        try:
+            to_minor(amount, currency)
+        except ValidationError:
+            messages.error(request, 'Amount must be a number')
+            return render(request, 'expenses/edit-expense.html', context)
 
         expense.owner = request.user
+        expense.currency = currency
         expense.amount = amount
         expense. date = date
-        expense.category = category
+        expense.category_id = category
         expense.description = description
 
         expense.save()
@@ -98,38 +219,58 @@ def expense_edit(request, id):
         return redirect('expenses')
 
 
+@login_required(login_url='/auth/login')
 def delete_expense(request, id):
-    expense = Expense.objects.get(pk=id)
-    if expense.owner == request.user:
-        expense.delete()
+    expense = Expense.objects.for_owner(request.user).filter(pk=id).first()
+    if expense is not None:
+        expense.soft_delete()
         messages.success(request, 'Expense removed')
     return redirect('expenses')
 
 
-def expense_category_summary(request):
-    todays_date = datetime.date.today()
-    six_months_ago = todays_date-datetime.timedelta(days=30*6)
-    expenses = Expense.objects.filter(owner=request.user,
-                                      date__gte=six_months_ago, date__lte=todays_date)
-    finalrep = {}
+@async_login_required
+@read_replica
+async def expense_category_summary(request):
+    return await database_sync_to_async(category_summary)(request)
+
+
+@cache_per_user('expense_category_summary')
+def category_summary(request):
+    currency = base_currency(request.user.pk)
+    expenses = Expense.objects.for_owner(request.user)
+    rollups = ExpenseRollup.objects.filter(owner=request.user)
+    unconverted = {}
+    try:
+        start, end = date_window(request.GET)
+        finalrep = totals_by(expenses, 'category', start, end, rollups, label='category__name', currency=currency,
+                             unconverted=unconverted)
+    except (ValueError, OverflowError) as ex:
+        return JsonResponse({'error': str(ex)}, status=400)
 
-    def get_category(expense):
-        return expense.category
-    category_list = list(set(map(get_category, expenses)))
+    # Amounts of days without an exchange rate yet are reported apart.
+    return JsonResponse({'expense_category_data': finalrep, 'currency': currency, 'unconverted': unconverted,
+                         'complete': not unconverted, 'start': start, 'end': end}, safe=False)
 
-    def get_expense_category_amount(category):
-        amount = 0
-        filtered_by_category = expenses.filter(category=category)
 
-        for item in filtered_by_category:
-            amount += item.amount
-        return amount
+@async_login_required
+@read_replica
+async def expense_trend(request):
+    return await database_sync_to_async(expense_trend_response)(request)
 
-    for x in expenses:
-        for y in category_list:
-            finalrep[y] = get_expense_category_amount(y)
 
-    return JsonResponse({'expense_category_data': finalrep}, safe=False)
+@cache_per_user('expense_trend')
+def expense_trend_response(request):
+    currency = base_currency(request.user.pk)
+    unconverted = {}
+    try:
+        start, end = date_window(request.GET)
+        granularity, points = trend(Expense.objects.for_owner(request.user), start, end,
+                                    request.GET.get('granularity') or 'day', parse_points(request.GET.get('points')),
+                                    currency=currency, unconverted=unconverted)
+    except (ValueError, OverflowError) as ex:
+        return JsonResponse({'error': str(ex)}, status=400)
+    return JsonResponse({'granularity': granularity, 'points': points, 'currency': currency,
+                         'unconverted': unconverted, 'complete': not unconverted, 'start': start, 'end': end})
 
 
 def stats_vie(request):
@@ -0,0 +1,154 @@
+"""
+Helpers for the async views (search and summaries).
+
+Django 3.2 has no async ORM, so database work is handed to a thread with
+``database_sync_to_async``. Outside tests it uses the shared thread pool
+(``ASYNC_DB_THREAD_SENSITIVE=False``), so the queries of concurrent
+requests run side by side instead of queueing on Django's single sync
+thread; each call opens, health-checks or reuses that thread's connection
+as a request would, honouring ``CONN_MAX_AGE``, and its queries go to the
+request's ``main.metrics`` recorder.
+
+``latest_only`` keeps one running search per user and scope: a newer search
+cancels the older one and interrupts its SQL, and the older request gets
+``Superseded``.
+"""
+import asyncio
+import threading
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections, connections
+
+from . import metrics
+from .connections import check_connections
+
+
+def database_sync_to_async(func):
+    """Like ``sync_to_async``, with request-style database connection handling."""
+    @wraps(func)
+    def run(*args, **kwargs):
+        close_old_connections()
+        check_connections()
+        try:
+            # The context, and so the request's recorder, is copied into this thread.
+            with metrics.record_connections(metrics.active_recorder()):
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    async def wrapped(*args, **kwargs):
+        if settings.ASYNC_DB_THREAD_SENSITIVE:
+            # Django's sync thread, whose connections the request cycle manages.
+            return await sync_to_async(func)(*args, **kwargs)
+        return await sync_to_async(run, thread_sensitive=False)(*args, **kwargs)
+    return wrapped
+
+
+async def get_user(request):
+    """Resolve the lazy ``request.user`` (session and user queries) off the event loop."""
+    def load():
+        return request.user if request.user.is_authenticated else None
+    return await database_sync_to_async(load)()
+
+
+def async_login_required(view):
+    """``login_required(login_url='/auth/login')`` for async views."""
+    @wraps(view)
+    async def wrapped(request, *args, **kwargs):
+        if await get_user(request) is None:
+            return redirect_to_login(request.get_full_path(), '/auth/login')
+        return await view(request, *args, **kwargs)
+    return wrapped
+
+
+def async_csrf_exempt(view):
+    """``csrf_exempt`` for async views; Django 3.2's wrapper is a sync function."""
+    @wraps(view)
+    async def wrapped(*args, **kwargs):
+        return await view(*args, **kwargs)
+    wrapped.csrf_exempt = True
+    return wrapped
+
+
+class Superseded(Exception):
+    """A newer search of the same user replaced this one."""
+
+
+class RunningQuery:
+    """The connections a search is running on, so it can be interrupted."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = ()
+        self.cancelled = False
+
+    def run(self, func):
+        with self.lock:
+            if self.cancelled:
+                raise Superseded
+            self.connections = connections.all()
+        try:
+            return func()
+        finally:
+            with self.lock:
+                self.connections = ()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            for db in self.connections:
+                interrupt(db)
+
+
+def interrupt(db):
+    """Abort the statement running on ``db`` (called from another thread)."""
+    if db.connection is None:
+        return
+    if db.vendor == 'sqlite':
+        db.connection.interrupt()
+    elif db.vendor == 'postgresql':
+        db.connection.cancel()
+
+
+_lock = threading.Lock()
+_running = {}
+
+
+async def latest_only(key, func):
+    """
+    Run ``func`` (sync, database work) for ``key``, cancelling the search
+    already running for the same key; raise ``Superseded`` when a newer
+    search cancels this one.
+    """
+    query = RunningQuery()
+    task = asyncio.ensure_future(database_sync_to_async(query.run)(func))
+    entry = (task, query)
+    with _lock:
+        previous = _running.get(key)
+        _running[key] = entry
+    if previous is not None:
+        previous_task, previous_query = previous
+        previous_query.cancel()
+        # The older request may be served by another event loop (WSGI).
+        previous_task.get_loop().call_soon_threadsafe(previous_task.cancel)
+    try:
+        result = await task
+    except asyncio.CancelledError:
+        if not query.cancelled:
+            # The request itself went away; stop its query too.
+            query.cancel()
+            raise
+    except Exception:
+        # An interrupted query fails with a database error.
+        if not query.cancelled:
+            raise
+    finally:
+        with _lock:
+            if _running.get(key) is entry:
+                del _running[key]
+    if query.cancelled:
+        raise Superseded
+    return result
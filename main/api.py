@@ -0,0 +1,202 @@
+"""
+JSON API for expenses and income.
+
+``GET /api/<resource>/`` lists the user's rows newest first with cursor
+pagination, ``?fields=`` selection and an ETag derived from the user's data
+version, so an unchanged list answers ``If-None-Match`` with a bare 304.
+``POST /api/<resource>/batch`` applies any mix of creates, updates and
+deletes in one transaction: either every operation succeeds or none does.
+
+Writes go through ``Model.save()``/``soft_delete()`` so rollups, cached
+responses and ``/sync`` tombstones stay in step, and are protected by the
+usual CSRF check.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from .cache import data_version
+from .fx import base_currency
+from .lookups import lookup
+from .pagination import KeysetPaginator, field_value, page_payload
+from .search import clamp_window
+from .summary import parse_date
+
+OPERATIONS = ('create', 'update', 'delete')
+
+
+class Resource:
+    """An owned transaction model exposed through the API."""
+
+    def __init__(self, model, label_field, label_model):
+        self.model = model
+        self.label_field = label_field
+        self.label_model = label_model
+        self.label_attname = label_field + '_id'
+        self.name_field = label_field + '_name'
+        self.writable = ('amount', 'currency', 'date', 'description', label_field)
+        self.fields = ('id',) + self.writable + (self.name_field,)
+
+    def queryset(self, user):
+        return self.model.objects.for_owner(user)
+
+    def labels(self):
+        """Map every category/source id to its name."""
+        return lookup(self.label_model).names()
+
+    def list_queryset(self, user, fields):
+        """Rows of ``user`` loading only the columns ``fields`` needs."""
+        columns = {'id', 'date'} | (set(fields) & set(self.writable) - {'amount'})
+        if 'amount' in fields or 'currency' in fields:
+            columns |= {'amount_minor', 'currency'}
+        rows = self.queryset(user)
+        if self.name_field in fields:
+            columns |= {self.label_field, self.label_field + '__name'}
+            rows = rows.select_related(self.label_field)
+        return rows.only(*columns)
+
+    def select_fields(self, value):
+        """Validate a comma separated ``?fields=`` value; all fields when empty."""
+        if not value:
+            return self.fields
+        fields = tuple(field.strip() for field in value.split(',') if field.strip())
+        unknown = sorted(set(fields) - set(self.fields))
+        if unknown:
+            raise ValueError('unknown fields: %s' % ', '.join(unknown))
+        return fields
+
+    def serialize(self, row, fields, labels):
+        return {field: labels.get(getattr(row, self.label_attname)) if field == self.name_field
+                else field_value(row, field) for field in fields}
+
+    def clean(self, instance, values, labels):
+        """Apply ``values`` to ``instance`` and validate it; return field errors."""
+        if not isinstance(values, dict):
+            return {'__all__': ['expected an object']}
+        unknown = sorted(set(values) - set(self.writable) - {'id'})
+        if unknown:
+            return {'__all__': ['unknown fields: %s' % ', '.join(unknown)]}
+        if 'currency' in values and 'amount' not in values and instance.amount_minor is not None:
+            # Keep the amount, not its minor units, when only the currency changes.
+            values = dict(values, amount=instance.amount)
+        try:
+            # The currency first: it decides how ``amount`` is rounded.
+            for field in sorted(self.writable, key=lambda field: field != 'currency'):
+                if field in values:
+                    setattr(instance, self.label_attname if field == self.label_field else field, values[field])
+            # The label is checked against ``labels`` instead of one query per row.
+            instance.full_clean(exclude=['owner', self.label_field])
+        except ValidationError as ex:
+            return ex.message_dict
+        if getattr(instance, self.label_attname) not in labels:
+            return {self.label_field: ['unknown %s' % self.label_field]}
+        return {}
+
+
+def api_login_required(view):
+    """Like ``login_required``, but answers 401 JSON instead of redirecting."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'authentication required'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapped
+
+
+def list_etag(request, resource):
+    # The data version changes on every write of the user's rows, so it and
+    # the full URL (cursor, fields, filters) identify the response exactly.
+    key = '%s:%s:%s' % (resource.model._meta.label, data_version(request.user.pk), request.get_full_path())
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+@api_login_required
+@require_GET
+@condition(etag_func=list_etag)
+def list_view(request, resource):
+    try:
+        fields = resource.select_fields(request.GET.get('fields'))
+        start = parse_date(request.GET['start']) if request.GET.get('start') else None
+        end = parse_date(request.GET['end']) if request.GET.get('end') else None
+    except ValueError as ex:
+        return JsonResponse({'error': str(ex)}, status=400)
+    limit, _ = clamp_window(request.GET)
+    rows = resource.list_queryset(request.user, fields).between(start, end)
+    paginator = KeysetPaginator(rows, limit, count_limit=settings.PAGINATION_COUNT_LIMIT or None)
+    return JsonResponse(page_payload(paginator.get_page(request.GET.get('cursor')), fields))
+
+
+def is_id(value):
+    """Whether a JSON value is a row id; ``true`` is not, though ``True == 1``."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+@api_login_required
+@require_POST
+def batch_view(request, resource):
+    try:
+        payload = json.loads(request.body)
+        fields = resource.select_fields(request.GET.get('fields'))
+    except ValueError as ex:
+        return JsonResponse({'error': str(ex)}, status=400)
+    if not isinstance(payload, dict) or set(payload) - set(OPERATIONS):
+        return JsonResponse({'error': 'expected an object with create, update and delete lists'}, status=400)
+    creates, updates, deletes = (payload.get(operation) or [] for operation in OPERATIONS)
+    if not all(isinstance(items, list) for items in (creates, updates, deletes)):
+        return JsonResponse({'error': 'create, update and delete must be lists'}, status=400)
+    if len(creates) + len(updates) + len(deletes) > settings.API_BATCH_LIMIT:
+        return JsonResponse({'error': 'at most %d operations per batch' % settings.API_BATCH_LIMIT}, status=400)
+
+    errors = []
+    update_ids = [item.get('id') if isinstance(item, dict) else None for item in updates]
+    with transaction.atomic():
+        # One query for every row the batch touches, locked until commit.
+        ids = [pk for pk in update_ids + deletes if is_id(pk)]
+        existing = resource.queryset(request.user).select_for_update().in_bulk(ids)
+        labels = resource.labels()
+
+        created = []
+        for index, values in enumerate(creates):
+            instance = resource.model(owner=request.user, currency=base_currency(request.user.pk))
+            item_errors = resource.clean(instance, values, labels)
+            if item_errors:
+                errors.append({'operation': 'create', 'index': index, 'errors': item_errors})
+            created.append(instance)
+
+        updated = []
+        for index, (pk, values) in enumerate(zip(update_ids, updates)):
+            instance = existing.get(pk) if is_id(pk) else None
+            if instance is None:
+                errors.append({'operation': 'update', 'index': index, 'errors': {'id': ['not found']}})
+                continue
+            item_errors = resource.clean(instance, values, labels)
+            if item_errors:
+                errors.append({'operation': 'update', 'index': index, 'errors': item_errors})
+            updated.append(instance)
+
+        deleted = []
+        for index, pk in enumerate(deletes):
+            instance = existing.get(pk) if is_id(pk) else None
+            if instance is None or instance in deleted:
+                errors.append({'operation': 'delete', 'index': index, 'errors': {'id': ['not found']}})
+                continue
+            deleted.append(instance)
+
+        if errors:
+            return JsonResponse({'errors': errors}, status=400)
+        for instance in created + updated:
+            instance.save()
+        for instance in deleted:
+            instance.soft_delete()
+
+    return JsonResponse({
+        'created': [resource.serialize(instance, fields, labels) for instance in created],
+        'updated': [resource.serialize(instance, fields, labels) for instance in updated],
+        'deleted': [instance.pk for instance in deleted],
+    })
@@ -0,0 +1,15 @@
+from django.urls import path
+
+from expenses.models import Category, Expense
+from userincome.models import Source, UserIncome
+from . import api
+
+expenses = api.Resource(Expense, 'category', Category)
+income = api.Resource(UserIncome, 'source', Source)
+
+urlpatterns = [
+    path('expenses/', api.list_view, {'resource': expenses}, name="api-expenses"),
+    path('expenses/batch', api.batch_view, {'resource': expenses}, name="api-expenses-batch"),
+    path('income/', api.list_view, {'resource': income}, name="api-income"),
+    path('income/batch', api.batch_view, {'resource': income}, name="api-income-batch"),
+]
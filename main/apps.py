@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class MainConfig(AppConfig):
     name = 'main'
+
+    def ready(self):
+        from .connections import check_connections, count_opened
+        request_started.connect(check_connections, dispatch_uid='main_check_connections')
+        connection_created.connect(count_opened, dispatch_uid='main_count_opened')
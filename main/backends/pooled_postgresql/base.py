@@ -0,0 +1,78 @@
+"""
+PostgreSQL with connections borrowed from an in-process pool.
+
+Selected with ``DB_POOL=True``, which also sets ``CONN_MAX_AGE`` to 0:
+Django then "closes" the connection at the end of every request (or async
+view database call), which returns it to the pool of its alias instead of
+closing it. See main.connections.
+"""
+import threading
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+from django.conf import settings
+from django.db.backends.postgresql import base
+
+from main.connections import ConnectionPool
+
+_lock = threading.Lock()
+_pools = {}
+
+
+def healthy(connection):
+    if connection.closed:
+        return False
+    if not settings.DB_HEALTH_CHECKS:
+        return True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except psycopg2.Error:
+        return False
+    return True
+
+
+def reusable(connection):
+    """Roll back anything left open; whether ``connection`` can go back to the pool."""
+    if connection.closed:
+        return False
+    try:
+        if connection.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+    except psycopg2.Error:
+        return False
+    return connection.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        # The test runner renames the database after the first connection.
+        key = (self.alias, self.settings_dict['NAME'])
+        with _lock:
+            pool = _pools.get(key)
+            if pool is None:
+                params = self.get_connection_params()
+                pool = _pools[key] = ConnectionPool(
+                    lambda: base.Database.connect(**params), settings.DB_POOL_SIZE, settings.DB_POOL_TIMEOUT)
+        return pool
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool.get(healthy)
+        # As in the stock backend, which connects here instead.
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            self.pool.put(self.connection, reusable(self.connection))
@@ -0,0 +1,319 @@
+"""
+Seeding and benchmarking helpers behind the ``seed_data`` and
+``benchmark`` management commands.
+
+The benchmark drives the views in-process with Django's test client, so
+it measures view, ORM and database time (not the web server), and counts
+the queries of every request. Results can be saved as a baseline JSON
+file and later runs compared against it.
+
+``run_concurrency_benchmark`` serves the async views with many requests in
+flight, once through the WSGI handler and once through the ASGI handler,
+to compare their throughput. ``run_connection_benchmark`` measures the
+database connection setup each request pays with connections closed after
+every request and with persistent connections.
+"""
+import asyncio
+import datetime
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.signals import request_started
+from django.db import close_old_connections, connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from expenses.models import Category, Expense
+from userincome.models import Source, UserIncome
+from .cache import bump_data_version
+from .connections import check_connections
+from .metrics import QueryRecorder, connection_stats, percentile, recording
+from .rollups import rebuild_rollups
+
+DEFAULT_CATEGORIES = ('Food', 'Rent', 'Travel', 'Utilities', 'Shopping', 'Health')
+DEFAULT_SOURCES = ('Salary', 'Business', 'Freelance', 'Interest')
+DESCRIPTIONS = {
+    'Food': ('Groceries', 'Coffee with friends', 'Lunch at work', 'Dinner out', 'Bakery'),
+    'Rent': ('Monthly rent', 'Parking spot', 'Storage unit'),
+    'Travel': ('Train ticket', 'Taxi to airport', 'Bus pass', 'Fuel', 'Hotel night'),
+    'Utilities': ('Electricity bill', 'Water bill', 'Internet', 'Phone recharge'),
+    'Shopping': ('New shoes', 'Books', 'Headphones', 'Kitchen supplies'),
+    'Health': ('Pharmacy', 'Doctor visit', 'Gym membership'),
+    'Salary': ('Monthly salary', 'Bonus'),
+    'Business': ('Client invoice', 'Shop sales'),
+    'Freelance': ('Website project', 'Logo design', 'Consulting'),
+    'Interest': ('Savings interest', 'Fixed deposit interest'),
+}
+BENCHMARK_USERNAME = 'bench_user_0'
+BENCHMARK_PASSWORD = 'bench-password'
+
+# (name, method, url name, payload, anonymous, cold cache)
+SCENARIOS = (
+    ('expenses', 'get', 'expenses', None, False, False),
+    ('expenses-page', 'get', 'expenses-page', {'limit': 50}, False, False),
+    ('search-expenses', 'post', 'search_expenses', {'searchText': 'coffee'}, False, False),
+    ('typeahead-expenses', 'get', 'typeahead_expenses', {'q': 'cof'}, False, False),
+    ('expense_category_summary', 'get', 'expense_category_summary', None, False, True),
+    ('expense_trend', 'get', 'expense_trend', {'days': 365}, False, True),
+    ('stat_exp', 'get', 'stat_exp', None, False, False),
+    ('income', 'get', 'income', None, False, False),
+    ('income-page', 'get', 'income-page', {'limit': 50}, False, False),
+    ('search-income', 'post', 'search_income', {'searchText': 'salary'}, False, False),
+    ('typeahead-income', 'get', 'typeahead_income', {'q': 'sal'}, False, False),
+    ('income_source_summary', 'get', 'income_source_summary', None, False, True),
+    ('income_trend', 'get', 'income_trend', {'days': 365}, False, True),
+    ('stats', 'get', 'stats', None, False, False),
+    ('api-expenses', 'get', 'api-expenses', None, False, False),
+    ('sync', 'get', 'sync', {'limit': 100}, False, False),
+    ('main', 'get', 'main', None, False, False),
+    ('login-page', 'get', 'login', None, True, False),
+    ('login', 'post', 'login', {'username': BENCHMARK_USERNAME, 'password': BENCHMARK_PASSWORD}, True, False),
+    ('register-page', 'get', 'register', None, True, False),
+)
+# The async views, compared under concurrency.
+CONCURRENT_SCENARIOS = ('search-expenses', 'search-income', 'expense_category_summary', 'income_source_summary')
+
+
+def seed_users(users, expenses, incomes, days=730, seed=0, password=BENCHMARK_PASSWORD, batch_size=None):
+    """
+    Create ``users`` users named ``bench_user_<n>`` with ``expenses`` expenses
+    and ``incomes`` incomes each, spread over the last ``days`` days.
+
+    Existing benchmark users are reused and get the rows added on top.
+    Returns the list of users.
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    rng = random.Random(seed)
+    for name in DEFAULT_CATEGORIES:
+        Category.objects.get_or_create(name=name)
+    for name in DEFAULT_SOURCES:
+        Source.objects.get_or_create(name=name)
+    categories = list(Category.objects.values_list('pk', 'name'))
+    sources = list(Source.objects.values_list('pk', 'name'))
+
+    names = ['bench_user_%d' % index for index in range(users)]
+    existing = set(User.objects.filter(username__in=names).values_list('username', flat=True))
+    # Hash once; every benchmark user shares the password.
+    password_hash = make_password(password)
+    User.objects.bulk_create([User(username=name, email='%s@localhost.com' % name, password=password_hash)
+                              for name in names if name not in existing])
+    owners = list(User.objects.filter(username__in=names).order_by('id'))
+
+    today = datetime.date.today()
+    for owner in owners:
+        for model, count, labels, label_field, low, high in (
+                (Expense, expenses, categories, 'category_id', 1, 500),
+                (UserIncome, incomes, sources, 'source_id', 100, 5000)):
+            batch = []
+            for _ in range(count):
+                label, name = rng.choice(labels)
+                batch.append(model(
+                    owner=owner, date=today - datetime.timedelta(days=rng.randrange(days)),
+                    amount=round(rng.uniform(low, high), 2), **{label_field: label},
+                    description=rng.choice(DESCRIPTIONS.get(name, ('Misc',)))))
+                if len(batch) >= batch_size:
+                    model.objects.bulk_create(batch)
+                    batch = []
+            model.objects.bulk_create(batch)
+        rebuild_rollups(owner)
+        bump_data_version(owner.pk)
+    return owners
+
+
+def request(client, method, url_name, payload):
+    url = reverse(url_name)
+    if method == 'post' and url_name.startswith('search_'):
+        return client.post(url, json.dumps(payload), content_type='application/json')
+    if method == 'post':
+        return client.post(url, payload)
+    return client.get(url, payload)
+
+
+def run_benchmark(user, iterations=20, scenarios=SCENARIOS, password=BENCHMARK_PASSWORD):
+    """
+    Request every scenario ``iterations`` times as ``user``; return results per
+    scenario name: requests/s, latency percentiles in ms and queries per request.
+    """
+    client, anonymous = Client(), Client()
+    if not client.login(username=user.username, password=password):
+        raise ValueError('cannot log in as %s' % user.username)
+    results = {}
+    for name, method, url_name, payload, is_anonymous, cold_cache in scenarios:
+        durations, queries = [], []
+        for _ in range(iterations):
+            if cold_cache:
+                bump_data_version(user.pk)
+            recorder = QueryRecorder()
+            start = time.perf_counter()
+            with recording(recorder):
+                response = request(anonymous if is_anonymous else client, method, url_name, payload)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            durations.append(time.perf_counter() - start)
+            queries.append(recorder.count)
+            if response.status_code >= 400:
+                raise ValueError('%s answered %d' % (name, response.status_code))
+        durations.sort()
+        results[name] = {
+            'requests': iterations,
+            'rps': round(iterations / sum(durations), 1),
+            'p50_ms': round(percentile(durations, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(durations, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(durations, 0.99) * 1000, 2),
+            'queries': max(queries),
+        }
+    return results
+
+
+def _outcomes(outcomes, elapsed):
+    durations = sorted(duration for duration, _ in outcomes)
+    return {
+        'requests': len(outcomes),
+        'rps': round(len(outcomes) / elapsed, 1),
+        'p95_ms': round(percentile(durations, 0.95) * 1000, 2),
+        'superseded': sum(1 for _, status in outcomes if status == 409),
+    }
+
+
+def run_concurrency_benchmark(users, concurrency=8, requests=200, scenarios=CONCURRENT_SCENARIOS,
+                              password=BENCHMARK_PASSWORD):
+    """
+    Serve ``requests`` requests of each scenario with ``concurrency`` of them
+    in flight: through the WSGI handler with one thread per in-flight request
+    (like threaded gunicorn workers), then through the ASGI handler on one
+    event loop (like a uvicorn worker). In-flight requests are spread over
+    ``users``; searches of the same user supersede each other and answer 409.
+
+    Returns, per scenario, ``{'wsgi': ..., 'asgi': ...}`` with requests/s, p95
+    latency in ms and the number of superseded requests.
+    """
+    per_worker = max(requests // concurrency, 1)
+    wsgi_clients, asgi_clients = [], []
+    for index in range(concurrency):
+        user = users[index % len(users)]
+        for clients, client in ((wsgi_clients, Client()), (asgi_clients, AsyncClient())):
+            if not client.login(username=user.username, password=password):
+                raise ValueError('cannot log in as %s' % user.username)
+            clients.append((client, user.pk))
+
+    results = {}
+    for name, method, url_name, payload, _, cold_cache in SCENARIOS:
+        if name not in scenarios:
+            continue
+
+        def check(response):
+            if response.status_code >= 400 and response.status_code != 409:
+                raise ValueError('%s answered %d' % (name, response.status_code))
+            return response.status_code
+
+        def wsgi_worker(client, user_pk):
+            outcomes = []
+            try:
+                for _ in range(per_worker):
+                    if cold_cache:
+                        bump_data_version(user_pk)
+                    start = time.perf_counter()
+                    status = check(request(client, method, url_name, payload))
+                    outcomes.append((time.perf_counter() - start, status))
+            finally:
+                connections.close_all()
+            return outcomes
+
+        async def asgi_worker(client, user_pk):
+            outcomes = []
+            for _ in range(per_worker):
+                if cold_cache:
+                    bump_data_version(user_pk)
+                start = time.perf_counter()
+                status = check(await request(client, method, url_name, payload))
+                outcomes.append((time.perf_counter() - start, status))
+            return outcomes
+
+        async def asgi_run():
+            return await asyncio.gather(*(asgi_worker(client, user_pk) for client, user_pk in asgi_clients))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            wsgi = [outcome for outcomes in pool.map(wsgi_worker, *zip(*wsgi_clients)) for outcome in outcomes]
+        wsgi_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        asgi = [outcome for outcomes in asyncio.run(asgi_run()) for outcome in outcomes]
+        asgi_elapsed = time.perf_counter() - start
+        results[name] = {'wsgi': _outcomes(wsgi, wsgi_elapsed), 'asgi': _outcomes(asgi, asgi_elapsed)}
+    return results
+
+
+def run_connection_benchmark(user, requests=100, url_name='expenses', password=BENCHMARK_PASSWORD):
+    """
+    Request ``url_name`` ``requests`` times as ``user``, first with
+    ``CONN_MAX_AGE`` 0 and then with ``DB_CONN_MAX_AGE``. Each request
+    starts as the request handlers start one (obsolete connections closed,
+    kept ones health-checked), and the time to have a usable connection is
+    measured before the view runs.
+
+    Returns, per ``CONN_MAX_AGE``, the connections opened and reused, the
+    mean time spent connecting per request in ms and the p50 latency.
+    """
+    client = Client()
+    if not client.login(username=user.username, password=password):
+        raise ValueError('cannot log in as %s' % user.username)
+    connection = connections['default']
+    original = connection.settings_dict['CONN_MAX_AGE']
+    results = {}
+    # The connection is checked here, before the clock stops, not again by the client.
+    request_started.disconnect(dispatch_uid='main_check_connections')
+    try:
+        for max_age in (0, settings.DB_CONN_MAX_AGE):
+            connection.settings_dict['CONN_MAX_AGE'] = max_age
+            connection.close()
+            before = connection_stats()
+            durations, connecting = [], 0.0
+            for _ in range(requests):
+                start = time.perf_counter()
+                close_old_connections()
+                check_connections()
+                connection.ensure_connection()
+                connecting += time.perf_counter() - start
+                response = client.get(reverse(url_name))
+                close_old_connections()
+                durations.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    raise ValueError('%s answered %d' % (url_name, response.status_code))
+            after = connection_stats()
+            durations.sort()
+            results[max_age] = {
+                'requests': requests,
+                'opened': after['opened'] - before['opened'],
+                'reused': after['reused'] - before['reused'],
+                'connect_ms': round(connecting / requests * 1000, 3),
+                'p50_ms': round(percentile(durations, 0.50) * 1000, 2),
+            }
+    finally:
+        request_started.connect(check_connections, dispatch_uid='main_check_connections')
+        connection.settings_dict['CONN_MAX_AGE'] = original
+        connection.close()
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25, min_delta_ms=2.0):
+    """
+    List regressions against ``baseline`` (a previous ``run_benchmark`` result):
+    any extra query, or a p95 more than ``tolerance`` (and ``min_delta_ms``) slower.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['queries'] > previous['queries']:
+            regressions.append('%s: %d queries per request, baseline %d'
+                               % (name, current['queries'], previous['queries']))
+        allowed = max(previous['p95_ms'] * (1 + tolerance), previous['p95_ms'] + min_delta_ms)
+        if current['p95_ms'] > allowed:
+            regressions.append('%s: p95 %.2fms, baseline %.2fms' % (name, current['p95_ms'], previous['p95_ms']))
+    return regressions
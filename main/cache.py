@@ -0,0 +1,132 @@
+"""
+Per-user response caching for the summary and stats JSON endpoints.
+
+Cache keys embed a per-user data version. Any save or delete of a tracked
+model bumps the owner's version, which orphans every cached response of
+that user at once; stale entries simply age out of the cache. They also
+embed the exchange rates version, bumped by ``load_fx_rates``, since
+totals are converted with those rates.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse
+
+VERSION_KEY = 'data-version:%s'
+RATES_VERSION_KEY = 'rates-version'
+RESPONSE_KEY = 'response:%s:%s:%s:%s:%s'
+STATS_KEY = 'response-stats:%s:%s'
+STATS_PREFIXES = set()
+
+
+def _fresh_version():
+    # Time based, so a version key evicted from the cache never restarts at
+    # a number that older cached responses were stored under.
+    return int(time.time() * 1000)
+
+
+def data_version(user_id):
+    return cache.get_or_set(VERSION_KEY % user_id, _fresh_version, None)
+
+
+def bump_data_version(user_id):
+    try:
+        cache.incr(VERSION_KEY % user_id)
+    except ValueError:
+        cache.set(VERSION_KEY % user_id, _fresh_version(), None)
+
+
+def rates_version():
+    return cache.get_or_set(RATES_VERSION_KEY, _fresh_version, None)
+
+
+def bump_rates_version():
+    try:
+        cache.incr(RATES_VERSION_KEY)
+    except ValueError:
+        cache.set(RATES_VERSION_KEY, _fresh_version(), None)
+
+
+def _count(prefix, outcome):
+    key = STATS_KEY % (prefix, outcome)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def cache_stats():
+    """Hit/miss counters of every cache_per_user view seen by this process."""
+    stats = {}
+    for prefix in sorted(STATS_PREFIXES):
+        hits = cache.get(STATS_KEY % (prefix, 'hit'), 0)
+        misses = cache.get(STATS_KEY % (prefix, 'miss'), 0)
+        stats[prefix] = {'hits': hits, 'misses': misses}
+    return stats
+
+
+def cache_per_user(prefix, timeout=None):
+    """
+    Cache successful responses of a login-protected view per user and URL.
+
+    Responses carry an ``X-Cache: HIT``/``MISS`` header.
+    """
+    STATS_PREFIXES.add(prefix)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            user_id = request.user.pk
+            path_hash = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = RESPONSE_KEY % (prefix, user_id, data_version(user_id), rates_version(), path_hash)
+            cached = cache.get(key)
+            if cached is not None:
+                _count(prefix, 'hit')
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            _count(prefix, 'miss')
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, (response.content, response['Content-Type']),
+                          settings.RESPONSE_CACHE_TIMEOUT if timeout is None else timeout)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapped
+    return decorator
+
+
+def track_data_version(model):
+    """Bump the owner's data version whenever a ``model`` row changes."""
+    def changed(sender, instance, raw=False, **kwargs):
+        if not raw:
+            bump_data_version(instance.owner_id)
+
+    post_save.connect(changed, sender=model, weak=False, dispatch_uid='data_version_post_save')
+    post_delete.connect(changed, sender=model, weak=False, dispatch_uid='data_version_post_delete')
+
+
+def track_label_version(model, label_field):
+    """
+    Bump the data version of every owner with ``model`` rows under a
+    category or source (``label_field``) that is saved again, e.g. renamed:
+    cached responses, ETags and typeahead results carry its name.
+    """
+    label_model = model._meta.get_field(label_field).related_model
+
+    def changed(sender, instance, raw=False, created=False, **kwargs):
+        if raw or created:
+            return
+        owners = (model._base_manager.filter(**{label_field: instance}).order_by()
+                  .values_list('owner_id', flat=True).distinct())
+        for owner_id in owners:
+            bump_data_version(owner_id)
+
+    post_save.connect(changed, sender=label_model, weak=False, dispatch_uid='label_version_post_save')
@@ -0,0 +1,111 @@
+"""
+Database connection management.
+
+``DB_CONN_MAX_AGE`` keeps a connection open across requests, but Django 3.2
+only finds out that a kept connection has died (database restart, idle
+timeout, failover) when a query on it fails. ``check_connections`` runs at
+the start of every request and of every async view's database call: with
+``DB_HEALTH_CHECKS`` it pings each connection left open by an earlier
+request and drops the ones that no longer answer, so the request reconnects
+instead of failing.
+
+``ConnectionPool`` backs the ``main.backends.pooled_postgresql`` engine
+(``DB_POOL=True``): instead of one persistent connection per thread, the
+threads of a worker borrow from at most ``DB_POOL_SIZE`` connections and
+hand them back when Django closes them at the end of each request.
+
+Connections opened, reused and failed are counted in ``main.metrics``.
+"""
+import threading
+
+from django.conf import settings
+from django.db import connections
+from django.db.utils import OperationalError
+
+from . import metrics
+
+
+def check_connections(**kwargs):
+    """``request_started`` receiver; see the module docstring."""
+    for connection in connections.all():
+        if connection.connection is None or getattr(connection, 'pool', None) is not None:
+            # Pooled connections are checked when they are borrowed.
+            continue
+        if settings.DB_HEALTH_CHECKS and not connection.is_usable():
+            metrics.record_connection('failed')
+            connection.close()
+            continue
+        metrics.record_connection('reused')
+
+
+def count_opened(sender, connection, **kwargs):
+    """``connection_created`` receiver."""
+    if getattr(connection, 'pool', None) is None:
+        metrics.record_connection('opened')
+
+
+class ConnectionPool:
+    """
+    At most ``size`` DB-API connections made by ``connect``, shared by the
+    threads of a process. ``get`` waits up to ``timeout`` seconds for a free
+    one and reuses the most recently returned connection that passes
+    ``healthy``.
+    """
+
+    def __init__(self, connect, size, timeout):
+        self.connect = connect
+        self.timeout = timeout
+        self.idle = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def get(self, healthy):
+        if not self.slots.acquire(timeout=self.timeout):
+            metrics.record_connection('failed')
+            raise OperationalError('no database connection free after %s seconds' % self.timeout)
+        try:
+            while True:
+                with self.lock:
+                    connection = self.idle.pop() if self.idle else None
+                if connection is None:
+                    break
+                if healthy(connection):
+                    metrics.record_connection('reused')
+                    return connection
+                metrics.record_connection('failed')
+                discard(connection)
+            try:
+                connection = self.connect()
+            except Exception:
+                metrics.record_connection('failed')
+                raise
+        except BaseException:
+            self.slots.release()
+            raise
+        metrics.record_connection('opened')
+        return connection
+
+    def put(self, connection, reusable=True):
+        """Return a connection taken with ``get``; it is closed instead unless ``reusable``."""
+        try:
+            if reusable:
+                with self.lock:
+                    self.idle.append(connection)
+            else:
+                discard(connection)
+        finally:
+            self.slots.release()
+
+    def clear(self):
+        """Close the idle connections."""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            discard(connection)
+
+
+def discard(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
@@ -0,0 +1,87 @@
+"""
+The per-user snapshot behind the dashboard on the landing page.
+
+Balance and the top categories come from the monthly rollup tables, so
+their cost grows with the number of months and categories, not rows;
+month-to-date spend reads one month of rows on the (owner, date) index and
+the recent transactions are two ``LIMIT`` queries. Totals are in the user's
+base currency. Rollups in other currencies are converted month by month
+and this month's rows in other currencies day by day (see main.fx); those
+without a rate are left out and their currencies listed in
+``missing_rates``. The snapshot is cached under the
+user's data version, the rates version and today's date, so it is rebuilt
+after the user's next write, the next rates load or at midnight, whichever
+comes first.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from expenses.models import Expense, ExpenseRollup
+from userincome.models import IncomeRollup, UserIncome
+from .cache import data_version, rates_version
+from .fx import base_currency, foreign_groups, foreign_rollups, sum_converted, unconverted
+from .money import Money
+from .rollups import month_of
+
+SNAPSHOT_KEY = 'dashboard:%s:%s:%s:%s'
+TOP_CATEGORIES = 5
+RECENT_TRANSACTIONS = 8
+
+
+def build_snapshot(user, today):
+    month = month_of(today)
+    currency = base_currency(user.pk)
+    # Amounts in other currencies are converted and added to those of the
+    # base currency: all time from the rollups, this month from the rows.
+    foreign_income = foreign_rollups(IncomeRollup.objects.filter(owner=user), currency, today)
+    foreign_spent = foreign_rollups(ExpenseRollup.objects.filter(owner=user), currency, today)
+    foreign_month = foreign_groups(Expense.objects.for_owner(user).between(month, today), currency,
+                                   ('category__name',))
+
+    income = (IncomeRollup.objects.filter(owner=user, currency=currency)
+              .aggregate(total=Sum('total_minor'))['total'] or 0) + sum_converted(foreign_income).get(None, 0)
+    spent = (ExpenseRollup.objects.filter(owner=user, currency=currency)
+             .aggregate(total=Sum('total_minor'))['total'] or 0) + sum_converted(foreign_spent).get(None, 0)
+    month_to_date = (Expense.objects.for_owner(user).between(month, today).filter(currency=currency).order_by()
+                     .aggregate(total=Sum('amount_minor'))['total'] or 0) + sum_converted(foreign_month).get(None, 0)
+    categories = dict(ExpenseRollup.objects.filter(owner=user, month=month, currency=currency)
+                      .values_list('category__name', 'total_minor'))
+    for name, total in sum_converted(foreign_month, key=lambda group: group['category__name']).items():
+        categories[name] = categories.get(name, 0) + total
+    top_categories = [{'name': name, 'total': Money.from_minor(total, currency)}
+                      for name, total in sorted(categories.items(), key=lambda item: -item[1])[:TOP_CATEGORIES]]
+
+    recent = [{'kind': 'expense', 'id': row.pk, 'date': row.date, 'amount': row.amount,
+               'label': row.category.name, 'description': row.description}
+              for row in Expense.objects.for_owner(user).select_related('category')[:RECENT_TRANSACTIONS]]
+    recent += [{'kind': 'income', 'id': row.pk, 'date': row.date, 'amount': row.amount,
+                'label': row.source.name, 'description': row.description}
+               for row in UserIncome.objects.for_owner(user).select_related('source')[:RECENT_TRANSACTIONS]]
+    recent.sort(key=lambda row: row['date'], reverse=True)
+
+    return {
+        'today': today,
+        'currency': currency,
+        'balance': Money.from_minor(income - spent, currency),
+        'income': Money.from_minor(income, currency),
+        'spent': Money.from_minor(spent, currency),
+        'month_to_date': Money.from_minor(month_to_date, currency),
+        'top_categories': top_categories,
+        'recent': recent[:RECENT_TRANSACTIONS],
+        'missing_rates': sorted({*unconverted(foreign_income), *unconverted(foreign_spent),
+                                 *unconverted(foreign_month)}),
+    }
+
+
+def dashboard_snapshot(user, today=None):
+    """The cached snapshot of ``user``, built on a miss."""
+    today = today or datetime.date.today()
+    key = SNAPSHOT_KEY % (user.pk, data_version(user.pk), rates_version(), today.isoformat())
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_snapshot(user, today)
+        cache.set(key, snapshot, settings.RESPONSE_CACHE_TIMEOUT)
+    return snapshot
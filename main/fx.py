@@ -0,0 +1,159 @@
+"""
+Conversion of totals into each user's base currency.
+
+Transactions keep the currency they were made in (see main.money); the
+summaries, trends and the dashboard report in the user's base currency,
+``UserPreference.currency`` or ``DEFAULT_CURRENCY``. Rows already in the
+base currency are summed by the database as before. Rows in any other
+currency are summed per (currency, day) by the database as well, and the
+resulting groups are converted in one pass with the rate of their day: the
+latest ``ExchangeRate`` on or before it, loaded from a file by
+``load_fx_rates``. Groups of a day with no rate yet are left out of the
+converted totals and reported per currency by ``unconverted`` instead, so
+one transaction without a rate does not take the whole report down.
+
+The dashboard's all-time totals convert the monthly rollups instead, each
+month at the rate of its last day, so their cost does not grow with the
+number of rows.
+
+Rates are cached per (date, pair) under the rates version that
+``load_fx_rates`` bumps; the rates a request is missing are read with at
+most two queries per currency pair.
+"""
+import bisect
+import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from userpreferences.models import ExchangeRate, UserPreference
+from .cache import bump_data_version, rates_version
+from .money import Money, minor_digits
+from .rollups import next_month
+
+CURRENCY_KEY = 'base-currency:%s'
+RATE_KEY = 'fx-rate:%s:%s:%s:%s'
+
+
+def base_currency(user_id):
+    """The currency the totals of ``user_id`` are reported in."""
+    key = CURRENCY_KEY % user_id
+    currency = cache.get(key)
+    if currency is None:
+        currency = (UserPreference.objects.filter(user_id=user_id).values_list('currency', flat=True).first()
+                    or settings.DEFAULT_CURRENCY)
+        cache.set(key, currency, None)
+    return currency
+
+
+def preference_changed(sender, instance, **kwargs):
+    """``UserPreference`` save/delete receiver: totals in the old currency are stale."""
+    cache.delete(CURRENCY_KEY % instance.user_id)
+    bump_data_version(instance.user_id)
+
+
+def pair_history(currency, base, first, last):
+    """[(date, rate)] of ``currency`` in ``base`` covering ``first``..``last``, using the inverse pair if need be."""
+    for pair, invert in (((currency, base), False), ((base, currency), True)):
+        rows = ExchangeRate.objects.filter(base=pair[0], quote=pair[1])
+        history = list(rows.filter(date__lte=first).order_by('-date').values_list('date', 'rate')[:1])
+        history += rows.filter(date__gt=first, date__lte=last).order_by('date').values_list('date', 'rate')
+        if history:
+            return [(date, 1 / rate if invert else rate) for date, rate in history]
+    return []
+
+
+def rates(keys):
+    """
+    Map each (day, currency, base) of ``keys`` to the rate of ``currency``
+    in ``base`` that day; keys without a rate on or before their day are
+    left out.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    version = rates_version()
+    cache_keys = {key: RATE_KEY % (version, key[0].isoformat(), key[1], key[2]) for key in keys}
+    cached = cache.get_many(list(cache_keys.values()))
+    found = {key: cached[cache_key] for key, cache_key in cache_keys.items() if cache_key in cached}
+
+    days_by_pair = {}
+    for day, currency, base in keys - set(found):
+        days_by_pair.setdefault((currency, base), []).append(day)
+    fetched = {}
+    for (currency, base), days in days_by_pair.items():
+        history = pair_history(currency, base, min(days), max(days))
+        dates = [date for date, rate in history]
+        for day in days:
+            index = bisect.bisect_right(dates, day) - 1
+            if index >= 0:
+                fetched[(day, currency, base)] = history[index][1]
+    if fetched:
+        cache.set_many({cache_keys[key]: rate for key, rate in fetched.items()}, settings.FX_RATE_CACHE_TIMEOUT)
+    found.update(fetched)
+    return found
+
+
+def foreign_groups(queryset, base, fields=()):
+    """
+    Rows of ``queryset`` not in ``base``, summed per ``fields``, currency and
+    day, each with its sum ``converted`` to ``base`` minor units, or None
+    when there is no rate for the day.
+    """
+    others = other_currencies(base)
+    if not others:
+        return []
+    groups = list(queryset.filter(currency__in=others).order_by()
+                  .values(*{*fields, 'currency', 'date'}).annotate(minor=Sum('amount_minor')))
+    return convert(groups, base)
+
+
+def foreign_rollups(rollups, base, today):
+    """
+    Like ``foreign_groups`` over the monthly ``rollups``: their totals not in
+    ``base`` summed per month and currency, converted at the rate of the
+    month's last day, or of ``today`` for this month and later ones.
+    """
+    others = other_currencies(base)
+    if not others:
+        return []
+    groups = list(rollups.filter(currency__in=others).order_by()
+                  .values('month', 'currency').annotate(minor=Sum('total_minor')))
+    for group in groups:
+        group['date'] = min(next_month(group['month']) - datetime.timedelta(days=1), today)
+    return convert(groups, base)
+
+
+def other_currencies(base):
+    return [currency for currency in settings.CURRENCIES if currency != base]
+
+
+def convert(groups, base):
+    """Set the ``converted`` sum of each of ``groups`` (with ``date``, ``currency`` and ``minor``)."""
+    table = rates((group['date'], group['currency'], base) for group in groups)
+    for group in groups:
+        rate = table.get((group['date'], group['currency'], base))
+        scale = Decimal(1).scaleb(minor_digits(base) - minor_digits(group['currency']))
+        group['converted'] = None if rate is None else Decimal(group['minor']) * rate * scale
+    return groups
+
+
+def sum_converted(groups, key=lambda group: None):
+    """Add up the ``converted`` sums of ``groups`` per ``key(group)``, rounded to whole minor units."""
+    totals = {}
+    for group in groups:
+        if group['converted'] is not None:
+            name = key(group)
+            totals[name] = totals.get(name, 0) + group['converted']
+    return {name: int(total.to_integral_value(rounding=ROUND_HALF_UP)) for name, total in totals.items()}
+
+
+def unconverted(groups):
+    """The sums of ``groups`` without a rate, as ``Money`` of their own currency per currency."""
+    totals = {}
+    for group in groups:
+        if group['converted'] is None:
+            totals[group['currency']] = totals.get(group['currency'], 0) + group['minor']
+    return {currency: Money.from_minor(total, currency) for currency, total in totals.items()}
@@ -0,0 +1,48 @@
+"""
+The ASGI handler ``ExpenseTracker.asgi`` serves.
+
+Django 3.2 iterates a ``StreamingHttpResponse`` on the event loop, where the
+queries of a streamed export (``values_list().iterator()``) raise
+``SynchronousOnlyOperation`` once the header row is sent. ``ASGIHandler``
+reads each part of a streaming response in Django's sync thread instead,
+where the view ran and its connection lives.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers import asgi
+
+
+def response_headers(response):
+    """The headers and cookies of ``response`` as ASGI header pairs."""
+    headers = []
+    for header, value in response.items():
+        if isinstance(header, str):
+            header = header.encode('ascii')
+        if isinstance(value, str):
+            value = value.encode('latin1')
+        headers.append((bytes(header), bytes(value)))
+    for cookie in response.cookies.values():
+        headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+    return headers
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """Django's ASGI handler, reading streaming responses off the event loop."""
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers(response),
+        })
+        parts = iter(response)
+        next_part = sync_to_async(next, thread_sensitive=True)
+        while True:
+            part = await next_part(parts, None)
+            if part is None:
+                break
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
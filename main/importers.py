@@ -0,0 +1,195 @@
+"""
+Streaming CSV/OFX/QIF import of expenses and income.
+
+Uploads are decoded and parsed line by line and saved with ``bulk_create``
+in batches of ``settings.IMPORT_BATCH_SIZE`` inside one transaction, so
+memory use does not grow with the file. Only the first
+``MAX_REPORTED_ERRORS`` row errors are kept for the report.
+"""
+import csv
+import datetime
+import io
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from main.cache import bump_data_version
+from main.rollups import rebuild_rollups
+
+MAX_REPORTED_ERRORS = 100
+FORMATS = (
+    ('csv', 'CSV'),
+    ('ofx', 'OFX'),
+    ('qif', 'QIF'),
+)
+OFX_TAG_RE = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+class ImportResult:
+
+    def __init__(self):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def parse_csv(lines, label_field):
+    reader = csv.DictReader(lines)
+    missing = {'date', 'amount', label_field} - set(reader.fieldnames or ())
+    if missing:
+        raise ImportFormatError('CSV header is missing: %s' % ', '.join(sorted(missing)))
+    for row in reader:
+        yield reader.line_num, {
+            'date': row.get('date'),
+            'amount': row.get('amount'),
+            'description': row.get('description'),
+            'label': row.get(label_field),
+            'currency': row.get('currency'),
+        }
+
+
+def parse_ofx(lines):
+    record, start = None, None
+    for line_no, line in enumerate(lines, 1):
+        for closing, tag, value in OFX_TAG_RE.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and record is not None:
+                    yield start, record
+                    record = None
+                elif not closing:
+                    record, start = {'description': ''}, line_no
+            elif record is not None and not closing:
+                value = value.strip()
+                if tag == 'DTPOSTED':
+                    record['date'] = value[:8]
+                elif tag == 'TRNAMT':
+                    record['amount'] = value
+                elif tag == 'NAME' or (tag == 'MEMO' and not record['description']):
+                    record['description'] = value
+
+
+def parse_qif(lines):
+    record, start = {}, None
+    for line_no, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('!'):
+            continue
+        if line.startswith('^'):
+            if record:
+                yield start, record
+            record, start = {}, None
+            continue
+        start = start or line_no
+        code, value = line[0], line[1:].strip()
+        if code == 'D':
+            record['date'] = value
+        elif code == 'T':
+            record['amount'] = value
+        elif code == 'P' or (code == 'M' and 'description' not in record):
+            record['description'] = value
+        elif code == 'L':
+            record['label'] = value
+    if record:
+        yield start, record
+
+
+def parse_date(value):
+    value = (value or '').strip()
+    for date_format in ('%Y-%m-%d', '%Y%m%d', '%m/%d/%Y', "%m/%d'%y", '%m/%d/%y'):
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError('invalid date %r' % value)
+
+
+def parse_amount(value):
+    try:
+        amount = abs(Decimal((value or '').strip().replace(',', '')))
+    except InvalidOperation:
+        raise ValueError('invalid amount %r' % value)
+    if not amount.is_finite() or not amount:
+        raise ValueError('invalid amount %r' % value)
+    return amount
+
+
+def records(upload, file_format, label_field):
+    lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', errors='replace', newline='')
+    if file_format == 'csv':
+        return parse_csv(lines, label_field)
+    if file_format == 'ofx':
+        return parse_ofx(lines)
+    if file_format == 'qif':
+        return parse_qif(lines)
+    raise ImportFormatError('Unsupported format %r' % file_format)
+
+
+def guess_format(upload, file_format=None):
+    if file_format:
+        return file_format.lower()
+    extension = upload.name.rsplit('.', 1)[-1].lower() if '.' in upload.name else ''
+    return extension if extension in dict(FORMATS) else 'csv'
+
+
+def import_file(model, owner, label_field, upload, file_format=None, labels=None, default_label=None,
+                batch_size=None, currency=None):
+    """
+    Import ``upload`` into ``model`` rows owned by ``owner``.
+
+    ``label_field`` is the category/source foreign key; ``labels`` maps the
+    names allowed in the file to their ids, and rows without a name use the
+    ``default_label`` id. Rows without a currency (a CSV ``currency``
+    column) are in ``currency``, by default ``DEFAULT_CURRENCY``.
+    """
+    labels = labels or {}
+    label_ids = set(labels.values())
+    currency = currency or settings.DEFAULT_CURRENCY
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    rows = records(upload, guess_format(upload, file_format), label_field)
+    result = ImportResult()
+    batch = []
+    with transaction.atomic():
+        for line, record in rows:
+            try:
+                name = (record.get('label') or '').strip()
+                label = labels.get(name) if name else default_label
+                if label not in label_ids:
+                    raise ValueError('unknown %s %r' % (label_field, name or None))
+                row_currency = (record.get('currency') or '').strip().upper() or currency
+                if row_currency not in settings.CURRENCIES:
+                    raise ValueError('unknown currency %r' % row_currency)
+                batch.append(model(owner=owner, currency=row_currency, date=parse_date(record.get('date')),
+                                   amount=parse_amount(record.get('amount')),
+                                   description=(record.get('description') or '').strip(),
+                                   **{label_field + '_id': label}))
+            except ValueError as ex:
+                result.add_error(line, str(ex))
+                continue
+            except ValidationError as ex:
+                result.add_error(line, ' '.join(ex.messages))
+                continue
+            if len(batch) >= batch_size:
+                model.objects.bulk_create(batch)
+                result.created += len(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+        result.created += len(batch)
+        if result.created:
+            # bulk_create skips the signals that keep rollups in step.
+            rebuild_rollups(owner, model)
+    if result.created:
+        bump_data_version(owner.pk)
+    return result
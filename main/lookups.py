@@ -0,0 +1,113 @@
+"""
+Process-local snapshots of the small lookup tables (expense categories and
+income sources).
+
+Forms render and validate against ``lookup(Category)`` instead of querying
+the table on every request. A snapshot is trusted for
+``LOOKUP_CACHE_TIMEOUT`` seconds; after that the table's version key in the
+shared cache is compared and the rows are reloaded only if another process
+changed them. Saves and deletes drop this process's snapshot at once and
+bump the shared version when the transaction commits.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .cache import _fresh_version
+
+VERSION_KEY = 'lookup-version:%s'
+
+
+class Snapshot:
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.rows = rows
+        self.by_id = {row.pk: row for row in rows}
+        self.names = {row.pk: row.name for row in rows}
+        self.ids = {row.name: row.pk for row in rows}
+
+
+class LookupTable:
+    """Cached rows of one lookup ``model``; see the module docstring."""
+
+    def __init__(self, model):
+        self.model = model
+        self.key = VERSION_KEY % model._meta.label_lower
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def version(self):
+        return cache.get_or_set(self.key, _fresh_version, None)
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.checked_at < settings.LOOKUP_CACHE_TIMEOUT:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and self._snapshot is not snapshot:
+                return self._snapshot
+            # Read the version before the rows: a change committed in between
+            # leaves the snapshot one version behind, so it is reloaded later.
+            version = self.version()
+            if snapshot is not None and snapshot.version == version:
+                snapshot.checked_at = time.monotonic()
+            else:
+                snapshot = Snapshot(version, list(self.model.objects.order_by('pk')))
+            self._snapshot = snapshot
+            return snapshot
+
+    def all(self):
+        return self.snapshot().rows
+
+    def get(self, pk):
+        """The row with id ``pk`` (an int or a posted string), or ``None``."""
+        if isinstance(pk, str):
+            if not pk.isdigit():
+                return None
+            pk = int(pk)
+        return self.snapshot().by_id.get(pk)
+
+    def names(self):
+        """Map every id to its name."""
+        return self.snapshot().names
+
+    def ids(self):
+        """Map every name to its id."""
+        return self.snapshot().ids
+
+    def invalidate(self):
+        self._snapshot = None
+
+        def committed():
+            self._snapshot = None
+            try:
+                cache.incr(self.key)
+            except ValueError:
+                cache.set(self.key, _fresh_version(), None)
+        transaction.on_commit(committed)
+
+
+_tables = {}
+
+
+def lookup(model):
+    """The shared ``LookupTable`` of ``model``."""
+    table = _tables.get(model)
+    if table is None:
+        table = _tables.setdefault(model, LookupTable(model))
+    return table
+
+
+def track_lookup(model):
+    """Invalidate ``lookup(model)`` whenever a ``model`` row changes."""
+    def changed(sender, **kwargs):
+        lookup(model).invalidate()
+
+    post_save.connect(changed, sender=model, weak=False, dispatch_uid='lookup_post_save')
+    post_delete.connect(changed, sender=model, weak=False, dispatch_uid='lookup_post_delete')
@@ -0,0 +1,97 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from main.benchmark import (BENCHMARK_PASSWORD, BENCHMARK_USERNAME, compare_to_baseline, run_benchmark,
+                            run_concurrency_benchmark, run_connection_benchmark)
+
+
+class Command(BaseCommand):
+    help = ('Time the expense, income and auth views in-process and compare with a baseline. '
+            'Run `manage.py seed_data` first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Requests per view.')
+        parser.add_argument('--user', default=BENCHMARK_USERNAME, help='User to request the pages as.')
+        parser.add_argument('--password', default=BENCHMARK_PASSWORD)
+        parser.add_argument('--baseline', help='Baseline JSON file to compare against.')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Write the results to --baseline instead of comparing.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p95 slowdown against the baseline, as a fraction.')
+        parser.add_argument('--concurrency', type=int, default=0,
+                            help='Also compare WSGI and ASGI throughput of the async views with this many '
+                                 'requests in flight, spread over the seeded benchmark users.')
+        parser.add_argument('--concurrent-requests', type=int, default=200,
+                            help='Requests per view for the --concurrency comparison.')
+        parser.add_argument('--connections', type=int, default=0,
+                            help='Also compare the connection setup cost of this many requests with '
+                                 'connections closed after each request and kept open.')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError('No user named %r; run `manage.py seed_data` first' % options['user'])
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            try:
+                results = run_benchmark(user, options['iterations'], password=options['password'])
+            except ValueError as ex:
+                raise CommandError(str(ex))
+
+        self.stdout.write('%-26s %8s %9s %9s %9s %8s' % ('view', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+        for name, row in results.items():
+            self.stdout.write('%-26s %8.1f %9.2f %9.2f %9.2f %8d' % (
+                name, row['rps'], row['p50_ms'], row['p95_ms'], row['p99_ms'], row['queries']))
+        if options['concurrency'] > 0:
+            self.compare_servers(user, options)
+        if options['connections'] > 0:
+            self.compare_connections(user, options)
+
+        if not options['baseline']:
+            return
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as baseline_file:
+                json.dump(results, baseline_file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS('Baseline written to %s' % options['baseline']))
+            return
+        with open(options['baseline']) as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file), options['tolerance'])
+        if regressions:
+            raise CommandError('Performance regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against %s' % options['baseline']))
+
+    def compare_servers(self, user, options):
+        users = [user]
+        if user.username == BENCHMARK_USERNAME:
+            users = list(User.objects.filter(username__startswith='bench_user_').order_by('id')
+                         [:options['concurrency']])
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            try:
+                results = run_concurrency_benchmark(users, options['concurrency'], options['concurrent_requests'],
+                                                    password=options['password'])
+            except ValueError as ex:
+                raise CommandError(str(ex))
+
+        self.stdout.write('\n%d requests in flight over %d users' % (options['concurrency'], len(users)))
+        self.stdout.write('%-26s %10s %10s %10s %10s %8s %8s' % (
+            'view', 'wsgi req/s', 'asgi req/s', 'wsgi p95', 'asgi p95', 'wsgi 409', 'asgi 409'))
+        for name, row in results.items():
+            wsgi, asgi = row['wsgi'], row['asgi']
+            self.stdout.write('%-26s %10.1f %10.1f %10.2f %10.2f %8d %8d' % (
+                name, wsgi['rps'], asgi['rps'], wsgi['p95_ms'], asgi['p95_ms'], wsgi['superseded'],
+                asgi['superseded']))
+
+    def compare_connections(self, user, options):
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            try:
+                results = run_connection_benchmark(user, options['connections'], password=options['password'])
+            except ValueError as ex:
+                raise CommandError(str(ex))
+
+        self.stdout.write('\n%d requests per CONN_MAX_AGE' % options['connections'])
+        self.stdout.write('%-14s %8s %8s %12s %9s' % ('CONN_MAX_AGE', 'opened', 'reused', 'connect ms', 'p50 ms'))
+        for max_age, row in results.items():
+            self.stdout.write('%-14s %8d %8d %12.3f %9.2f' % (
+                max_age, row['opened'], row['reused'], row['connect_ms'], row['p50_ms']))
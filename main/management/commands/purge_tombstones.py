@@ -0,0 +1,46 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
+
+from expenses.models import Expense
+from main.cache import bump_data_version
+from userincome.models import UserIncome
+
+PURGE_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Permanently remove soft-deleted expenses and income older than SYNC_TOMBSTONE_DAYS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SYNC_TOMBSTONE_DAYS,
+                            help='Keep tombstones younger than this many days.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+        owners = set()
+        for model in (Expense, UserIncome):
+            tombstones = model.all_objects.filter(deleted_at__lt=cutoff)
+            connection = connections[tombstones.db]
+            table, column = (connection.ops.quote_name(name) for name in (model._meta.db_table, model._meta.pk.column))
+            sql = 'DELETE FROM %s WHERE %s IN (%%s)' % (table, column)
+            deleted = 0
+            while True:
+                batch = list(tombstones.order_by('pk').values_list('pk', 'owner_id')[:PURGE_BATCH_SIZE])
+                if not batch:
+                    break
+                # Tombstones are already out of the rollups: delete them in
+                # SQL, without loading the rows or sending a delete signal
+                # (a rollup adjustment and a version bump) for each.
+                with transaction.atomic(using=tombstones.db), connection.cursor() as cursor:
+                    cursor.execute(sql % ', '.join(['%s'] * len(batch)), [pk for pk, _ in batch])
+                    deleted += cursor.rowcount
+                owners.update(owner_id for _, owner_id in batch)
+            self.stdout.write('%s: %d purged' % (model._meta.verbose_name_plural, deleted))
+        # Once per owner: cached sync responses may still list the purged rows.
+        for owner_id in owners:
+            bump_data_version(owner_id)
+        self.stdout.write(self.style.SUCCESS('Tombstones purged'))
@@ -0,0 +1,20 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from main.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the monthly expense and income rollup tables from raw rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild the rollups of this username.')
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['user']:
+            owner = User.objects.filter(username=options['user']).first()
+            if owner is None:
+                raise CommandError('No user named %r' % options['user'])
+        rebuild_rollups(owner)
+        self.stdout.write(self.style.SUCCESS('Rollups rebuilt'))
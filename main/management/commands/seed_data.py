@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from main.benchmark import BENCHMARK_PASSWORD, seed_users
+
+
+class Command(BaseCommand):
+    help = 'Create benchmark users (bench_user_<n>) with generated expenses and income.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Number of users.')
+        parser.add_argument('--expenses', type=int, default=1000, help='Expenses per user.')
+        parser.add_argument('--incomes', type=int, default=100, help='Incomes per user.')
+        parser.add_argument('--days', type=int, default=730, help='Spread rows over this many past days.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for repeatable data.')
+        parser.add_argument('--password', default=BENCHMARK_PASSWORD, help='Password of the created users.')
+
+    def handle(self, *args, **options):
+        owners = seed_users(options['users'], options['expenses'], options['incomes'], days=options['days'],
+                            seed=options['seed'], password=options['password'])
+        self.stdout.write(self.style.SUCCESS('Seeded %d users with %d expenses and %d incomes each' % (
+            len(owners), options['expenses'], options['incomes'])))
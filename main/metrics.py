@@ -0,0 +1,203 @@
+"""
+In-process request metrics collected by ``RequestMetricsMiddleware``.
+
+Samples are kept per URL name in bounded ring buffers, so percentiles
+reflect the most recent ``METRICS_SAMPLE_SIZE`` requests of each view of
+this worker process only. Database connections opened, reused and failed
+are counted by main.connections, whatever ``REQUEST_METRICS`` says.
+
+The ``QueryRecorder`` of a request is also kept in a context variable, so
+the database threads of async views (main.aio) count their queries too.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+METRICS_SAMPLE_SIZE = 1000
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+SAVEPOINT_RE = re.compile(r'"s\d+_x\d+"')
+SPACE_RE = re.compile(r'\s+')
+
+_recorder = ContextVar('query_recorder', default=None)
+_exhausted = object()
+
+
+def fingerprint(sql):
+    """Reduce ``sql`` to its shape: literals and IN lists become placeholders."""
+    sql = LITERAL_RE.sub('?', SAVEPOINT_RE.sub('?', sql))
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` that times and fingerprints every query."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        # Async views may query from several threads at once.
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            shape = fingerprint(sql)
+            with self.lock:
+                self.duration += duration
+                self.count += 1
+                self.fingerprints[shape] += 1
+
+    def duplicates(self):
+        """Query shapes run more than once in the request, most repeated first."""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count > 1]
+
+
+@contextmanager
+def record_connections(recorder):
+    """Feed the queries of this thread's connections to ``recorder``; a no-op when it is None."""
+    with ExitStack() as stack:
+        if recorder is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+@contextmanager
+def recording(recorder):
+    """
+    Feed ``recorder`` the queries run in this thread and, through
+    ``active_recorder``, those of the database threads started meanwhile.
+    """
+    token = _recorder.set(recorder)
+    try:
+        with record_connections(recorder):
+            yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+def active_recorder():
+    """The recorder of the enclosing ``recording`` block, if any."""
+    return _recorder.get()
+
+
+def record_active(execute, sql, params, many, context):
+    """``execute_wrapper`` feeding ``active_recorder()``, unless that already wraps the connection."""
+    recorder = _recorder.get()
+    if recorder is None or recorder in context['connection'].execute_wrappers:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def record_active_connections():
+    """
+    Keep ``record_active`` on this thread's connections. For a thread that
+    concurrent requests share (Django's sync thread under ASGI), where each
+    query is fed to the recorder of the request that runs it.
+    """
+    for connection in connections.all():
+        if record_active not in connection.execute_wrappers:
+            connection.execute_wrappers.append(record_active)
+
+
+def recorded(iterable, recorder):
+    """Iterate ``iterable`` with ``recorder`` active while each item is produced."""
+    iterator = iter(iterable)
+    while True:
+        token = _recorder.set(recorder)
+        try:
+            item = next(iterator, _exhausted)
+        finally:
+            _recorder.reset(token)
+        if item is _exhausted:
+            return
+        yield item
+
+
+class ViewStats:
+
+    def __init__(self):
+        self.requests = 0
+        self.durations = deque(maxlen=METRICS_SAMPLE_SIZE)
+        self.query_counts = deque(maxlen=METRICS_SAMPLE_SIZE)
+        self.query_durations = deque(maxlen=METRICS_SAMPLE_SIZE)
+        self.duplicate_queries = Counter()
+
+    def add(self, duration, recorder):
+        self.requests += 1
+        self.durations.append(duration)
+        self.query_counts.append(recorder.count)
+        self.query_durations.append(recorder.duration)
+        for sql, count in recorder.duplicates():
+            self.duplicate_queries[sql] += count
+
+    def summary(self):
+        durations = sorted(self.durations)
+        return {
+            'requests': self.requests,
+            'p50_ms': _ms(percentile(durations, 0.50)),
+            'p95_ms': _ms(percentile(durations, 0.95)),
+            'p99_ms': _ms(percentile(durations, 0.99)),
+            'avg_queries': round(sum(self.query_counts) / len(self.query_counts), 1),
+            'avg_sql_ms': _ms(sum(self.query_durations) / len(self.query_durations)),
+            'duplicate_queries': [{'sql': sql, 'count': count}
+                                  for sql, count in self.duplicate_queries.most_common(10)],
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+_lock = threading.Lock()
+_stats = {}
+_connection_events = Counter()
+CONNECTION_EVENTS = ('opened', 'reused', 'failed')
+
+
+def record(view_name, duration, recorder):
+    with _lock:
+        _stats.setdefault(view_name, ViewStats()).add(duration, recorder)
+
+
+def request_stats():
+    """Percentiles and query counts per URL name, slowest p95 first."""
+    with _lock:
+        summaries = {name: stats.summary() for name, stats in _stats.items()}
+    return dict(sorted(summaries.items(), key=lambda item: -item[1]['p95_ms']))
+
+
+def record_connection(event):
+    """Count a database connection ``event``, one of ``CONNECTION_EVENTS``."""
+    with _lock:
+        _connection_events[event] += 1
+
+
+def connection_stats():
+    with _lock:
+        return {event: _connection_events[event] for event in CONNECTION_EVENTS}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _connection_events.clear()
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics
+from .routers import RequestState, request_state
+
+logger = logging.getLogger('main.metrics')
+
+
+class RequestMetricsMiddleware:
+    """
+    Time each request and account for its SQL.
+
+    Adds a ``Server-Timing`` header (total, SQL time and query count), logs
+    requests slower than ``SLOW_REQUEST_MS`` as one JSON record on the
+    ``main.metrics`` logger, and feeds the per-view aggregates served at
+    ``stats/requests``. Enabled with ``REQUEST_METRICS=True``.
+
+    The headers of a streaming response (CSV/PDF exports) go out before its
+    body is produced, so its ``Server-Timing`` covers the view only. Its
+    log record and aggregates are taken when the server closes the
+    response instead, and include the body's time and queries.
+
+    Sync and async capable, like ``MiddlewareMixin``, so an ASGI chain is
+    not adapted to sync around it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the instance as a coroutine function for Django's handler.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        recorder = metrics.QueryRecorder()
+        start = time.perf_counter()
+        with metrics.recording(recorder):
+            response = self.get_response(request)
+        if response.streaming:
+            # Keep counting the queries the body runs on this thread's connections.
+            body = ExitStack()
+            body.enter_context(metrics.record_connections(recorder))
+            response._resource_closers.append(body.close)
+        return self.process_response(request, response, start, recorder)
+
+    async def __acall__(self, request):
+        recorder = metrics.QueryRecorder()
+        start = time.perf_counter()
+        with metrics.recording(recorder):
+            # Sync views query from Django's sync thread, shared by concurrent requests.
+            await sync_to_async(metrics.record_active_connections)()
+            response = await self.get_response(request)
+        if response.streaming:
+            # main.handlers.ASGIHandler reads the body in that thread too.
+            response.streaming_content = metrics.recorded(response.streaming_content, recorder)
+        return self.process_response(request, response, start, recorder)
+
+    def process_response(self, request, response, start, recorder):
+        duration = time.perf_counter() - start
+        response['Server-Timing'] = 'app;dur=%.1f, db;dur=%.1f;desc="%d queries"' % (
+            duration * 1000, recorder.duration * 1000, recorder.count)
+        if not response.streaming:
+            self.record(request, response, duration, recorder)
+        else:
+            response._resource_closers.append(
+                lambda: self.record(request, response, time.perf_counter() - start, recorder))
+        return response
+
+    def record(self, request, response, duration, recorder):
+        match = request.resolver_match
+        view_name = match.view_name if match is not None else '<unresolved>'
+        metrics.record(view_name, duration, recorder)
+        if duration * 1000 >= settings.SLOW_REQUEST_MS:
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'view': view_name,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'queries': recorder.count,
+                'sql_ms': round(recorder.duration * 1000, 2),
+                'duplicate_queries': [{'sql': sql, 'count': count} for sql, count in recorder.duplicates()[:5]],
+            }))
+
+
+class ReplicaPinMiddleware:
+    """
+    Pin a user's reads to the primary for ``REPLICA_PIN_SECONDS`` after a
+    request of theirs writes, via a cookie holding the end of the window.
+    Only used when ``DATABASE_REPLICAS`` is set; see main.routers. Sync and
+    async capable, like ``RequestMetricsMiddleware``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the instance as a coroutine function for Django's handler.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with request_state(self.request_state(request)) as state:
+            response = self.get_response(request)
+        return self.process_response(response, state)
+
+    async def __acall__(self, request):
+        # The state is a context variable, so the view's threads see it too.
+        with request_state(self.request_state(request)) as state:
+            response = await self.get_response(request)
+        return self.process_response(response, state)
+
+    def request_state(self, request):
+        try:
+            pinned = float(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return RequestState(pinned)
+
+    def process_response(self, response, state):
+        if state.wrote:
+            response.set_cookie(settings.REPLICA_PIN_COOKIE, '%d' % (time.time() + settings.REPLICA_PIN_SECONDS),
+                                max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, sync and async capable. WhiteNoise 5.2 is sync only, which
+    made Django adapt the whole ASGI chain to sync and run every request's
+    middleware in its single sync thread. Finding and opening a static file
+    does not touch the database, so the async path does it on the loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the instance as a coroutine function for Django's handler.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
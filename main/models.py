@@ -1,3 +1,81 @@
-# from django.db import models
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.contrib.auth.models import User
+from django.utils import timezone
 
-# Create your models here.
+from .money import Money, to_minor, validate_currency
+from .querysets import LiveTransactionManager, TransactionQuerySet
+
+
+class MonthlyRollup(models.Model):
+    """Per-user monthly total of one category/source in one currency, kept in step by main.rollups."""
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, related_name='+')
+    month = models.DateField()
+    currency = models.CharField(max_length=3, default=settings.DEFAULT_CURRENCY)
+    total_minor = models.BigIntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class MoneyAmount(models.Model):
+    """
+    An amount held as integer minor units of ``currency`` (see main.money).
+
+    ``amount`` reads and writes it as ``Money``; assigning a number or a
+    numeric string (e.g. from a form) rounds it to the minor unit and raises
+    ValidationError when it is not a number.
+    """
+    amount_minor = models.BigIntegerField()
+    currency = models.CharField(max_length=3, default=settings.DEFAULT_CURRENCY, validators=[validate_currency])
+
+    class Meta:
+        abstract = True
+
+    @property
+    def amount(self):
+        if self.amount_minor is None:
+            return None
+        return Money.from_minor(self.amount_minor, self.currency)
+
+    @amount.setter
+    def amount(self, value):
+        if value is None or value == '':
+            self.amount_minor = None
+            return
+        try:
+            self.amount_minor = to_minor(value, self.currency)
+        except ValidationError as ex:
+            raise ValidationError({'amount': ex.messages})
+
+    def clean_fields(self, exclude=None):
+        try:
+            super().clean_fields(exclude)
+        except ValidationError as ex:
+            # Report the column under the name callers set.
+            errors = ex.message_dict
+            if 'amount_minor' in errors:
+                errors['amount'] = errors.pop('amount_minor')
+            raise ValidationError(errors)
+
+
+class SyncedTransaction(models.Model):
+    """
+    Change tracking for delta sync (see main.sync): ``updated_at`` moves on
+    every save, and ``soft_delete`` leaves a tombstone that ``objects`` hides
+    and ``all_objects`` still returns until ``purge_tombstones`` removes it.
+    """
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = LiveTransactionManager()
+    all_objects = TransactionQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def soft_delete(self):
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at', 'updated_at'])
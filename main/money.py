@@ -0,0 +1,103 @@
+"""
+Money amounts stored as integer minor units.
+
+Expense and income amounts are kept in a ``BIGINT`` column of minor units
+(paise, cents) next to a three-letter currency code, so sums are exact
+integer aggregates and amount searches are range filters on an indexable
+integer column. Python code sees ``Money``, a ``Decimal`` rounded to the
+currency's minor unit that remembers its currency; Django's JSON encoder
+writes it as a decimal string ("12.50") and templates print it as such.
+"""
+from decimal import ROUND_CEILING, ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# ISO 4217 currencies whose minor unit is not a hundredth.
+MINOR_DIGITS = {
+    'BHD': 3, 'IQD': 3, 'JOD': 3, 'KWD': 3, 'LYD': 3, 'OMR': 3, 'TND': 3,
+    'CLP': 0, 'ISK': 0, 'JPY': 0, 'KRW': 0, 'UGX': 0, 'VND': 0,
+}
+MAX_MINOR = 2 ** 63 - 1
+
+
+def minor_digits(currency):
+    return MINOR_DIGITS.get(currency, 2)
+
+
+def quantum(currency):
+    return Decimal(1).scaleb(-minor_digits(currency))
+
+
+class Money(Decimal):
+    """A ``Decimal`` amount of ``currency``, rounded half up to its minor unit."""
+    __slots__ = ('currency',)
+
+    def __new__(cls, value, currency=None):
+        currency = currency or settings.DEFAULT_CURRENCY
+        amount = Decimal(value).quantize(quantum(currency), rounding=ROUND_HALF_UP)
+        self = super().__new__(cls, amount)
+        self.currency = currency
+        return self
+
+    @classmethod
+    def from_minor(cls, minor, currency=None):
+        currency = currency or settings.DEFAULT_CURRENCY
+        return cls(Decimal(minor or 0).scaleb(-minor_digits(currency)), currency)
+
+    @property
+    def minor(self):
+        return int(self.scaleb(minor_digits(self.currency)))
+
+    def __reduce__(self):
+        # Cached responses and snapshots are pickled.
+        return self.__class__, (str(self), self.currency)
+
+    def __repr__(self):
+        return "Money('%s', '%s')" % (self, self.currency)
+
+
+def validate_currency(value):
+    if value not in settings.CURRENCIES:
+        raise ValidationError('%(value)s is not a supported currency.', code='invalid', params={'value': value})
+
+
+def to_minor(value, currency=None):
+    """Minor units of ``value`` (a number or numeric string); raises ValidationError."""
+    try:
+        amount = Money(value.strip() if isinstance(value, str) else value, currency)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValidationError('Enter a valid amount.', code='invalid')
+    if not amount.is_finite() or abs(amount.minor) > MAX_MINOR:
+        raise ValidationError('Enter a valid amount.', code='invalid')
+    return amount.minor
+
+
+def money_rows(rows):
+    """Copies of ``values()`` rows with ``amount_minor``/``currency`` turned into ``amount``."""
+    return [dict({key: value for key, value in row.items() if key != 'amount_minor'},
+                 amount=Money.from_minor(row['amount_minor'], row['currency']))
+            for row in rows]
+
+
+def amount_range_q(low, high):
+    """
+    Match ``amount_minor`` in [``low``, ``high``) for every currency in use.
+
+    ``low`` and ``high`` are decimal amounts. Each group of
+    ``settings.CURRENCIES`` sharing a minor unit gets its own integer range
+    on the (owner, amount_minor) index; with a single group the currency is
+    not filtered at all.
+    """
+    groups = {}
+    for currency in settings.CURRENCIES:
+        groups.setdefault(minor_digits(currency), []).append(currency)
+    condition = Q()
+    for digits, currencies in sorted(groups.items()):
+        bounds = [int(value.scaleb(digits).to_integral_value(rounding=ROUND_CEILING)) for value in (low, high)]
+        group = Q(amount_minor__gte=bounds[0], amount_minor__lt=bounds[1])
+        if len(groups) > 1:
+            group &= Q(currency__in=currencies)
+        condition |= group
+    return condition
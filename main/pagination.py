@@ -0,0 +1,122 @@
+"""
+Cursor pagination over newest-first (date, id) orderings.
+
+Each page is one index range scan of ``per_page + 1`` rows on the
+(owner, date, id) index, however deep the user has paged, and the optional
+count stops at ``count_limit`` rows so it stays bounded as well.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.dateparse import parse_date
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, row):
+    return urlsafe_base64_encode(force_bytes('%s|%s|%d' % (direction, row.date.isoformat(), row.pk)))
+
+
+def decode_cursor(cursor):
+    """Return (direction, date, id) or None for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        direction, date, pk = force_str(urlsafe_base64_decode(cursor)).split('|')
+        date, pk = parse_date(date), int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or date is None:
+        return None
+    return direction, date, pk
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, next_cursor, previous_cursor, count=None, count_is_exact=True):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+        self.count_is_exact = count_is_exact
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` newest first by (date, id).
+
+    ``count_limit`` enables a bounded row count: exact up to the limit,
+    reported as ``count_limit`` with ``count_is_exact=False`` beyond it.
+    """
+
+    def __init__(self, queryset, per_page, count_limit=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count_limit = count_limit
+
+    def get_page(self, cursor=None):
+        position = decode_cursor(cursor)
+        if position is None:
+            rows = list(self.queryset.order_by('-date', '-id')[:self.per_page + 1])
+            has_more_newer, has_more_older = False, len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        else:
+            direction, date, pk = position
+            if direction == NEXT:
+                older = Q(date__lt=date) | Q(date=date, id__lt=pk)
+                rows = list(self.queryset.filter(older).order_by('-date', '-id')[:self.per_page + 1])
+                has_more_newer, has_more_older = True, len(rows) > self.per_page
+                rows = rows[:self.per_page]
+            else:
+                newer = Q(date__gt=date) | Q(date=date, id__gt=pk)
+                rows = list(self.queryset.filter(newer).order_by('date', 'id')[:self.per_page + 1])
+                has_more_newer, has_more_older = len(rows) > self.per_page, True
+                rows = rows[:self.per_page][::-1]
+
+        next_cursor = encode_cursor(NEXT, rows[-1]) if rows and has_more_older else None
+        previous_cursor = encode_cursor(PREVIOUS, rows[0]) if rows and has_more_newer else None
+        count, count_is_exact = self.count()
+        return KeysetPage(rows, next_cursor, previous_cursor, count, count_is_exact)
+
+    def count(self):
+        if self.count_limit is None:
+            return None, True
+        count = self.queryset.order_by()[:self.count_limit + 1].count()
+        if count > self.count_limit:
+            return self.count_limit, False
+        return count, True
+
+
+def field_value(row, field):
+    """``row.field``, with foreign keys given as the raw id (no related fetch)."""
+    try:
+        return getattr(row, row._meta.get_field(field).attname)
+    except FieldDoesNotExist:
+        return getattr(row, field)
+
+
+def page_payload(page, fields):
+    """JSON-ready representation of ``page`` shared by the list endpoints."""
+    return {
+        'results': [{field: field_value(row, field) for field in fields} for row in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+        'count': page.count,
+        'count_is_exact': page.count_is_exact,
+    }
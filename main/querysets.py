@@ -0,0 +1,31 @@
+from django.db import models
+
+
+class TransactionQuerySet(models.QuerySet):
+    """
+    Query helpers shared by Expense and UserIncome.
+
+    Every helper filters on a prefix of the (owner, date, id) index so list,
+    search and summary queries never fall back to a full table scan.
+    """
+
+    def for_owner(self, user):
+        return self.filter(owner=user)
+
+    def between(self, start=None, end=None):
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(date__gte=start)
+        if end is not None:
+            queryset = queryset.filter(date__lte=end)
+        return queryset
+
+    def newest_first(self):
+        return self.order_by('-date', '-id')
+
+
+class LiveTransactionManager(models.Manager.from_queryset(TransactionQuerySet)):
+    """Default manager of Expense and UserIncome: soft-deleted rows are hidden."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
@@ -0,0 +1,140 @@
+"""
+Incremental maintenance of the per-user monthly rollup tables.
+
+``track_rollups`` hooks a transaction model's save/delete signals so every
+write moves its amount out of the old (owner, month, label, currency)
+bucket and into the new one. Bulk writes that bypass signals (``bulk_create``, ``update``)
+must call ``rebuild_rollups`` for the affected owners afterwards.
+
+Soft-deleted rows (``deleted_at`` set) belong to no bucket: the save that
+tombstones a row takes it out, and restoring it puts it back.
+"""
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_delete, post_save, pre_save
+
+REBUILD_BATCH_SIZE = 1000
+
+TRACKED = []
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+class RollupSpec:
+
+    def __init__(self, model, rollup_model, label_field):
+        self.model = model
+        self.rollup_model = rollup_model
+        self.label_field = label_field
+        # Group on the raw column (category_id rather than category) so no
+        # related row is ever fetched.
+        self.label_attname = model._meta.get_field(label_field).attname
+
+    def bucket(self, instance):
+        """
+        Return ((owner_id, month, label, currency), amount_minor) with form
+        strings coerced, or None for a tombstone.
+        """
+        if getattr(instance, 'deleted_at', None) is not None:
+            return None
+        opts = self.model._meta
+        date = opts.get_field('date').to_python(instance.date)
+        amount = opts.get_field('amount_minor').to_python(instance.amount_minor)
+        label = opts.get_field(self.label_field).to_python(getattr(instance, self.label_attname))
+        return (instance.owner_id, month_of(date), label, instance.currency), amount
+
+    def apply(self, key, amount, count):
+        owner_id, month, label, currency = key
+        lookup = {'owner_id': owner_id, 'month': month, 'currency': currency, self.label_attname: label}
+        rollups = self.rollup_model.objects.filter(**lookup)
+        if rollups.update(total_minor=F('total_minor') + amount, count=F('count') + count):
+            if count < 0:
+                rollups.filter(count__lte=0).delete()
+            return
+        if count < 0:
+            # Nothing left to take the row out of, e.g. the owner is being deleted.
+            return
+        try:
+            with transaction.atomic():
+                self.rollup_model.objects.create(total_minor=amount, count=count, **lookup)
+        except IntegrityError:
+            # Another request created the bucket between our update and insert.
+            rollups.update(total_minor=F('total_minor') + amount, count=F('count') + count)
+
+    def pre_save(self, sender, instance, raw=False, **kwargs):
+        instance._rollup_previous = None
+        if raw or instance.pk is None:
+            return
+        previous = self.model._base_manager.filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._rollup_previous = self.bucket(previous)
+
+    def post_save(self, sender, instance, raw=False, **kwargs):
+        if raw:
+            return
+        previous = getattr(instance, '_rollup_previous', None)
+        current = self.bucket(instance)
+        if current is None:
+            if previous is not None:
+                self.apply(previous[0], -previous[1], -1)
+            return
+        if previous is not None:
+            if previous[0] == current[0]:
+                if previous[1] != current[1]:
+                    self.apply(current[0], current[1] - previous[1], 0)
+                return
+            self.apply(previous[0], -previous[1], -1)
+        self.apply(current[0], current[1], 1)
+
+    def post_delete(self, sender, instance, **kwargs):
+        current = self.bucket(instance)
+        if current is not None:
+            self.apply(current[0], -current[1], -1)
+
+    def rebuild(self, owner=None):
+        rows = self.model._base_manager.filter(deleted_at__isnull=True)
+        rollups = self.rollup_model.objects.all()
+        if owner is not None:
+            rows = rows.filter(owner=owner)
+            rollups = rollups.filter(owner=owner)
+        grouped = (rows.order_by()
+                   .annotate(rollup_month=TruncMonth('date'))
+                   .values('owner_id', 'rollup_month', 'currency', self.label_attname)
+                   .annotate(rollup_total=Sum('amount_minor'), rollup_count=Count('id')))
+        with transaction.atomic():
+            rollups.delete()
+            batch = []
+            for row in grouped.iterator():
+                batch.append(self.rollup_model(
+                    owner_id=row['owner_id'], month=row['rollup_month'], currency=row['currency'],
+                    total_minor=row['rollup_total'], count=row['rollup_count'],
+                    **{self.label_attname: row[self.label_attname]}))
+                if len(batch) >= REBUILD_BATCH_SIZE:
+                    self.rollup_model.objects.bulk_create(batch)
+                    batch = []
+            self.rollup_model.objects.bulk_create(batch)
+
+
+def track_rollups(model, rollup_model, label_field):
+    spec = RollupSpec(model, rollup_model, label_field)
+    pre_save.connect(spec.pre_save, sender=model, weak=False, dispatch_uid='rollup_pre_save')
+    post_save.connect(spec.post_save, sender=model, weak=False, dispatch_uid='rollup_post_save')
+    post_delete.connect(spec.post_delete, sender=model, weak=False, dispatch_uid='rollup_post_delete')
+    TRACKED.append(spec)
+    return spec
+
+
+def rebuild_rollups(owner=None, model=None):
+    """Recompute the rollup tables of ``model`` (default: all), for one owner or for everyone."""
+    for spec in TRACKED:
+        if model is None or spec.model is model:
+            spec.rebuild(owner)
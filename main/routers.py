@@ -0,0 +1,106 @@
+"""
+Read replica routing.
+
+Writes, and every read by default, go to ``default``. Code running under
+``replica_reads()`` or a view decorated with ``read_replica`` (summaries,
+search, trends, exports) reads from one of ``DATABASE_REPLICAS`` instead,
+unless the request is pinned to the primary: ``ReplicaPinMiddleware`` pins
+a user for ``REPLICA_PIN_SECONDS`` after a request of theirs wrote, so they
+read their own writes while the replicas catch up, and a request that has
+written reads from the primary for the rest of its run.
+
+The state is held in context variables, which ``sync_to_async`` carries
+into the threads of the async views.
+"""
+import asyncio
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+_reads = ContextVar('replica_reads', default=False)
+_request = ContextVar('replica_request', default=None)
+
+
+class RequestState:
+    """Whether the current request is pinned to the primary or has written."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+@contextmanager
+def replica_reads():
+    token = _reads.set(True)
+    try:
+        yield
+    finally:
+        _reads.reset(token)
+
+
+@contextmanager
+def request_state(state):
+    token = _request.set(state)
+    try:
+        yield state
+    finally:
+        _request.reset(token)
+
+
+def read_replica(view):
+    """Serve the reads of a sync or async view from a replica."""
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapped(*args, **kwargs):
+            with replica_reads():
+                return await view(*args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            with replica_reads():
+                return view(*args, **kwargs)
+    return wrapped
+
+
+def is_primary(alias):
+    """Whether ``alias`` is the primary database under another name, e.g. a ``TEST['MIRROR']``."""
+    if alias not in settings.DATABASES:
+        return False
+    keys = ('ENGINE', 'HOST', 'PORT', 'NAME')
+    replica, primary = connections[alias].settings_dict, connections['default'].settings_dict
+    return all(replica.get(key) == primary.get(key) for key in keys)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or not _reads.get():
+            return None
+        state = _request.get()
+        if state is not None and (state.pinned or state.wrote):
+            return None
+        alias = random.choice(settings.DATABASE_REPLICAS)
+        if is_primary(alias):
+            # Read through the primary's own connection, which sees its
+            # uncommitted rows (those of a test case, for instance).
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
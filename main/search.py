@@ -0,0 +1,286 @@
+"""
+Ranked search over Expense and UserIncome.
+
+The query string is parsed once into a free-text part plus the amount and
+date ranges it could denote, so numbers and dates are matched with range
+filters on indexed columns instead of casting every row to text. Free text
+is handed to a backend picked from the database vendor (or
+``settings.SEARCH_BACKEND``): Postgres uses full-text search and trigram
+indexes, SQLite an FTS5 shadow table and anything else plain ``icontains``.
+"""
+import calendar
+import datetime
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from .money import amount_range_q
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+YEAR_RE = re.compile(r'^(\d{4})$')
+MONTH_RE = re.compile(r'^(\d{4})-(\d{1,2})$')
+DAY_RE = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})$')
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchQuery:
+    """A search string split into its text, amount range and date range."""
+
+    def __init__(self, text, amount_range=None, date_range=None):
+        self.text = text
+        self.amount_range = amount_range
+        self.date_range = date_range
+
+    @property
+    def words(self):
+        return WORD_RE.findall(self.text)
+
+
+def parse_amount_range(value):
+    """``12`` -> [12, 13), ``12.5`` -> [12.5, 12.6), anything else -> None."""
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or amount < 0:
+        return None
+    step = Decimal(1).scaleb(amount.as_tuple().exponent)
+    return amount, amount + step
+
+
+def parse_date_range(value):
+    """``2021`` / ``2021-05`` / ``2021-05-03`` -> inclusive (first, last) days."""
+    try:
+        match = DAY_RE.match(value)
+        if match:
+            day = datetime.date(*map(int, match.groups()))
+            return day, day
+        match = MONTH_RE.match(value)
+        if match:
+            year, month = map(int, match.groups())
+            return (datetime.date(year, month, 1),
+                    datetime.date(year, month, calendar.monthrange(year, month)[1]))
+        match = YEAR_RE.match(value)
+        if match and 1900 <= int(value) <= 2100:
+            year = int(value)
+            return datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+    except ValueError:
+        return None
+    return None
+
+
+def parse_query(search_str):
+    text = (search_str or '').strip()
+    return SearchQuery(text, parse_amount_range(text), parse_date_range(text))
+
+
+def clamp_window(params):
+    """Read ``limit``/``offset`` from request parameters, bounded to sane values."""
+    try:
+        limit = int(params.get('limit') or DEFAULT_LIMIT)
+        offset = int(params.get('offset') or 0)
+    except (TypeError, ValueError):
+        limit, offset = DEFAULT_LIMIT, 0
+    return min(max(limit, 1), MAX_LIMIT), max(offset, 0)
+
+
+class SearchBackend:
+    """Portable backend: ``icontains`` on the description, no ranking."""
+
+    def prepare(self, queryset, query):
+        return queryset
+
+    def text_filter(self, queryset, query):
+        return Q(description__icontains=query.text)
+
+    def rank(self, queryset, query):
+        return Value(0.0, output_field=FloatField())
+
+    def search(self, queryset, query, label_field):
+        if not query.text:
+            return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+
+        queryset = self.prepare(queryset, query)
+        condition = self.text_filter(queryset, query) | Q(**{label_field + '__icontains': query.text})
+        if query.amount_range:
+            condition |= amount_range_q(*query.amount_range)
+        if query.date_range:
+            condition |= Q(date__range=query.date_range)
+        return (queryset.filter(condition)
+                .annotate(rank=self.rank(queryset, query))
+                .order_by('-rank', '-date', '-id'))
+
+
+# Text search configuration of the Postgres full-text index; queries must
+# use the same one for the index to apply.
+POSTGRES_FTS_CONFIG = 'english'
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Full-text match plus trigram similarity.
+
+    ``icontains`` on the description is served by the ``UPPER(description)
+    gin_trgm_ops`` index created in the search-index migrations, and the
+    full-text match by the GIN index on the same ``to_tsvector`` expression
+    as ``search_vector`` (see ``install_postgres_fts``).
+    """
+
+    def prepare(self, queryset, query):
+        from django.contrib.postgres.search import SearchVector
+
+        return queryset.annotate(search_vector=SearchVector('description', config=POSTGRES_FTS_CONFIG))
+
+    def text_filter(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery as PgSearchQuery
+
+        return (Q(description__icontains=query.text)
+                | Q(search_vector=PgSearchQuery(query.text, config=POSTGRES_FTS_CONFIG)))
+
+    def rank(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery as PgSearchQuery, SearchRank, TrigramSimilarity
+
+        return (SearchRank(F('search_vector'), PgSearchQuery(query.text, config=POSTGRES_FTS_CONFIG))
+                + TrigramSimilarity('description', query.text))
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    Prefix word match against the ``<table>_fts`` FTS5 table, ranked by bm25.
+
+    Falls back to the portable backend when SQLite lacks FTS5.
+    """
+
+    def text_filter(self, queryset, query):
+        if not self.available(queryset, query):
+            return super().text_filter(queryset, query)
+        fts_table = queryset.model._meta.db_table + '_fts'
+        match = RawSQL('SELECT rowid FROM {0} WHERE {0} MATCH %s'.format(fts_table),
+                       (self.match_expression(query),))
+        return Q(pk__in=match)
+
+    def rank(self, queryset, query):
+        if not self.available(queryset, query):
+            return super().rank(queryset, query)
+        opts = queryset.model._meta
+        fts_table = opts.db_table + '_fts'
+        # FTS5's rank is bm25, where more negative means a better match.
+        bm25 = RawSQL('SELECT -rank FROM {0} WHERE {0} MATCH %s AND {0}.rowid = {1}.{2}'.format(
+            fts_table, opts.db_table, opts.pk.column), (self.match_expression(query),),
+            output_field=FloatField())
+        return Coalesce(bm25, Value(0.0), output_field=FloatField())
+
+    def match_expression(self, query):
+        return ' '.join('"%s"*' % word for word in query.words)
+
+    def available(self, queryset, query):
+        # An empty FTS5 expression is a syntax error, so punctuation-only
+        # searches go through icontains instead.
+        return bool(query.words) and fts5_available(connections[queryset.db])
+
+
+_fts5_cache = {}
+
+
+def fts5_available(connection):
+    key = (connection.alias, connection.settings_dict['NAME'])
+    if key not in _fts5_cache:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            _fts5_cache[key] = any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+    return _fts5_cache[key]
+
+
+VENDOR_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_search_backend(queryset):
+    backend_path = getattr(settings, 'SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    vendor = connections[queryset.db].vendor
+    return VENDOR_BACKENDS.get(vendor, SearchBackend)()
+
+
+def search(queryset, search_str, label_field):
+    """Filter ``queryset`` by ``search_str`` and order it best match first."""
+    query = parse_query(search_str)
+    return get_search_backend(queryset).search(queryset, query, label_field)
+
+
+def install_sqlite_fts(schema_editor, table):
+    """
+    Create (or recreate) the FTS5 shadow table of ``table`` and its triggers.
+
+    SQLite drops triggers whenever Django remakes a table, so migrations that
+    alter ``table`` on SQLite must call this again afterwards.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or not fts5_available(connection):
+        return
+    fts = table + '_fts'
+    for statement in [
+        'DROP TABLE IF EXISTS {fts}',
+        'DROP TRIGGER IF EXISTS {fts}_ai',
+        'DROP TRIGGER IF EXISTS {fts}_ad',
+        'DROP TRIGGER IF EXISTS {fts}_au',
+        "CREATE VIRTUAL TABLE {fts} USING fts5(description, content='{table}', content_rowid='id')",
+        "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        'CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN '
+        'INSERT INTO {fts}(rowid, description) VALUES (new.id, new.description); END',
+        'CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN '
+        "INSERT INTO {fts}({fts}, rowid, description) VALUES ('delete', old.id, old.description); END",
+        'CREATE TRIGGER {fts}_au AFTER UPDATE OF description ON {table} BEGIN '
+        "INSERT INTO {fts}({fts}, rowid, description) VALUES ('delete', old.id, old.description); "
+        'INSERT INTO {fts}(rowid, description) VALUES (new.id, new.description); END',
+    ]:
+        schema_editor.execute(statement.format(fts=fts, table=table))
+
+
+def drop_sqlite_fts(schema_editor, table):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    fts = table + '_fts'
+    for suffix in ('_ai', '_ad', '_au'):
+        schema_editor.execute('DROP TRIGGER IF EXISTS %s%s' % (fts, suffix))
+    schema_editor.execute('DROP TABLE IF EXISTS %s' % fts)
+
+
+def install_postgres_trigram(schema_editor, table):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS {0}_description_trgm '
+                          'ON {0} USING gin (UPPER(description) gin_trgm_ops)'.format(table))
+
+
+def drop_postgres_trigram(schema_editor, table):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS %s_description_trgm' % table)
+
+
+def install_postgres_fts(schema_editor, table):
+    """GIN index on the tsvector ``PostgresSearchBackend`` matches, written as Django compiles it."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE INDEX IF NOT EXISTS {0}_description_fts ON {0} "
+                          "USING gin (to_tsvector('{1}'::regconfig, COALESCE(description, '')))"
+                          .format(table, POSTGRES_FTS_CONFIG))
+
+
+def drop_postgres_fts(schema_editor, table):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS %s_description_fts' % table)
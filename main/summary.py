@@ -0,0 +1,93 @@
+"""Grouped totals shared by the expense and income summary endpoints."""
+import datetime
+
+from django.conf import settings
+from django.db.models import Q, Sum
+
+from main.fx import foreign_groups, sum_converted, unconverted as add_unconverted
+from main.money import Money
+from main.rollups import month_of, next_month
+
+DEFAULT_WINDOW_DAYS = 30 * 6
+MAX_WINDOW_DAYS = 366 * 10
+# The month and year arithmetic of the rollups and trend buckets steps up
+# to a year past ``end``, which must stay a valid date.
+LAST_DATE = datetime.date.max.replace(year=datetime.date.max.year - 1)
+
+
+def parse_date(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def date_window(params, default_days=DEFAULT_WINDOW_DAYS, today=None):
+    """
+    Return the inclusive (start, end) dates described by ``params``.
+
+    ``start``/``end`` take ISO dates, ``days`` counts back from ``end``
+    (today by default) and ``end`` is clamped to ``LAST_DATE``. Raises
+    ValueError on malformed or inverted windows.
+    """
+    end = min(parse_date(params['end']) if params.get('end') else (today or datetime.date.today()), LAST_DATE)
+    if params.get('start'):
+        start = parse_date(params['start'])
+    else:
+        days = int(params.get('days') or default_days)
+        if days < 0:
+            raise ValueError('days must not be negative')
+        start = end - datetime.timedelta(days=min(days, MAX_WINDOW_DAYS))
+    if start > end:
+        raise ValueError('start must not be after end')
+    return start, end
+
+
+def totals_by(queryset, field, start, end, rollups=None, label=None, currency=None, unconverted=None):
+    """
+    Sum ``amount`` per distinct ``field`` value between ``start`` and ``end``
+    as ``Money`` of ``currency`` (default ``DEFAULT_CURRENCY``); the
+    database adds up the integer minor units exactly.
+
+    Rows are grouped on ``field`` (e.g. the ``category`` foreign key) and
+    the result is keyed by ``label`` (e.g. ``category__name``), which
+    defaults to ``field``. Rows in other currencies are converted with the
+    daily rates of main.fx; those of a day without a rate are left out and,
+    given an ``unconverted`` dict, added to it per currency.
+
+    With ``rollups`` (the owner's monthly rollup queryset) whole calendar
+    months are read from the rollup table and only the partial months at
+    either edge of the window touch raw rows, so the cost is two grouped
+    queries over O(months x labels) and O(edge days) rows, plus one over
+    the rows in other currencies when more than one is configured.
+    """
+    label = label or field
+    currency = currency or settings.DEFAULT_CURRENCY
+    first_full = start if start.day == 1 else next_month(start)
+    after_full = month_of(end + datetime.timedelta(days=1))
+    if rollups is None or first_full >= after_full:
+        totals = _sum_rows(queryset.between(start, end).filter(currency=currency), field, label)
+    else:
+        monthly = (rollups.filter(month__gte=first_full, month__lt=after_full, currency=currency)
+                   .order_by()
+                   .values(*{field, label})
+                   .annotate(sum=Sum('total_minor')))
+        edges = queryset.filter(Q(date__gte=start, date__lt=first_full) | Q(date__gte=after_full, date__lte=end),
+                                currency=currency)
+        totals = _rows_to_dict(monthly, label, 'sum')
+        for name, amount in _sum_rows(edges, field, label).items():
+            totals[name] = totals.get(name, 0) + amount
+    groups = foreign_groups(queryset.between(start, end), currency, {field, label})
+    for name, amount in sum_converted(groups, key=lambda group: group[label]).items():
+        totals[name] = totals.get(name, 0) + amount
+    if unconverted is not None:
+        unconverted.update(add_unconverted(groups))
+    return {name: Money.from_minor(total, currency) for name, total in totals.items()}
+
+
+def _sum_rows(queryset, field, label):
+    return _rows_to_dict(queryset.order_by().values(*{field, label}).annotate(sum=Sum('amount_minor')), label, 'sum')
+
+
+def _rows_to_dict(rows, label, key):
+    totals = {}
+    for row in rows:
+        totals[row[label]] = totals.get(row[label], 0) + row[key]
+    return totals
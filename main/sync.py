@@ -0,0 +1,112 @@
+"""
+Delta sync for the mobile client.
+
+``GET /sync`` returns, per resource, the rows written since the client's
+token and the ids of the rows deleted since then, oldest change first, with
+a new token. Each resource is read in (updated_at, id) order from the
+(owner, updated_at, id) index starting after the token's position, so a
+page costs at most ``SYNC_PAGE_SIZE + 1`` rows per resource however long
+the history is. While ``has_more`` is true the client asks again with the
+``next`` token; once it is false the client is up to date and keeps the
+token for its next sync.
+
+Without a token the sync starts from the beginning and skips tombstones,
+which a new client has nothing to apply to. Tombstones are purged after
+``SYNC_TOMBSTONE_DAYS``, so a token older than that may have missed
+deletions and answers 410 Gone: the client starts over without a token.
+"""
+import datetime
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.views.decorators.http import require_GET
+
+from .api import api_login_required
+
+
+def encode_token(issued, positions):
+    """``positions`` maps each resource name to its last (updated_at, id) or None."""
+    payload = {'at': issued.isoformat(),
+               'rows': {name: position and [position[0].isoformat(), position[1]]
+                        for name, position in positions.items()}}
+    return urlsafe_base64_encode(force_bytes(json.dumps(payload, separators=(',', ':'))))
+
+
+def decode_token(token, names):
+    """Return (issued, positions), or raise ValueError for a malformed token."""
+    try:
+        payload = json.loads(force_str(urlsafe_base64_decode(token)))
+        issued = parse_datetime(payload['at'])
+        positions = {}
+        for name in names:
+            position = payload['rows'][name]
+            positions[name] = position and (parse_datetime(position[0]), int(position[1]))
+    except (ValueError, TypeError, KeyError, IndexError, UnicodeDecodeError):
+        raise ValueError('invalid sync token')
+    if issued is None or any(position and position[0] is None for position in positions.values()):
+        raise ValueError('invalid sync token')
+    return issued, positions
+
+
+def parse_limit(value):
+    try:
+        limit = int(value or settings.SYNC_PAGE_SIZE)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be a number')
+    return min(max(limit, 1), settings.SYNC_PAGE_SIZE)
+
+
+def changes(resource, user, position, horizon, limit):
+    """Up to ``limit + 1`` rows of ``user`` written after ``position`` and before ``horizon``."""
+    rows = resource.model.all_objects.filter(owner=user, updated_at__lt=horizon)
+    if position is None:
+        rows = rows.filter(deleted_at__isnull=True)
+    else:
+        updated_at, pk = position
+        rows = rows.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk))
+    return list(rows.order_by('updated_at', 'id')[:limit + 1])
+
+
+@api_login_required
+@require_GET
+def sync_view(request, resources):
+    names = list(resources)
+    now = timezone.now()
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        token = request.GET.get('since')
+        issued, positions = decode_token(token, names) if token else (None, dict.fromkeys(names))
+    except ValueError as ex:
+        return JsonResponse({'error': str(ex)}, status=400)
+    if issued is not None and issued < now - datetime.timedelta(days=settings.SYNC_TOMBSTONE_DAYS):
+        return JsonResponse({'error': 'sync token expired, sync again without one'}, status=410)
+
+    # Rows written within the settle window may still be committing out of
+    # updated_at order; they are left for the next sync.
+    horizon = now - datetime.timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+    payload = {}
+    has_more = False
+    for name, resource in resources.items():
+        rows = changes(resource, request.user, positions[name], horizon, limit)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            positions[name] = (rows[-1].updated_at, rows[-1].pk)
+            has_more = True
+        else:
+            # Everything written before the horizon has been seen.
+            positions[name] = (horizon, 0)
+        labels = resource.labels()
+        fields = resource.fields + ('updated_at',)
+        payload[name] = {
+            'changed': [resource.serialize(row, fields, labels) for row in rows if row.deleted_at is None],
+            'deleted': [row.pk for row in rows if row.deleted_at is not None],
+        }
+    payload['next'] = encode_token(horizon, positions)
+    payload['has_more'] = has_more
+    return JsonResponse(payload)
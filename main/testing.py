@@ -0,0 +1,76 @@
+"""
+Query-budget assertions for view tests.
+
+``QueryBudgetMixin.assertQueryBudgets`` requests a set of views at growing
+data sizes and fails when any of them exceeds its declared number of
+queries or issues more queries at the largest size than at the smallest,
+which is how per-row (N+1) queries show up. Failures list the offending
+SQL grouped by fingerprint.
+"""
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .benchmark import seed_users
+from .metrics import fingerprint
+
+BUDGET_ROW_COUNTS = (10, 1000, 10000)
+
+
+def describe_queries(queries, limit=10):
+    """Format captured queries grouped by fingerprint, most repeated first."""
+    shapes = Counter(fingerprint(query['sql']) for query in queries)
+    return '\n'.join('  %3dx %s' % (count, sql) for sql, count in shapes.most_common(limit))
+
+
+class QueryBudgetMixin:
+    """Mix into a ``TestCase``; see ``assertQueryBudgets``."""
+
+    budget_row_counts = BUDGET_ROW_COUNTS
+    budget_rows = 0
+
+    def grow_budget_data(self, rows):
+        """Top ``bench_user_0`` up to ``rows`` expenses and ``rows`` incomes; return the user."""
+        added = max(rows - self.budget_rows, 0)
+        self.budget_rows = max(rows, self.budget_rows)
+        return seed_users(1, added, added, seed=rows)[0]
+
+    @contextmanager
+    def assertQueryBudget(self, budget, label='block'):
+        """Fail if the block runs more than ``budget`` queries."""
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        if len(context) > budget:
+            self.fail('%s ran %d queries (budget %d):\n%s'
+                      % (label, len(context), budget, describe_queries(context.captured_queries)))
+
+    def assertQueryBudgets(self, budgets, grow=None, row_counts=None):
+        """
+        ``budgets`` maps a label to ``(budget, request)`` where ``request()``
+        performs the request; ``grow(rows)`` brings the data up to ``rows``
+        rows per user before each round of requests.
+        """
+        grow = grow or self.grow_budget_data
+        row_counts = row_counts or self.budget_row_counts
+        failures, first_counts = [], {}
+        for rows in row_counts:
+            grow(rows)
+            for label, (budget, request) in budgets.items():
+                with CaptureQueriesContext(connection) as context:
+                    response = request()
+                    if getattr(response, 'streaming', False):
+                        b''.join(response.streaming_content)
+                self.assertLess(response.status_code, 400, '%s answered %d' % (label, response.status_code))
+                count = len(context)
+                first_counts.setdefault(label, count)
+                if count > budget:
+                    failures.append('%s: %d queries at %d rows (budget %d)\n%s'
+                                    % (label, count, rows, budget, describe_queries(context.captured_queries)))
+                elif count > first_counts[label]:
+                    failures.append('%s: %d queries at %d rows, %d at %d rows\n%s'
+                                    % (label, count, rows, first_counts[label], row_counts[0],
+                                       describe_queries(context.captured_queries)))
+        if failures:
+            self.fail('Query budgets exceeded:\n' + '\n'.join(failures))
@@ -1,3 +1,629 @@
-# from django.test import TestCase
+import asyncio
+import datetime
+import io
+import pickle
+import re
+import sqlite3
+import threading
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import SyncToAsync, async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.db.utils import OperationalError
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from expenses.models import Category, Expense, ExpenseRollup
+from main import metrics
+from main.aio import Superseded, latest_only
+from main.benchmark import (compare_to_baseline, run_benchmark, run_concurrency_benchmark, run_connection_benchmark,
+                            seed_users)
+from main.cache import data_version
+from main.connections import ConnectionPool, check_connections
+from main.handlers import ASGIHandler
+from main.importers import parse_ofx, parse_qif
+from main.lookups import lookup
+from main.middleware import ReplicaPinMiddleware, RequestMetricsMiddleware
+from main.money import Money, amount_range_q, to_minor
+from main.routers import RequestState, read_replica, replica_reads, request_state
+from main.search import clamp_window, parse_query, search
+from main.summary import date_window, totals_by
+from main.sync import encode_token
+from main.trends import GRANULARITIES, bucket_count, buckets, parse_points
+from main.testing import QueryBudgetMixin
+from userincome.models import Source, UserIncome
+
+
+class TestDateWindow(SimpleTestCase):
+
+    def test_defaults_to_six_months(self):
+        today = datetime.date(2021, 6, 30)
+        self.assertEqual(date_window({}, today=today), (datetime.date(2021, 1, 1), today))
+
+    def test_explicit_bounds(self):
+        self.assertEqual(date_window({'start': '2021-01-01', 'end': '2021-01-31'}),
+                         (datetime.date(2021, 1, 1), datetime.date(2021, 1, 31)))
+
+    def test_end_is_clamped_below_the_last_date(self):
+        start, end = date_window({'end': '9999-12-31', 'days': '30'})
+        self.assertEqual(end, datetime.date(9998, 12, 31))
+        self.assertEqual(start, datetime.date(9998, 12, 1))
+        for granularity in GRANULARITIES:
+            points = list(buckets(datetime.date(9999, 12, 1), datetime.date.max, granularity))
+            self.assertEqual(len(points), bucket_count(datetime.date(9999, 12, 1), datetime.date.max, granularity))
+
+    def test_invalid_window(self):
+        with self.assertRaises(ValueError):
+            date_window({'days': '-1'})
+        with self.assertRaises(ValueError):
+            date_window({'start': 'yesterday'})
+
+
+class TestTrendBuckets(SimpleTestCase):
+
+    def test_bucket_counts_match_buckets(self):
+        start, end = datetime.date(2020, 12, 30), datetime.date(2022, 3, 2)
+        for granularity in GRANULARITIES:
+            self.assertEqual(bucket_count(start, end, granularity), len(list(buckets(start, end, granularity))))
+
+    def test_points_are_bounded(self):
+        self.assertEqual(parse_points(None), 60)
+        self.assertEqual(parse_points('10000'), 500)
+        with self.assertRaises(ValueError):
+            parse_points('0')
+
+
+class TestSearchQuery(SimpleTestCase):
+
+    def test_amount_ranges(self):
+        self.assertEqual(parse_query('12').amount_range, (Decimal('12'), Decimal('13')))
+        self.assertEqual(parse_query('12.5').amount_range, (Decimal('12.5'), Decimal('12.6')))
+        self.assertIsNone(parse_query('rent').amount_range)
+        self.assertIsNone(parse_query('nan').amount_range)
+
+    def test_date_ranges(self):
+        self.assertEqual(parse_query('2021').date_range,
+                         (datetime.date(2021, 1, 1), datetime.date(2021, 12, 31)))
+        self.assertEqual(parse_query('2021-02').date_range,
+                         (datetime.date(2021, 2, 1), datetime.date(2021, 2, 28)))
+        self.assertEqual(parse_query('2021-02-03').date_range,
+                         (datetime.date(2021, 2, 3), datetime.date(2021, 2, 3)))
+        self.assertIsNone(parse_query('2021-13').date_range)
+        self.assertIsNone(parse_query('12').date_range)
+
+    def test_window_is_clamped(self):
+        self.assertEqual(clamp_window({}), (50, 0))
+        self.assertEqual(clamp_window({'limit': 10000, 'offset': -5}), (200, 0))
+        self.assertEqual(clamp_window({'limit': 'ten'}), (50, 0))
+
+
+class TestMoney(SimpleTestCase):
+
+    def test_rounds_to_the_minor_unit_of_the_currency(self):
+        self.assertEqual(str(Money('12.345', 'INR')), '12.35')
+        self.assertEqual(str(Money('1.2345', 'KWD')), '1.235')
+        self.assertEqual(str(Money('1234.5', 'JPY')), '1235')
+        self.assertEqual(Money.from_minor(1250, 'INR'), Decimal('12.50'))
+        self.assertEqual(Money('0.1', 'INR').minor + Money('0.2', 'INR').minor, Money('0.3', 'INR').minor)
+
+    def test_keeps_its_currency_when_pickled(self):
+        amount = pickle.loads(pickle.dumps(Money('7.5', 'USD')))
+        self.assertEqual((amount, amount.currency, str(amount)), (Decimal('7.5'), 'USD', '7.50'))
+
+    def test_invalid_amounts(self):
+        for value in ('abc', 'nan', 'Infinity', '', None, '1e30'):
+            with self.assertRaises(ValidationError):
+                to_minor(value, 'INR')
+
+    @override_settings(CURRENCIES=['INR', 'JPY'])
+    def test_amount_range_per_minor_unit(self):
+        self.assertEqual(str(amount_range_q(Decimal('12.5'), Decimal('12.6'))),
+                         str(Q(amount_minor__gte=13, amount_minor__lt=13, currency__in=['JPY'])
+                             | Q(amount_minor__gte=1250, amount_minor__lt=1260, currency__in=['INR'])))
+
+
+class TestMoneyAmounts(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sahil', password='password123')
+        self.food = Category.objects.create(name='Food')
+
+    def add(self, amount):
+        return Expense.objects.create(owner=self.user, amount=amount, category=self.food, description='Meal',
+                                      date=datetime.date(2021, 5, 3))
+
+    def test_sums_are_exact(self):
+        for _ in range(3):
+            self.add('0.1')
+        window = (datetime.date(2021, 5, 1), datetime.date(2021, 5, 31))
+        self.assertEqual(totals_by(Expense.objects.for_owner(self.user), 'category', *window, label='category__name'),
+                         {'Food': Decimal('0.30')})
+        self.assertEqual(ExpenseRollup.objects.get(owner=self.user).total_minor, 30)
+
+    def test_search_matches_amount_ranges_exactly(self):
+        for amount in ('12.5', '12.59', '12.6', '13'):
+            self.add(amount)
+        found = search(Expense.objects.for_owner(self.user), '12.5', 'category__name')
+        self.assertEqual(sorted(str(row.amount) for row in found), ['12.50', '12.59'])
+        found = search(Expense.objects.for_owner(self.user), '12', 'category__name')
+        self.assertEqual(sorted(str(row.amount) for row in found), ['12.50', '12.59', '12.60'])
+
+    def test_invalid_amounts_are_field_errors(self):
+        with self.assertRaises(ValidationError) as context:
+            Expense(amount='abc')
+        self.assertIn('amount', context.exception.message_dict)
+        with self.assertRaises(ValidationError) as context:
+            Expense(owner=self.user, category=self.food, description='Meal').full_clean()
+        self.assertIn('amount', context.exception.message_dict)
+
+
+class TestImportParsers(SimpleTestCase):
+
+    def test_parse_ofx(self):
+        lines = [
+            '<OFX><BANKTRANLIST>',
+            '<STMTTRN><TRNTYPE>DEBIT',
+            '<DTPOSTED>20210503120000.000',
+            '<TRNAMT>-12.50',
+            '<NAME>Corner shop',
+            '</STMTTRN>',
+            '<STMTTRN><DTPOSTED>20210504<TRNAMT>-3<MEMO>Bus</STMTTRN>',
+            '</BANKTRANLIST></OFX>',
+        ]
+        self.assertEqual(list(parse_ofx(lines)), [
+            (2, {'description': 'Corner shop', 'date': '20210503', 'amount': '-12.50'}),
+            (7, {'description': 'Bus', 'date': '20210504', 'amount': '-3'}),
+        ])
+
+    def test_parse_qif(self):
+        lines = ['!Type:Bank\n', 'D05/03/2021\n', 'T-12.50\n', 'PCorner shop\n', 'LFOOD\n', '^\n',
+                 'D05/04\'21\n', 'T-3\n', '^\n']
+        self.assertEqual(list(parse_qif(lines)), [
+            (2, {'date': '05/03/2021', 'amount': '-12.50', 'description': 'Corner shop', 'label': 'FOOD'}),
+            (7, {'date': "05/04'21", 'amount': '-3'}),
+        ])
+
+
+class TestLookupCache(TestCase):
+
+    def setUp(self):
+        self.food = Category.objects.create(name='Food')
+
+    def test_snapshot_answers_without_queries(self):
+        lookup(Category).all()
+        with self.assertNumQueries(0):
+            self.assertEqual(lookup(Category).get(str(self.food.pk)), self.food)
+            self.assertEqual(lookup(Category).ids()['Food'], self.food.pk)
+            self.assertEqual(lookup(Category).names()[self.food.pk], 'Food')
+            self.assertIsNone(lookup(Category).get('food'))
+            self.assertIsNone(lookup(Category).get(''))
+
+    def test_save_and_delete_invalidate(self):
+        version = lookup(Category).version()
+        self.assertEqual(lookup(Category).get(self.food.pk).name, 'Food')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.name = 'Groceries'
+            self.food.save()
+        self.assertEqual(lookup(Category).get(self.food.pk).name, 'Groceries')
+        self.assertNotEqual(lookup(Category).version(), version)
+        rent = Category.objects.create(name='Rent')
+        self.assertEqual(lookup(Category).ids()['Rent'], rent.pk)
+        rent.delete()
+        self.assertNotIn('Rent', lookup(Category).ids())
+
+    def test_other_process_changes_seen_after_timeout(self):
+        lookup(Category).all()
+        # Bypasses the signals, like a write made by another process.
+        Category.objects.filter(pk=self.food.pk).update(name='Groceries')
+        self.assertEqual(lookup(Category).get(self.food.pk).name, 'Food')
+        with override_settings(LOOKUP_CACHE_TIMEOUT=0):
+            with self.assertNumQueries(0):
+                self.assertEqual(lookup(Category).get(self.food.pk).name, 'Food')
+            cache.incr(lookup(Category).key)
+            self.assertEqual(lookup(Category).get(self.food.pk).name, 'Groceries')
+
+
+class TestLatestOnly(SimpleTestCase):
+
+    @override_settings(ASYNC_DB_THREAD_SENSITIVE=False)
+    def test_newer_search_supersedes_older(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 'old'
+
+        async def scenario():
+            first = asyncio.ensure_future(latest_only(('search', 1), slow))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            other_user = await latest_only(('search', 2), lambda: 'other')
+            newer = await latest_only(('search', 1), lambda: 'new')
+            release.set()
+            with self.assertRaises(Superseded):
+                await first
+            return other_user, newer
+
+        self.assertEqual(asyncio.run(scenario()), ('other', 'new'))
+
+
+class TestDashboard(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('dash', 'dash@localhost.com', 'password123')
+        self.food, self.rent = Category.objects.create(name='Food'), Category.objects.create(name='Rent')
+        salary = Source.objects.create(name='Salary')
+        today = datetime.date.today()
+        UserIncome.objects.create(owner=self.user, amount=1000, date=today, source=salary, description='Pay')
+        Expense.objects.create(owner=self.user, amount=300, date=today, category=self.rent, description='Flat')
+        Expense.objects.create(owner=self.user, amount=20, date=today, category=self.food, description='Lunch')
+        Expense.objects.create(owner=self.user, amount=50, category=self.food, description='Old dinner',
+                               date=today - datetime.timedelta(days=400))
+        self.client.force_login(self.user)
+
+    def test_snapshot_totals(self):
+        snapshot = self.client.get(reverse('main')).context['snapshot']
+        self.assertEqual((snapshot['balance'], snapshot['month_to_date']), (630, 320))
+        self.assertEqual(snapshot['top_categories'], [{'name': 'Rent', 'total': 300}, {'name': 'Food', 'total': 20}])
+        self.assertEqual([row['description'] for row in snapshot['recent']], ['Lunch', 'Flat', 'Pay', 'Old dinner'])
+
+    def test_snapshot_is_cached_until_the_next_write(self):
+        self.client.get(reverse('main'))
+        with self.assertNumQueries(0):  # session and user cached
+            self.client.get(reverse('main'))
+        Expense.objects.create(owner=self.user, amount=5, category=self.food, description='Tea')
+        snapshot = self.client.get(reverse('main')).context['snapshot']
+        self.assertEqual(snapshot['month_to_date'], 325)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class TestSync(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('sync', 'sync@localhost.com', 'password123')
+        self.food = Category.objects.create(name='Food')
+        self.salary = Source.objects.create(name='Salary')
+        self.expenses = [Expense.objects.create(owner=self.user, amount=amount, category=self.food,
+                                                description='Meal %d' % amount) for amount in (10, 20, 30)]
+        UserIncome.objects.create(owner=self.user, amount=500, source=self.salary, description='Pay')
+        self.client.force_login(self.user)
+
+    def sync(self, since=None, limit=None):
+        params = {key: value for key, value in (('since', since), ('limit', limit)) if value}
+        return self.client.get(reverse('sync'), params)
+
+    def test_pages_through_history_then_returns_only_changes(self):
+        first = self.sync(limit=2).json()
+        self.assertTrue(first['has_more'])
+        self.assertEqual([row['description'] for row in first['expenses']['changed']], ['Meal 10', 'Meal 20'])
+        self.assertEqual(first['income']['changed'][0]['source_name'], 'Salary')
+        second = self.sync(first['next'], limit=2).json()
+        self.assertFalse(second['has_more'])
+        self.assertEqual([row['description'] for row in second['expenses']['changed']], ['Meal 30'])
+        self.assertEqual(second['income'], {'changed': [], 'deleted': []})
+
+        edited, dropped = self.expenses[0], self.expenses[1]
+        edited.description = 'Brunch'
+        edited.save()
+        self.client.get(reverse('expense-delete', args=[dropped.pk]))
+        third = self.sync(second['next']).json()
+        self.assertEqual([row['id'] for row in third['expenses']['changed']], [edited.pk])
+        self.assertEqual(third['expenses']['deleted'], [dropped.pk])
+        self.assertEqual(self.sync(third['next']).json()['expenses'], {'changed': [], 'deleted': []})
+
+    def test_soft_delete_hides_the_row_and_leaves_the_rollups(self):
+        self.expenses[0].soft_delete()
+        self.assertEqual(Expense.objects.filter(owner=self.user).count(), 2)
+        self.assertEqual(Expense.all_objects.filter(owner=self.user).count(), 3)
+        self.assertEqual(ExpenseRollup.objects.get(owner=self.user).total_minor, 5000)
+        self.assertNotIn('Meal 10', str(self.sync().json()['expenses']))
+
+    def test_rejects_bad_and_expired_tokens(self):
+        self.assertEqual(self.sync('garbage').status_code, 400)
+        expired = encode_token(timezone.now() - datetime.timedelta(days=31), {'expenses': None, 'income': None})
+        self.assertEqual(self.sync(expired).status_code, 410)
+
+    def test_purge_removes_old_tombstones_only(self):
+        old, recent = self.expenses[0], self.expenses[1]
+        old.soft_delete()
+        recent.soft_delete()
+        Expense.all_objects.filter(pk=old.pk).update(deleted_at=timezone.now() - datetime.timedelta(days=40))
+        rollups = list(ExpenseRollup.objects.values_list('owner', 'month', 'category', 'total_minor', 'count'))
+        version = data_version(self.user.pk)
+        call_command('purge_tombstones', stdout=io.StringIO())
+        self.assertEqual(list(Expense.all_objects.filter(deleted_at__isnull=False).values_list('pk', flat=True)),
+                         [recent.pk])
+        self.assertEqual(list(ExpenseRollup.objects.values_list('owner', 'month', 'category', 'total_minor', 'count')),
+                         rollups)
+        self.assertEqual(ExpenseRollup.objects.get(owner=self.user).total_minor, 3000)
+        self.assertEqual(data_version(self.user.pk), version + 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class TestReplicaRouting(TestCase):
+
+    def test_only_marked_reads_use_the_replica(self):
+        self.assertEqual(Expense.objects.all().db, 'default')
+        with replica_reads():
+            self.assertEqual(Expense.objects.all().db, 'replica')
+            with request_state(RequestState(pinned=True)):
+                self.assertEqual(Expense.objects.all().db, 'default')
+            with request_state(RequestState()):
+                Category.objects.create(name='Food')
+                self.assertEqual(Expense.objects.all().db, 'default')
+
+    def test_replica_of_the_primary_database_reads_through_its_connection(self):
+        with override_settings(DATABASE_REPLICAS=['default']), replica_reads():
+            Category.objects.create(name='Food')
+            self.assertTrue(Category.objects.filter(name='Food').exists())
+
+    def test_async_views_read_from_the_replica(self):
+        @read_replica
+        async def view():
+            return Expense.objects.all().db
+        self.assertEqual(asyncio.run(view()), 'replica')
+
+    def test_writes_pin_the_user_to_the_primary(self):
+        def write(request):
+            Category.objects.create(name='Food')
+            return HttpResponse()
+
+        def read(request):
+            with replica_reads():
+                return HttpResponse(Expense.objects.all().db)
+        response = ReplicaPinMiddleware(write)(RequestFactory().post('/'))
+        cookie = response.cookies['pin_primary']
+        self.assertEqual(cookie['max-age'], 5)
+        self.assertEqual(ReplicaPinMiddleware(read)(RequestFactory().get('/')).content, b'replica')
+        request = RequestFactory().get('/')
+        request.COOKIES['pin_primary'] = cookie.value
+        self.assertEqual(ReplicaPinMiddleware(read)(request).content, b'default')
+
+    def test_async_writes_pin_the_user_to_the_primary(self):
+        @sync_to_async
+        def write(request):
+            Category.objects.create(name='Food')
+            return HttpResponse()
+        middleware = ReplicaPinMiddleware(write)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().post('/'))
+        self.assertEqual(response.cookies['pin_primary']['max-age'], 5)
+
+
+class TestConnections(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_pool_reuses_healthy_connections_and_waits_for_a_free_one(self):
+        pool = ConnectionPool(lambda: sqlite3.connect(':memory:'), size=1, timeout=0.01)
+        first = pool.get(lambda conn: True)
+        with self.assertRaises(OperationalError):
+            pool.get(lambda conn: True)
+        pool.put(first)
+        self.assertIs(pool.get(lambda conn: True), first)
+        pool.put(first)
+        replacement = pool.get(lambda conn: False)
+        self.assertIsNot(replacement, first)
+        pool.put(replacement, reusable=False)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            replacement.execute('SELECT 1')
+        self.assertEqual(metrics.connection_stats(), {'opened': 2, 'reused': 1, 'failed': 2})
+
+    def test_requests_count_reused_connections(self):
+        connection.ensure_connection()
+        check_connections()
+        self.assertEqual(metrics.connection_stats()['reused'], 1)
+        staff = User.objects.create_user('staff', 'staff@localhost.com', 'password123', is_staff=True)
+        self.client.force_login(staff)
+        stats = self.client.get(reverse('connection-metrics')).json()
+        self.assertGreaterEqual(stats['connections']['reused'], 2)
+        self.assertIsNone(stats['pool'])
+
+
+@override_settings(ASYNC_DB_THREAD_SENSITIVE=True)
+class TestRequestMetrics(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.user = User.objects.create_user('staff', 'staff@localhost.com', 'password123', is_staff=True)
+
+    def test_fingerprint_and_percentiles(self):
+        self.assertEqual(metrics.fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x'"),
+                         'SELECT * FROM t WHERE id IN (...) AND name = ?')
+        self.assertEqual(metrics.fingerprint('SELECT a\n  FROM t WHERE id IN (%s, %s)'),
+                         'SELECT a FROM t WHERE id IN (...)')
+        self.assertEqual(metrics.fingerprint('RELEASE SAVEPOINT "s140_x16"'), 'RELEASE SAVEPOINT ?')
+        self.assertEqual([metrics.percentile(list(range(1, 101)), p) for p in (0.5, 0.95, 0.99)], [50, 95, 99])
+
+    @override_settings(REQUEST_METRICS=True, SLOW_REQUEST_MS=0)
+    def test_records_queries_timing_and_slow_requests(self):
+        self.client.login(username='staff', password='password123')
+        with self.assertLogs('main.metrics', 'WARNING') as logs:
+            response = self.client.get(reverse('expense_category_summary'))
+            stats = self.client.get(reverse('request-metrics')).json()
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+        self.assertIn('"view": "expense_category_summary"', logs.output[0])
+
+        self.assertTrue(stats['enabled'])
+        summary = stats['views']['expense_category_summary']
+        self.assertEqual(summary['requests'], 1)
+        self.assertGreater(summary['avg_queries'], 0)
+        self.assertIsNotNone(summary['p99_ms'])
+
+    @override_settings(REQUEST_METRICS=True)
+    def test_streaming_responses_are_recorded_when_closed(self):
+        self.client.login(username='staff', password='password123')
+        response = self.client.get(reverse('export-expenses'))
+        self.assertIn('Server-Timing', response)
+        self.assertNotIn('export-expenses', metrics.request_stats())
+        b''.join(response.streaming_content)
+        response.close()
+        summary = metrics.request_stats()['export-expenses']
+        self.assertEqual(summary['requests'], 1)
+        self.assertGreater(summary['avg_queries'], 0)
+
+    def test_disabled_by_default(self):
+        self.client.login(username='staff', password='password123')
+        response = self.client.get(reverse('request-metrics'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(response.json(), {'enabled': False, 'views': {}})
+
+
+def asgi_get(user, path):
+    """GET ``path`` as ``user`` through ``main.handlers.ASGIHandler``; return the start message and the body."""
+    client = Client()
+    client.force_login(user)
+    cookie = client.cookies[settings.SESSION_COOKIE_NAME]
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+             'headers': [(b'cookie', ('%s=%s' % (cookie.key, cookie.value)).encode())]}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request'}
+
+    async def send(message):
+        messages.append(message)
+
+    async_to_sync(ASGIHandler())(scope, receive, send)
+    return messages[0], b''.join(message.get('body', b'') for message in messages[1:])
+
+
+@override_settings(REQUEST_METRICS=True, ASYNC_DB_THREAD_SENSITIVE=False)
+class TestAsyncRequestMetrics(TransactionTestCase):
+
+    def test_counts_queries_of_async_views_on_pool_threads(self):
+        user = User.objects.create_user('staff', 'staff@localhost.com', 'password123')
+        self.client.force_login(user)
+        response = self.client.get(reverse('expense_category_summary'))
+        self.assertEqual(response.status_code, 200)
+        queries = re.search(r'desc="(\d+) queries"', response['Server-Timing'])
+        self.assertGreater(int(queries.group(1)), 0)
+
+    def test_async_capable(self):
+        User.objects.create_user('staff', 'staff@localhost.com', 'password123')
+        middleware = RequestMetricsMiddleware(sync_to_async(lambda request: HttpResponse(User.objects.count())))
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'1')
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    def test_counts_queries_as_async_middleware(self):
+        metrics.reset()
+        handler = ASGIHandler()
+        handler.load_middleware(is_async=True)
+        # Not adapted to sync: every middleware is async capable.
+        self.assertNotIsInstance(handler._middleware_chain, SyncToAsync)
+
+        user = User.objects.create_user('staff', 'staff@localhost.com', 'password123')
+        Expense.objects.create(amount=1, description='x', category=Category.objects.create(name='RENT'),
+                               owner=user, date=datetime.date(2021, 3, 1))
+        for url_name in ('expenses', 'expense_category_summary', 'export-expenses'):
+            with self.subTest(url_name=url_name):
+                response, _ = asgi_get(user, reverse(url_name))
+                headers = dict(response['headers'])
+                queries = re.search(rb'desc="(\d+) queries"', headers[b'Server-Timing'])
+                self.assertGreater(int(queries.group(1)), 0)
+        # The export's record also counts the query its body ran.
+        self.assertGreater(metrics.request_stats()['export-expenses']['avg_queries'], int(queries.group(1)))
+
+
+class TestAsgiHandler(TransactionTestCase):
+
+    @override_settings(EXPORT_CHUNK_SIZE=1)
+    def test_streams_a_whole_export(self):
+        user = User.objects.create_user('sahil', 'sahilharpal1234@gmail.com', 'password123')
+        rent = Category.objects.create(name='RENT')
+        for day in (1, 2, 3):
+            Expense.objects.create(amount=day, description='rent %d' % day, category=rent, owner=user,
+                                   date=datetime.date(2021, 3, day))
+        response, body = asgi_get(user, reverse('export-expenses'))
+        self.assertEqual(response['status'], 200)
+        self.assertEqual(body.decode().splitlines(), ['Date,Category,Description,Amount,Currency',
+                                                      '2021-03-01,RENT,rent 1,1.00,INR',
+                                                      '2021-03-02,RENT,rent 2,2.00,INR',
+                                                      '2021-03-03,RENT,rent 3,3.00,INR'])
+
+    def test_serves_static_files(self):
+        user = User.objects.create_user('sahil', 'sahilharpal1234@gmail.com', 'password123')
+        response, body = asgi_get(user, '/static/css/bootstrap.min.css')
+        self.assertEqual(response['status'], 200)
+        self.assertTrue(body.startswith(b'/*!'))
+
+
+@override_settings(ASYNC_DB_THREAD_SENSITIVE=True)
+class TestBenchmark(TestCase):
+
+    def test_seed_and_benchmark_every_view(self):
+        owners = seed_users(2, 30, 5, days=90)
+        self.assertEqual([owner.expense_set.count() for owner in owners], [30, 30])
+        self.assertEqual(owners[0].userincome_set.count(), 5)
+
+        results = run_benchmark(owners[0], iterations=2)
+        self.assertIn('search-expenses', results)
+        self.assertTrue(all(row['queries'] <= 10 for row in results.values()))
+        self.assertEqual(compare_to_baseline(results, results), [])
+
+        slower = {name: dict(row, p95_ms=row['p95_ms'] * 10 + 10) for name, row in results.items()}
+        fewer_queries = {'expenses': dict(results['expenses'], queries=results['expenses']['queries'] - 1)}
+        self.assertEqual(len(compare_to_baseline(slower, results)), len(results))
+        self.assertEqual(compare_to_baseline(results, fewer_queries),
+                         ['expenses: %d queries per request, baseline %d'
+                          % (results['expenses']['queries'], results['expenses']['queries'] - 1)])
+
+    def test_seed_command_reuses_users(self):
+        call_command('seed_data', users=1, expenses=3, incomes=1, stdout=io.StringIO())
+        call_command('seed_data', users=1, expenses=3, incomes=1, stdout=io.StringIO())
+        self.assertEqual(User.objects.get(username='bench_user_0').expense_set.count(), 6)
+
+
+class TestConcurrencyBenchmark(TransactionTestCase):
+
+    def test_connection_setup_per_conn_max_age(self):
+        owner = seed_users(1, 5, 1, days=30)[0]
+        with override_settings(DB_CONN_MAX_AGE=60):
+            results = run_connection_benchmark(owner, requests=3)
+        self.assertEqual(set(results), {0, 60})
+        self.assertTrue(all(row['requests'] == 3 for row in results.values()))
+
+    def test_compares_wsgi_and_asgi(self):
+        owners = seed_users(2, 20, 5, days=90)
+        results = run_concurrency_benchmark(owners, concurrency=2, requests=4)
+        self.assertEqual(set(results), {'search-expenses', 'search-income', 'expense_category_summary',
+                                        'income_source_summary'})
+        for row in results.values():
+            self.assertEqual((row['wsgi']['requests'], row['asgi']['requests']), (4, 4))
+            self.assertEqual((row['wsgi']['superseded'], row['asgi']['superseded']), (0, 0))
+
+
+class TestMainQueryBudgets(QueryBudgetMixin, TestCase):
+
+    def test_views_stay_within_query_budgets(self):
+        user = self.grow_budget_data(0)
+        User.objects.filter(pk=user.pk).update(is_staff=True)
+        self.client.force_login(user)
+        self.assertQueryBudgets({
+            'main': (11, lambda: self.client.get(reverse('main'))),
+            'cache-stats': (2, lambda: self.client.get(reverse('cache-stats'))),
+            'request-metrics': (2, lambda: self.client.get(reverse('request-metrics'))),
+            'connection-metrics': (2, lambda: self.client.get(reverse('connection-metrics'))),
+            'sync': (6, lambda: self.client.get(reverse('sync'), {'limit': 100})),
+        })
+
+    def test_budget_failure_lists_sql_by_fingerprint(self):
+        with self.assertRaises(AssertionError) as failure:
+            with self.assertQueryBudget(1, 'per-user lookups'):
+                for pk in range(3):
+                    User.objects.filter(pk=pk).exists()
+        self.assertIn('per-user lookups ran 3 queries (budget 1)', str(failure.exception))
+        self.assertIn('3x SELECT (?) AS "a" FROM "auth_user" WHERE "auth_user"."id" = ? LIMIT ?',
+                      str(failure.exception))
@@ -0,0 +1,116 @@
+"""
+Amount totals over time for the expense and income trend endpoints.
+
+The database buckets the rows with ``Trunc`` and sums each bucket, so only
+one aggregate row per non-empty bucket reaches Python. When the requested
+granularity would produce more than ``max_points`` buckets for the window,
+the next coarser granularity that fits is used instead, and as a last
+resort consecutive year buckets are merged. Empty buckets are filled with
+zeros so the series is continuous. Rows in other currencies than the
+requested one are converted with the daily rates of main.fx; see
+``totals_by`` in main.summary for rows without a rate.
+"""
+import datetime
+import math
+
+from django.conf import settings
+from django.db.models import Count, DateField, Q, Sum
+from django.db.models.functions import Trunc
+
+from main.fx import foreign_groups, sum_converted, unconverted as add_unconverted
+from main.money import Money
+from main.rollups import month_of, next_month
+
+GRANULARITIES = ('day', 'week', 'month', 'year')
+DEFAULT_POINTS = 60
+MAX_POINTS = 500
+
+
+def bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == 'month':
+        return month_of(day)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    return day
+
+
+def next_bucket(day, granularity):
+    if granularity == 'week':
+        return day + datetime.timedelta(days=7)
+    if granularity == 'month':
+        return next_month(day)
+    if granularity == 'year':
+        return day.replace(year=day.year + 1)
+    return day + datetime.timedelta(days=1)
+
+
+def buckets(start, end, granularity):
+    """Start dates of the ``granularity`` buckets covering ``start``..``end``."""
+    day, last = bucket_start(start, granularity), bucket_start(end, granularity)
+    while True:
+        yield day
+        if day >= last:
+            # Without stepping past the last bucket, which may end at date.max.
+            return
+        day = next_bucket(day, granularity)
+
+
+def bucket_count(start, end, granularity):
+    if granularity == 'week':
+        return (end - bucket_start(start, 'week')).days // 7 + 1
+    if granularity == 'month':
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    if granularity == 'year':
+        return end.year - start.year + 1
+    return (end - start).days + 1
+
+
+def parse_points(value):
+    try:
+        points = int(value or DEFAULT_POINTS)
+    except (TypeError, ValueError):
+        raise ValueError('points must be a number')
+    if points < 1:
+        raise ValueError('points must be positive')
+    return min(points, MAX_POINTS)
+
+
+def trend(queryset, start, end, granularity='day', max_points=DEFAULT_POINTS, currency=None, unconverted=None):
+    """
+    Return ``(granularity, points)``: the granularity actually used and a
+    list of ``{'date', 'total', 'count'}`` per bucket from ``start`` to ``end``,
+    the totals as ``Money`` of ``currency`` (default ``DEFAULT_CURRENCY``).
+    """
+    currency = currency or settings.DEFAULT_CURRENCY
+    if granularity not in GRANULARITIES:
+        raise ValueError('granularity must be one of %s' % ', '.join(GRANULARITIES))
+    for granularity in GRANULARITIES[GRANULARITIES.index(granularity):]:
+        if bucket_count(start, end, granularity) <= max_points:
+            break
+
+    rows = (queryset.between(start, end)
+            .order_by()
+            .annotate(bucket=Trunc('date', granularity, output_field=DateField()))
+            .values('bucket')
+            .annotate(total=Sum('amount_minor', filter=Q(currency=currency)), count=Count('id')))
+    sums = {row['bucket']: row for row in rows}
+    groups = foreign_groups(queryset.between(start, end), currency)
+    converted = sum_converted(groups, key=lambda group: bucket_start(group['date'], granularity))
+    if unconverted is not None:
+        unconverted.update(add_unconverted(groups))
+    points = [{'date': day,
+               'total': ((sums[day]['total'] or 0) if day in sums else 0) + converted.get(day, 0),
+               'count': sums[day]['count'] if day in sums else 0}
+              for day in buckets(start, end, granularity)]
+
+    if len(points) > max_points:
+        step = math.ceil(len(points) / max_points)
+        points = [{'date': group[0]['date'],
+                   'total': sum(point['total'] for point in group),
+                   'count': sum(point['count'] for point in group)}
+                  for group in (points[index:index + step] for index in range(0, len(points), step))]
+    for point in points:
+        point['total'] = Money.from_minor(point['total'], currency)
+    return granularity, points
@@ -0,0 +1,139 @@
+"""
+Type-ahead search over a user's expenses or income.
+
+The newest ``limit`` rows whose description or category/source name
+contains the typed text are returned with the number of matches, which is
+estimated when it comes from cached candidates that were cut off. The
+ranked full search stays at the ``search-*`` endpoints.
+
+Each user has a small LRU of recent prefixes and their newest
+``TYPEAHEAD_CANDIDATES`` matches. Every row matching ``food`` also matches
+``foo``, so typing on from a cached prefix filters those candidates in
+Python instead of querying again. When the candidates were cut off at the
+cap, the filtered rows are still the newest matches, so they are used as
+long as at least ``limit`` of them remain. Entries carry the user's data
+version and are ignored once the user writes.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Count, F, Q, Window
+
+from .cache import data_version
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 50
+SPACE_RE = re.compile(r'\s+')
+
+
+def normalize(text):
+    return SPACE_RE.sub(' ', (text or '').strip()).casefold()
+
+
+def clamp_limit(value):
+    try:
+        limit = int(value or DEFAULT_LIMIT)
+    except (TypeError, ValueError):
+        limit = DEFAULT_LIMIT
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+class Candidates:
+    """The newest rows matching a prefix; ``complete`` when none were cut off."""
+
+    def __init__(self, version, rows, complete, total, total_is_exact):
+        self.version = version
+        self.rows = rows
+        self.complete = complete
+        self.total = total
+        self.total_is_exact = total_is_exact
+
+
+class PrefixCache:
+    """Per-user LRU of ``Candidates`` keyed by scope and prefix."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _user(self, user_id):
+        entries = self._entries.get(user_id)
+        if entries is None:
+            entries = self._entries[user_id] = OrderedDict()
+            while len(self._entries) > settings.TYPEAHEAD_CACHE_USERS:
+                self._entries.popitem(last=False)
+        self._entries.move_to_end(user_id)
+        return entries
+
+    def longest_prefix(self, user_id, scope, text, version):
+        """The current entry for the longest cached prefix of ``text``, and that prefix."""
+        with self._lock:
+            entries = self._user(user_id)
+            for length in range(len(text), 0, -1):
+                key = (scope, text[:length])
+                entry = entries.get(key)
+                if entry is not None and entry.version == version:
+                    entries.move_to_end(key)
+                    return text[:length], entry
+        return None, None
+
+    def put(self, user_id, scope, text, entry):
+        with self._lock:
+            entries = self._user(user_id)
+            entries[(scope, text)] = entry
+            entries.move_to_end((scope, text))
+            while len(entries) > settings.TYPEAHEAD_CACHE_PREFIXES:
+                entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+prefix_cache = PrefixCache()
+
+
+def narrow(entry, text, label_name, version):
+    """Candidates for ``text`` filtered from ``entry``, the candidates of a prefix of it."""
+    rows = [row for row in entry.rows
+            if text in row['description'].casefold() or text in (row[label_name] or '').casefold()]
+    if entry.complete:
+        return Candidates(version, rows, True, len(rows), True)
+    # The candidates are the newest matches of the prefix; scale its total.
+    total = round(entry.total * len(rows) / max(len(entry.rows), 1))
+    return Candidates(version, rows, False, total, False)
+
+
+def typeahead(queryset, user_id, scope, text, label_field, fields, limit):
+    """
+    Return ``(rows, total, total_is_exact, cached)`` for ``text`` in the
+    ``queryset`` of ``user_id``. Rows hold ``fields`` plus the
+    ``<label_field>_name``; ``fields`` must include ``description``.
+    """
+    text = normalize(text)
+    if not text:
+        return [], 0, True, False
+    label_name = label_field + '_name'
+    version = data_version(user_id)
+
+    prefix, entry = prefix_cache.longest_prefix(user_id, scope, text, version)
+    if entry is not None and prefix != text:
+        entry = narrow(entry, text, label_name, version)
+    if entry is not None and (entry.complete or len(entry.rows) >= limit):
+        if prefix != text:
+            prefix_cache.put(user_id, scope, text, entry)
+        return entry.rows[:limit], entry.total, entry.total_is_exact, True
+
+    cap = settings.TYPEAHEAD_CANDIDATES
+    matching = queryset.filter(Q(description__icontains=text) | Q(**{label_field + '__name__icontains': text}))
+    # The window count totals every match in the same query as the rows.
+    rows = list(matching.values(*fields, **{label_name: F(label_field + '__name'),
+                                            'matches': Window(Count('id'))})[:cap])
+    total = rows[0]['matches'] if rows else 0
+    for row in rows:
+        del row['matches']
+    entry = Candidates(version, rows, total <= cap, total, True)
+    prefix_cache.put(user_id, scope, text, entry)
+    return rows[:limit], total, True, False
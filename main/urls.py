@@ -1,6 +1,11 @@
 from django.urls import path
-from . import views
+from . import sync, views
+from .api_urls import expenses, income
 
 urlpatterns = [
     path('', views.index, name="main"),
+    path('sync', sync.sync_view, {'resources': {'expenses': expenses, 'income': income}}, name="sync"),
+    path('stats/cache', views.response_cache_stats, name="cache-stats"),
+    path('stats/requests', views.request_metrics, name="request-metrics"),
+    path('stats/connections', views.connection_metrics, name="connection-metrics"),
 ]
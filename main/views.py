@@ -1,8 +1,34 @@
+from django.conf import settings
 from django.shortcuts import render
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from .cache import cache_stats
+from .dashboard import dashboard_snapshot
+from .metrics import connection_stats, request_stats
 # Create your views here.
 
 
 @login_required(login_url='auth/login')
 def index(request):
-    return render(request, 'main/index.html')
+    return render(request, 'main/index.html', {'snapshot': dashboard_snapshot(request.user)})
+
+
+@staff_member_required
+def response_cache_stats(request):
+    return JsonResponse({'response_cache': cache_stats()})
+
+
+@staff_member_required
+def request_metrics(request):
+    return JsonResponse({'enabled': settings.REQUEST_METRICS, 'views': request_stats()})
+
+
+@staff_member_required
+def connection_metrics(request):
+    return JsonResponse({
+        'conn_max_age': settings.DB_CONN_MAX_AGE,
+        'health_checks': settings.DB_HEALTH_CHECKS,
+        'pool': settings.DB_POOL_SIZE if settings.DB_POOL else None,
+        'connections': connection_stats(),
+    })
@@ -3,7 +3,14 @@ from django.contrib.admin.models import LogEntry
 from .models import UserIncome, Source
 # Register your models here.
 
-admin.site.register(UserIncome)
+
+class UserIncomeAdmin(admin.ModelAdmin):
+    list_display = ('amount', 'description', 'owner', 'source', 'date',)
+    list_select_related = ('owner', 'source')
+    search_fields = ('description', 'source__name', 'date',)
+
+
+admin.site.register(UserIncome, UserIncomeAdmin)
 admin.site.register(Source)
 
 
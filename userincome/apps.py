@@ -3,3 +3,14 @@ from django.apps import AppConfig
 
 class UserincomeConfig(AppConfig):
     name = 'userincome'
+
+    def ready(self):
+        from main.cache import track_data_version, track_label_version
+        from main.lookups import track_lookup
+        from main.rollups import track_rollups
+        from .models import IncomeRollup, Source, UserIncome
+
+        track_rollups(UserIncome, IncomeRollup, 'source')
+        track_data_version(UserIncome)
+        track_label_version(UserIncome, 'source')
+        track_lookup(Source)
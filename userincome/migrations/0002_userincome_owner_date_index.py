@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='userincome',
+            options={'ordering': ['-date', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='userincome',
+            index=models.Index(fields=['owner', 'date', 'id'], name='income_owner_date_idx'),
+        ),
+    ]
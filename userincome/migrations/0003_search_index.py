@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from main.search import drop_postgres_trigram, drop_sqlite_fts, install_postgres_trigram, install_sqlite_fts
+
+
+def create_search_index(apps, schema_editor):
+    install_postgres_trigram(schema_editor, 'userincome_userincome')
+    install_sqlite_fts(schema_editor, 'userincome_userincome')
+
+
+def drop_search_index(apps, schema_editor):
+    drop_postgres_trigram(schema_editor, 'userincome_userincome')
+    drop_sqlite_fts(schema_editor, 'userincome_userincome')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0002_userincome_owner_date_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
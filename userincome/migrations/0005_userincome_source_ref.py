@@ -0,0 +1,26 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+from main.search import install_sqlite_fts
+
+
+def reinstall_search_index(apps, schema_editor):
+    # Undoing this migration remakes userincome_userincome on SQLite, dropping the FTS triggers.
+    install_sqlite_fts(schema_editor, 'userincome_userincome')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0004_incomerollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.AddField(
+            model_name='userincome',
+            name='source_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+',
+                                    to='userincome.source'),
+        ),
+    ]
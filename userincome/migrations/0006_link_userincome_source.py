@@ -0,0 +1,53 @@
+from django.db import migrations, transaction
+
+BATCH_SIZE = 5000
+
+
+def link_source_rows(apps, schema_editor):
+    """
+    Point every income at the Source row named by its text column.
+
+    Works in id-ordered batches of BATCH_SIZE rows and only picks rows
+    that are not linked yet.
+    """
+    UserIncome = apps.get_model('userincome', 'UserIncome')
+    Source = apps.get_model('userincome', 'Source')
+    names = set(UserIncome.objects.order_by().values_list('source', flat=True).distinct())
+    existing = set(Source.objects.values_list('name', flat=True))
+    Source.objects.bulk_create([Source(name=name) for name in sorted(names - existing)])
+    ids = {}
+    for pk, name in Source.objects.order_by('-id').values_list('id', 'name'):
+        ids[name] = pk  # the oldest row wins where names repeat
+
+    pending = UserIncome.objects.filter(source_ref__isnull=True).order_by('id')
+    while True:
+        batch = list(pending.values_list('id', 'source')[:BATCH_SIZE])
+        if not batch:
+            break
+        by_name = {}
+        for pk, name in batch:
+            by_name.setdefault(name, []).append(pk)
+        with transaction.atomic():
+            for name, pks in by_name.items():
+                UserIncome.objects.filter(id__in=pks).update(source_ref=ids[name])
+
+
+def unlink_source_rows(apps, schema_editor):
+    UserIncome = apps.get_model('userincome', 'UserIncome')
+    Source = apps.get_model('userincome', 'Source')
+    for pk, name in Source.objects.values_list('id', 'name'):
+        UserIncome.objects.filter(source_ref=pk).update(source=name)
+
+
+class Migration(migrations.Migration):
+    # Not atomic: every batch commits on its own, so a run interrupted on a
+    # large table keeps its progress and `migrate` picks up from there.
+    atomic = False
+
+    dependencies = [
+        ('userincome', '0005_userincome_source_ref'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_source_rows, unlink_source_rows),
+    ]
@@ -0,0 +1,83 @@
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+import django.db.models.deletion
+
+from main.search import install_sqlite_fts
+
+
+def populate_rollups(apps, schema_editor):
+    UserIncome = apps.get_model('userincome', 'UserIncome')
+    IncomeRollup = apps.get_model('userincome', 'IncomeRollup')
+    IncomeRollup.objects.all().delete()
+    grouped = (UserIncome.objects.order_by()
+               .annotate(rollup_month=TruncMonth('date'))
+               .values('owner_id', 'rollup_month', 'source_id')
+               .annotate(rollup_total=Sum('amount'), rollup_count=Count('id')))
+    IncomeRollup.objects.bulk_create(
+        [IncomeRollup(owner_id=row['owner_id'], month=row['rollup_month'], source_id=row['source_id'],
+                      total=row['rollup_total'], count=row['rollup_count']) for row in grouped.iterator()],
+        batch_size=1000)
+
+
+def clear_rollups(apps, schema_editor):
+    # Rollups are rebuilt from the linked rows below; undoing leaves them empty
+    # until `manage.py rebuild_rollups` runs against the restored schema.
+    apps.get_model('userincome', 'IncomeRollup').objects.all().delete()
+
+
+def reinstall_search_index(apps, schema_editor):
+    # SQLite remade userincome_userincome above, which dropped the FTS triggers.
+    install_sqlite_fts(schema_editor, 'userincome_userincome')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0006_link_userincome_source'),
+    ]
+
+    operations = [
+        # A default lets the text column be re-added to existing rows when
+        # this migration is undone; the link migration then refills it.
+        migrations.AlterField(
+            model_name='userincome',
+            name='source',
+            field=models.CharField(default='', max_length=266),
+        ),
+        migrations.RemoveField(
+            model_name='userincome',
+            name='source',
+        ),
+        migrations.RenameField(
+            model_name='userincome',
+            old_name='source_ref',
+            new_name='source',
+        ),
+        migrations.AlterField(
+            model_name='userincome',
+            name='source',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='userincome.source'),
+        ),
+        migrations.RunPython(clear_rollups, clear_rollups),
+        migrations.RemoveConstraint(
+            model_name='incomerollup',
+            name='income_rollup_unique',
+        ),
+        migrations.RemoveField(
+            model_name='incomerollup',
+            name='source',
+        ),
+        migrations.AddField(
+            model_name='incomerollup',
+            name='source',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                                    to='userincome.source'),
+        ),
+        migrations.AddConstraint(
+            model_name='incomerollup',
+            constraint=models.UniqueConstraint(fields=('owner', 'month', 'source'), name='income_rollup_unique'),
+        ),
+        migrations.RunPython(populate_rollups, clear_rollups),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+from main.search import install_sqlite_fts
+
+
+def reinstall_search_index(apps, schema_editor):
+    # Adding a column remakes userincome_userincome on SQLite, dropping the FTS triggers.
+    install_sqlite_fts(schema_editor, 'userincome_userincome')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0007_source_foreign_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.AddField(
+            model_name='userincome',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userincome',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='userincome',
+            index=models.Index(fields=['owner', 'updated_at', 'id'], name='income_owner_updated_idx'),
+        ),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:05
+
+from django.db import migrations, models
+from django.db.models import BigIntegerField, Count, ExpressionWrapper, F, FloatField, Sum, Value
+from django.db.models.functions import Cast, Round, TruncMonth
+
+from main.search import install_sqlite_fts
+
+
+def reinstall_search_index(apps, schema_editor):
+    # Altering columns remakes userincome_userincome on SQLite, dropping the FTS triggers.
+    install_sqlite_fts(schema_editor, 'userincome_userincome')
+
+
+def amounts_to_minor(apps, schema_editor):
+    UserIncome = apps.get_model('userincome', 'UserIncome')
+    UserIncome.objects.update(amount_minor=Cast(Round(F('amount') * 100), BigIntegerField()))
+
+
+def amounts_from_minor(apps, schema_editor):
+    UserIncome = apps.get_model('userincome', 'UserIncome')
+    UserIncome.objects.update(amount=ExpressionWrapper(F('amount_minor') / Value(100.0), output_field=FloatField()))
+
+
+def rebuild_rollups(apps, schema_editor):
+    # Summed again from the exact amounts rather than converting float totals.
+    UserIncome = apps.get_model('userincome', 'UserIncome')
+    IncomeRollup = apps.get_model('userincome', 'IncomeRollup')
+    grouped = (UserIncome.objects.filter(deleted_at__isnull=True).order_by()
+               .annotate(rollup_month=TruncMonth('date'))
+               .values('owner_id', 'rollup_month', 'source')
+               .annotate(rollup_total=Sum('amount_minor'), rollup_count=Count('id')))
+    IncomeRollup.objects.all().delete()
+    IncomeRollup.objects.bulk_create(
+        [IncomeRollup(owner_id=row['owner_id'], month=row['rollup_month'], source_id=row['source'],
+                      total_minor=row['rollup_total'], count=row['rollup_count']) for row in grouped.iterator()],
+        batch_size=1000)
+
+
+def rollup_totals_from_minor(apps, schema_editor):
+    IncomeRollup = apps.get_model('userincome', 'IncomeRollup')
+    IncomeRollup.objects.update(
+        total=ExpressionWrapper(F('total_minor') / Value(100.0), output_field=FloatField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0008_sync_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.AddField(
+            model_name='userincome',
+            name='amount_minor',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='userincome',
+            name='currency',
+            field=models.CharField(default='INR', max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='userincome',
+            name='amount',
+            field=models.FloatField(null=True),
+        ),
+        migrations.RunPython(amounts_to_minor, amounts_from_minor),
+        migrations.RemoveField(
+            model_name='userincome',
+            name='amount',
+        ),
+        migrations.AlterField(
+            model_name='userincome',
+            name='amount_minor',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name='userincome',
+            index=models.Index(fields=['owner', 'amount_minor'], name='income_owner_amount_idx'),
+        ),
+        migrations.AddField(
+            model_name='incomerollup',
+            name='total_minor',
+            field=models.BigIntegerField(default=0),
+        ),
+        # Rebuilt once ``total`` is gone: on PostgreSQL, altering the table after
+        # inserting rows with deferred foreign keys fails with pending trigger events.
+        migrations.RunPython(migrations.RunPython.noop, rollup_totals_from_minor),
+        migrations.RemoveField(
+            model_name='incomerollup',
+            name='total',
+        ),
+        migrations.RunPython(rebuild_rollups, migrations.RunPython.noop),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
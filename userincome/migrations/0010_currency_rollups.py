@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:49
+
+from django.db import migrations, models
+import main.money
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0009_amount_minor_units'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='incomerollup',
+            name='income_rollup_unique',
+        ),
+        migrations.AddField(
+            model_name='incomerollup',
+            name='currency',
+            field=models.CharField(default='INR', max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='userincome',
+            name='currency',
+            field=models.CharField(default='INR', max_length=3, validators=[main.money.validate_currency]),
+        ),
+        migrations.AddIndex(
+            model_name='userincome',
+            index=models.Index(fields=['owner', 'currency', 'date'], name='income_owner_currency_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='incomerollup',
+            constraint=models.UniqueConstraint(
+                fields=('owner', 'month', 'source', 'currency'),
+                name='income_rollup_unique',
+            ),
+        ),
+    ]
@@ -1,20 +1,30 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.timezone import now
+from main.models import MoneyAmount, MonthlyRollup, SyncedTransaction
 
 
-class UserIncome(models.Model):
-    amount = models.FloatField()
+class UserIncome(MoneyAmount, SyncedTransaction):
     date = models.DateField(default=now)
     description = models.TextField()
     owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
-    source = models.CharField(max_length=266)
+    source = models.ForeignKey(to='Source', on_delete=models.PROTECT)
 
     def __str__(self):
-        return self.source
+        return str(self.source)
+
+    @property
+    def source_name(self):
+        return self.source.name
 
     class Meta:
-        ordering: ['-date']  # noqa: F821
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['owner', 'date', 'id'], name='income_owner_date_idx'),
+            models.Index(fields=['owner', 'updated_at', 'id'], name='income_owner_updated_idx'),
+            models.Index(fields=['owner', 'amount_minor'], name='income_owner_amount_idx'),
+            models.Index(fields=['owner', 'currency', 'date'], name='income_owner_currency_idx'),
+        ]
 
 
 class Source(models.Model):
@@ -22,3 +32,15 @@ class Source(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class IncomeRollup(MonthlyRollup):
+    source = models.ForeignKey(to=Source, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'month', 'source', 'currency'], name='income_rollup_unique'),
+        ]
+
+    def __str__(self):
+        return '%s %s' % (self.month, self.source_id)
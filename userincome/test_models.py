@@ -1,3 +1,5 @@
+import datetime
+from django.db import connection
 from django.test import TestCase
 from django.contrib.auth.models import User
 from userincome.models import UserIncome, Source
@@ -28,7 +30,7 @@ class TestUserIncomeModel(TestCase):
     def setUp(self):
         self.owner = User.objects.create(username='admin')
         self.data1 = UserIncome.objects.create(amount=1, description='test description',
-                                               owner=self.owner, source="django")
+                                               owner=self.owner, source=Source.objects.create(name='django'))
 
     def test_source_model_entry(self):
         """
@@ -37,3 +39,24 @@ class TestUserIncomeModel(TestCase):
         data = self.data1
         self.assertTrue(isinstance(data, UserIncome))
         self.assertEqual(str(data), 'django')
+
+
+class TestUserIncomeQuerySet(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create(username='admin')
+        salary = Source.objects.create(name='SALARY')
+        for day in (1, 10, 20):
+            UserIncome.objects.create(amount=day, description='d', owner=self.owner,
+                                      source=salary, date=datetime.date(2021, 5, day))
+
+    def test_owner_date_range_uses_index(self):
+        """
+        Test the owner/date range query is answered from the composite index
+        """
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan TO off')
+        incomes = UserIncome.objects.for_owner(self.owner).between(end=datetime.date(2021, 5, 15))
+        self.assertEqual([i.amount for i in incomes], [10, 1])
+        self.assertIn('income_owner_date_idx', incomes.explain())
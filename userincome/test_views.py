@@ -1,24 +1,31 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 from userincome.models import UserIncome, Source
 from django.test import Client
+from django.core.cache import cache
 import datetime
+from django.core.files.uploadedfile import SimpleUploadedFile
+from main.testing import QueryBudgetMixin
 
 
+@override_settings(ASYNC_DB_THREAD_SENSITIVE=True)
 class TestUserIncome(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.user = User.objects.create_user("sahil", "sahilharpal1234@gmail.com", "password123")
         self.user2 = User.objects.create_user("sahil2", "sahilharpal12345@gmail.com", "password1234")
         self.source = Source.objects.create(name='django')
+        self.rent = Source.objects.create(name='RENT')
+        self.work = Source.objects.create(name='WORK')
         self.view_income_url = reverse('income')
         self.add_income_url = reverse('add-income')
         self.income = {
             'amount': 1000,
             'description': "Hello World",
             'date': datetime.date.today(),
-            'source': 'RENT',
+            'source': self.rent.pk,
             'owner': User.objects.first(),
         }
         self.updated_income = {'amount': 500,
@@ -29,7 +36,7 @@ class TestUserIncome(TestCase):
         ex = UserIncome(amount=1000,
                         description="Hello World",
                         date=datetime.date.today(),
-                        source='RENT',
+                        source=self.rent,
                         owner=User.objects.first())
         ex.save()
 
@@ -61,7 +68,7 @@ class TestUserIncome(TestCase):
                 'amount': 1000,
                 'description': "Hello World",
                 'income_date': datetime.date.today(),
-                'source': 'RENT',
+                'source': self.rent.pk,
                 'owner': self.user,
             }, format='text/html')
         created_income = UserIncome.objects.filter(owner=self.user).order_by('-id')
@@ -71,7 +78,7 @@ class TestUserIncome(TestCase):
         self.assertEqual(created_income[0].owner, self.user)
         self.assertEqual(created_income[0].amount, 1000)
         self.assertEqual(created_income[0].description, 'Hello World')
-        self.assertEqual(created_income[0].source, 'RENT')
+        self.assertEqual(created_income[0].source.name, 'RENT')
 
     def test_get_edit_others_income(self):
         self.client.login(username='sahil2', password='password1234')
@@ -105,7 +112,7 @@ class TestUserIncome(TestCase):
                 'amount': 500,
                 'description': "Update Hello World",
                 'income_date': datetime.date.today(),
-                'source': 'RENT',
+                'source': self.rent.pk,
                 'owner': self.user,
             }, format='text/html')
         updated_income = UserIncome.objects.filter(owner=self.user).order_by('-id')
@@ -114,7 +121,7 @@ class TestUserIncome(TestCase):
         self.assertEqual(updated_income[0].owner, self.user)
         self.assertEqual(updated_income[0].amount, 500)
         self.assertEqual(updated_income[0].description, 'Update Hello World')
-        self.assertEqual(updated_income[0].source, 'RENT')
+        self.assertEqual(updated_income[0].source.name, 'RENT')
         self.assertEqual(updated_income[0].date, datetime.date.today())
 
     def test_delete_own_income(self):
@@ -153,3 +160,117 @@ class TestUserIncome(TestCase):
             self.add_income_url, data=self.income, format='json')
 
         self.assertEqual(response.status_code, 302)
+
+    def test_source_summary_uses_requested_window(self):
+        self.client.login(username='sahil', password='password123')
+        salary, gift = Source.objects.create(name='SALARY'), Source.objects.create(name='GIFT')
+        UserIncome.objects.create(amount=100, description='x', date=datetime.date(2021, 3, 5),
+                                  source=salary, owner=self.user)
+        UserIncome.objects.create(amount=50, description='x', date=datetime.date(2021, 3, 20),
+                                  source=salary, owner=self.user)
+        UserIncome.objects.create(amount=20, description='x', date=datetime.date(2021, 2, 1),
+                                  source=gift, owner=self.user)
+
+        response = self.client.get(reverse('income_source_summary'),
+                                   {'start': '2021-03-01', 'end': '2021-03-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'income_source_data': {'SALARY': '150.00'}, 'currency': 'INR',
+                                           'unconverted': {}, 'complete': True,
+                                           'start': '2021-03-01', 'end': '2021-03-31'})
+
+    def test_search_income_ranks_and_limits(self):
+        self.client.login(username='sahil', password='password123')
+        for day in range(1, 6):
+            UserIncome.objects.create(amount=100 + day, description='Freelance invoice %d' % day,
+                                      date=datetime.date(2021, 5, day), source=self.work, owner=self.user)
+        response = self.client.post(reverse('search_income'), {'searchText': 'invoice', 'limit': 2},
+                                    content_type='application/json')
+        self.assertEqual(len(response.json()), 2)
+        self.assertEqual(set(response.json()[0]),
+                         {'id', 'amount', 'currency', 'date', 'description', 'source', 'source_name'})
+
+        response = self.client.post(reverse('search_income'), {'searchText': '103'},
+                                    content_type='application/json')
+        self.assertEqual([row['description'] for row in response.json()], ['Freelance invoice 3'])
+
+    def test_income_page_reports_approximate_count(self):
+        self.client.login(username='sahil', password='password123')
+        UserIncome.objects.bulk_create([UserIncome(amount=i, description='d', source=self.work, owner=self.user)
+                                        for i in range(12)])
+        with self.settings(PAGINATION_COUNT_LIMIT=10):
+            page = self.client.get(reverse('income-page'), {'limit': 5}).json()
+            response = self.client.get(reverse('income'))
+        self.assertEqual((page['count'], page['count_is_exact']), (10, False))
+        self.assertContains(response, 'Showing 7 of 10+ records')
+        self.assertIsNotNone(page['next'])
+
+    def test_import_income_from_ofx(self):
+        self.client.login(username='sahil', password='password123')
+        ofx = SimpleUploadedFile('statement.ofx', (
+            '<OFX><STMTTRN><DTPOSTED>20210501<TRNAMT>1500.00<NAME>Salary</STMTTRN>'
+            '<STMTTRN><DTPOSTED>20210515<TRNAMT>200<MEMO>Refund</STMTTRN></OFX>').encode())
+        response = self.client.post(reverse('import-income'), {'file': ofx, 'source': self.source.pk})
+        self.assertEqual(response.context['result'].created, 2)
+        self.assertEqual(sorted(UserIncome.objects.filter(owner=self.user).values_list('description', 'amount_minor')),
+                         [('Refund', 20000), ('Salary', 150000)])
+
+    def test_export_income_as_spreadsheet_and_pdf(self):
+        self.client.login(username='sahil', password='password123')
+        UserIncome.objects.create(amount=1500, description='Salary <May>', source=self.work, owner=self.user,
+                                  date=datetime.date(2021, 5, 1))
+
+        response = self.client.get(reverse('export-income'), {'format': 'xls'})
+        sheet = b''.join(response.streaming_content).decode()
+        self.assertEqual(response['Content-Type'], 'application/vnd.ms-excel')
+        self.assertIn('<Cell><Data ss:Type="String">Salary &lt;May&gt;</Data></Cell>', sheet)
+        self.assertIn('<Cell><Data ss:Type="Number">1500.00</Data></Cell>', sheet)
+
+        response = self.client.get(reverse('export-income'), {'format': 'pdf'})
+        pdf = b''.join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertIn(b'(Salary <May>) Tj', pdf)
+        # every cross-reference entry must point at the start of its object
+        xref_offset = int(pdf.rsplit(b'startxref\n', 1)[1].split()[0])
+        entries = pdf[xref_offset:].split(b'\n')[3:]
+        for number, entry in enumerate(entries[:5], 1):
+            offset = int(entry.split()[0])
+            self.assertTrue(pdf[offset:].startswith(b'%d 0 obj' % number))
+
+    def test_api_batch_creates_income_and_lists_it(self):
+        self.client.login(username='sahil', password='password123')
+        response = self.client.post(reverse('api-income-batch'), {
+            'create': [{'amount': 1500, 'date': '2021-05-01', 'description': 'Salary', 'source': self.source.pk},
+                       {'amount': 200, 'date': '2021-05-15', 'description': 'Refund', 'source': self.source.pk}],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['created']), 2)
+
+        response = self.client.get(reverse('api-income'), {'start': '2021-05-10',
+                                                           'fields': 'description,source,source_name'})
+        self.assertEqual(response.json()['results'],
+                         [{'description': 'Refund', 'source': self.source.pk, 'source_name': 'django'}])
+
+
+@override_settings(ASYNC_DB_THREAD_SENSITIVE=True)
+class TestIncomeQueryBudgets(QueryBudgetMixin, TestCase):
+
+    def test_views_stay_within_query_budgets(self):
+        user = self.grow_budget_data(0)
+        salary = Source.objects.get(name='Salary')
+        income = UserIncome.objects.create(amount=1, description='edit me', source=salary, owner=user)
+        self.client.force_login(user)
+        self.assertQueryBudgets({
+            'income': (4, lambda: self.client.get(reverse('income'))),
+            'income-page': (4, lambda: self.client.get(reverse('income-page'), {'limit': 50})),
+            'add-income': (3, lambda: self.client.get(reverse('add-income'))),
+            'import-income': (3, lambda: self.client.get(reverse('import-income'))),
+            'export-income': (3, lambda: self.client.get(reverse('export-income'))),
+            'income-edit': (4, lambda: self.client.get(reverse('income-edit', args=[income.pk]))),
+            'search_income': (4, lambda: self.client.post(reverse('search_income'), {'searchText': 'salary'},
+                                                          content_type='application/json')),
+            'typeahead_income': (3, lambda: self.client.get(reverse('typeahead_income'), {'q': 'salary'})),
+            'income_source_summary': (4, lambda: self.client.get(reverse('income_source_summary'))),
+            'income_trend': (3, lambda: self.client.get(reverse('income_trend'), {'days': 365})),
+            'stats': (0, lambda: self.client.get(reverse('stats'))),
+            'api-income': (4, lambda: self.client.get(reverse('api-income'))),
+        })
@@ -1,15 +1,20 @@
 from django.urls import path
 from . import views
 
-from django.views.decorators.csrf import csrf_exempt
+from main.aio import async_csrf_exempt
 
 urlpatterns = [
     path('', views.index, name="income"),
+    path('page', views.income_page, name="income-page"),
     path('add-income', views.add_income, name="add-income"),
+    path('import-income', views.import_income, name="import-income"),
+    path('export-income', views.export_income, name="export-income"),
     path('edit-income/<int:id>', views.income_edit, name="income-edit"),
     path('income-delete/<int:id>', views.delete_income, name="income-delete"),
-    path('search-income', csrf_exempt(views.search_income),
+    path('typeahead', views.typeahead_income, name="typeahead_income"),
+    path('search-income', async_csrf_exempt(views.search_income),
          name="search_income"),
+    path('income_trend', views.income_trend, name="income_trend"),
     path('income_source_summary', views.income_source_summary,
          name="income_source_summary"),
     path('stats', views.stats_view,
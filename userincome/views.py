@@ -1,43 +1,87 @@
 from django.shortcuts import render, redirect
-from .models import Source, UserIncome
-from django.core.paginator import Paginator
-# from userpreferences.models import UserPreference
+from .models import IncomeRollup, Source, UserIncome
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.contrib.auth.decorators import login_required
+import csv
 import json
-import datetime
+from django.db.models import F
+from django.conf import settings
 from django.http import JsonResponse
+from main.aio import Superseded, async_login_required, database_sync_to_async, latest_only
+from main.cache import cache_per_user
+from main.exports import export_response
+from main.fx import base_currency
+from main.importers import FORMATS as IMPORT_FORMATS, ImportFormatError, import_file
+from main.lookups import lookup
+from main.money import money_rows, to_minor
+from main.pagination import KeysetPaginator, page_payload
+from main.routers import read_replica
+from main.search import clamp_window, search
+from main.summary import date_window, parse_date, totals_by
+from main.trends import parse_points, trend
+from main.typeahead import clamp_limit, typeahead
 
 
-def search_income(request):
+@async_login_required
+@read_replica
+async def search_income(request):
     if request.method == 'POST':
-        search_str = json.loads(request.body).get('searchText')
-        income = UserIncome.objects.filter(
-            amount__istartswith=search_str, owner=request.user) | UserIncome.objects.filter(
-            date__istartswith=search_str, owner=request.user) | UserIncome.objects.filter(
-            description__icontains=search_str, owner=request.user) | UserIncome.objects.filter(
-            source__icontains=search_str, owner=request.user)
-        data = income.values()
-        return JsonResponse(list(data), safe=False)
+        params = json.loads(request.body)
+        limit, offset = clamp_window(params)
+
+        def rows():
+            income = search(UserIncome.objects.for_owner(request.user), params.get('searchText'), 'source__name')
+            return money_rows(income.values('id', 'amount_minor', 'currency', 'date', 'description', 'source',
+                                            source_name=F('source__name'))[offset:offset + limit])
+        try:
+            data = await latest_only(('search_income', request.user.pk), rows)
+        except Superseded:
+            return JsonResponse({'error': 'superseded by a newer search'}, status=409)
+        return JsonResponse(data, safe=False)
+
+
+@async_login_required
+@read_replica
+async def typeahead_income(request):
+    limit = clamp_limit(request.GET.get('limit'))
+
+    def find():
+        return typeahead(UserIncome.objects.for_owner(request.user), request.user.pk, 'income', request.GET.get('q'),
+                         'source', ('id', 'amount_minor', 'currency', 'date', 'description', 'source'), limit)
+    try:
+        rows, total, total_is_exact, cached = await latest_only(('typeahead_income', request.user.pk), find)
+    except Superseded:
+        return JsonResponse({'error': 'superseded by a newer search'}, status=409)
+    response = JsonResponse({'results': money_rows(rows), 'total': total, 'total_is_exact': total_is_exact})
+    response['X-Cache'] = 'HIT' if cached else 'MISS'
+    return response
 
 
 @login_required(login_url='/auth/login')
 def index(request):
-    souces = Source.objects.all()
-    income = UserIncome.objects.filter(owner=request.user).order_by('-id')
-    paginator = Paginator(income, 7)
-    page_number = request.GET.get('page')
-    page_obj = Paginator.get_page(paginator, page_number)
+    income = UserIncome.objects.for_owner(request.user).select_related('source')
+    paginator = KeysetPaginator(income, 7, count_limit=settings.PAGINATION_COUNT_LIMIT or None)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     context = {
-        'income': income,
         'page_obj': page_obj,
     }
     return render(request, 'income/index.html', context)
 
 
+@login_required(login_url='/auth/login')
+def income_page(request):
+    limit, _ = clamp_window(request.GET)
+    paginator = KeysetPaginator(UserIncome.objects.for_owner(request.user).select_related('source'), limit,
+                                count_limit=settings.PAGINATION_COUNT_LIMIT or None)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    return JsonResponse(page_payload(page_obj, ('id', 'amount', 'currency', 'date', 'description', 'source',
+                                                'source_name')))
+
+
 @login_required(login_url='/auth/login')
 def add_income(request):
-    source = Source.objects.all()
+    source = lookup(Source).all()
     context = {
         'sources': source,
         'values': request.POST
@@ -50,40 +94,116 @@ def add_income(request):
 
         description = request.POST['description']
         date = request.POST['income_date']
-        source = request.POST['source']
+        source_id = request.POST.get('source', '')
 
-        UserIncome.objects.create(owner=request.user, amount=amount, date=date,
-                                  source=source, description=description)
+        if lookup(Source).get(source_id) is None:
+            messages.error(request, 'Choose a source')
+            return render(request, 'income/add_income.html', context)
+        currency = request.POST.get('currency') or base_currency(request.user.pk)
+        if currency not in settings.CURRENCIES:
+            messages.error(request, 'Choose a currency')
+            return render(request, 'income/add_income.html', context)
+        try:
+            to_minor(amount, currency)
+        except ValidationError:
+            messages.error(request, 'Amount must be a number')
+            return render(request, 'income/add_income.html', context)
+
+        UserIncome.objects.create(owner=request.user, currency=currency, amount=amount, date=date,
+                                  source_id=source_id, description=description)
         messages.success(request, 'Record saved successfully')
 
         return redirect('income')
 
 
+@login_required(login_url='/auth/login')
+def import_income(request):
+    sources = lookup(Source).all()
+    context = {
+        'sources': sources,
+        'formats': IMPORT_FORMATS,
+    }
+    if request.method == 'GET':
+        return render(request, 'income/import.html', context)
+
+    upload = request.FILES.get('file')
+    default = request.POST.get('source', '')
+    if not upload:
+        messages.error(request, 'Choose a file to import')
+        return render(request, 'income/import.html', context)
+    try:
+        result = import_file(UserIncome, request.user, 'source', upload, request.POST.get('format'),
+                             labels=lookup(Source).ids(),
+                             default_label=int(default) if default.isdigit() else None,
+                             currency=base_currency(request.user.pk))
+    except (ImportFormatError, csv.Error) as ex:
+        messages.error(request, str(ex))
+        return render(request, 'income/import.html', context)
+
+    context['result'] = result
+    if result.created:
+        messages.success(request, '%d income records imported' % result.created)
+    if result.error_count:
+        messages.warning(request, '%d rows could not be imported' % result.error_count)
+    return render(request, 'income/import.html', context)
+
+
+@login_required(login_url='/auth/login')
+@read_replica
+def export_income(request):
+    try:
+        start = parse_date(request.GET['start']) if request.GET.get('start') else None
+        end = parse_date(request.GET['end']) if request.GET.get('end') else None
+    except ValueError:
+        return JsonResponse({'error': 'start and end must be YYYY-MM-DD dates'}, status=400)
+    rows = UserIncome.objects.for_owner(request.user).between(start, end).order_by('date', 'id')
+    source = request.GET.getlist('source')
+    if not all(pk.isdigit() for pk in source):
+        return JsonResponse({'error': 'source must be source ids'}, status=400)
+    if source:
+        rows = rows.filter(source__in=source)
+    return export_response(rows, ('date', 'source__name', 'description', 'amount_minor', 'currency'),
+                           ('Date', 'Source', 'Description', 'Amount', 'Currency'),
+                           request.GET.get('format', 'csv'), 'income')
+
+
 @login_required(login_url='/auth/login')
 def income_edit(request, id):
-    income = UserIncome.objects.get(pk=id)
-    sources = Source.objects.all()
+    income = UserIncome.objects.for_owner(request.user).select_related('source').filter(pk=id).first()
+    if income is None:
+        return redirect('income')
+    sources = lookup(Source).all()
     context = {
         'income': income,
         'values': income,
         'sources': sources
     }
     if request.method == 'GET':
-        requested_user = request.user
-        if income.owner == requested_user:
-            return render(request, 'income/edit_income.html', context)
-        else:
-            return redirect('income')
+        return render(request, 'income/edit_income.html', context)
     if request.method == 'POST':
         amount = request.POST['amount']
 
         description = request.POST['description']
         date = request.POST['income_date']
-        source = request.POST['source']
+        source = request.POST.get('source', '')
 
+        if lookup(Source).get(source) is None:
+            messages.error(request, 'Choose a source')
+            return render(request, 'income/edit_income.html', context)
+        currency = request.POST.get('currency') or income.currency
+        if currency not in settings.CURRENCIES:
+            messages.error(request, 'Choose a currency')
+            return render(request, 'income/edit_income.html', context)
+        try:
+            to_minor(amount, currency)
+        except ValidationError:
+            messages.error(request, 'Amount must be a number')
+            return render(request, 'income/edit_income.html', context)
+
+        income.currency = currency
         income.amount = amount
         income. date = date
-        income.source = source
+        income.source_id = source
         income.description = description
 
         income.save()
@@ -92,37 +212,58 @@ def income_edit(request, id):
         return redirect('income')
 
 
+@login_required(login_url='/auth/login')
 def delete_income(request, id):
-    income = UserIncome.objects.get(pk=id)
-    requested_user = request.user
-    if income.owner == requested_user:
-        income.delete()
+    income = UserIncome.objects.for_owner(request.user).filter(pk=id).first()
+    if income is not None:
+        income.soft_delete()
         messages.success(request, 'Income removed')
     return redirect('income')
 
 
-def income_source_summary(request):
-    todays_date = datetime.date.today()
-    six_months_ago = todays_date-datetime.timedelta(days=30*6)
-    incomes = UserIncome.objects.filter(owner=request.user, date__gte=six_months_ago, date__lte=todays_date)
-    finalrep = {}
+@async_login_required
+@read_replica
+async def income_source_summary(request):
+    return await database_sync_to_async(source_summary)(request)
+
+
+@cache_per_user('income_source_summary')
+def source_summary(request):
+    currency = base_currency(request.user.pk)
+    incomes = UserIncome.objects.for_owner(request.user)
+    rollups = IncomeRollup.objects.filter(owner=request.user)
+    unconverted = {}
+    try:
+        start, end = date_window(request.GET)
+        finalrep = totals_by(incomes, 'source', start, end, rollups, label='source__name', currency=currency,
+                             unconverted=unconverted)
+    except (ValueError, OverflowError) as ex:
+        return JsonResponse({'error': str(ex)}, status=400)
+
+    # Amounts of days without an exchange rate yet are reported apart.
+    return JsonResponse({'income_source_data': finalrep, 'currency': currency, 'unconverted': unconverted,
+                         'complete': not unconverted, 'start': start, 'end': end}, safe=False)
 
-    def get_source(income):
-        return income.source
-    source_list = list(set(map(get_source, incomes)))
 
-    def get_income_source_amount(source):
-        amount = 0
-        filtered_by_source = incomes.filter(source=source)
-        for item in filtered_by_source:
-            amount += item.amount
-        return amount
+@async_login_required
+@read_replica
+async def income_trend(request):
+    return await database_sync_to_async(income_trend_response)(request)
 
-    for x in incomes:
-        for y in source_list:
-            finalrep[y] = get_income_source_amount(y)
 
-    return JsonResponse({'income_source_data': finalrep}, safe=False)
+@cache_per_user('income_trend')
+def income_trend_response(request):
+    currency = base_currency(request.user.pk)
+    unconverted = {}
+    try:
+        start, end = date_window(request.GET)
+        granularity, points = trend(UserIncome.objects.for_owner(request.user), start, end,
+                                    request.GET.get('granularity') or 'day', parse_points(request.GET.get('points')),
+                                    currency=currency, unconverted=unconverted)
+    except (ValueError, OverflowError) as ex:
+        return JsonResponse({'error': str(ex)}, status=400)
+    return JsonResponse({'granularity': granularity, 'points': points, 'currency': currency,
+                         'unconverted': unconverted, 'complete': not unconverted, 'start': start, 'end': end})
 
 
 def stats_view(request):
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import ExchangeRate, UserPreference
+
+
+class UserPreferenceAdmin(admin.ModelAdmin):
+    list_display = ('user', 'currency',)
+    list_select_related = ('user',)
+
+
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('date', 'base', 'quote', 'rate',)
+    list_filter = ('base', 'quote',)
+    date_hierarchy = 'date'
+
+
+admin.site.register(UserPreference, UserPreferenceAdmin)
+admin.site.register(ExchangeRate, ExchangeRateAdmin)
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
+
+
+class UserpreferencesConfig(AppConfig):
+    name = 'userpreferences'
+
+    def ready(self):
+        from main.fx import preference_changed
+        from .models import UserPreference
+        post_save.connect(preference_changed, sender=UserPreference, dispatch_uid='base_currency_post_save')
+        post_delete.connect(preference_changed, sender=UserPreference, dispatch_uid='base_currency_post_delete')
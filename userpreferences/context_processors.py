@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from main.fx import base_currency
+
+
+def currency(request):
+    """The user's base currency, looked up only if a template uses it, and the currencies to choose from."""
+    def user_currency():
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return settings.DEFAULT_CURRENCY
+        return base_currency(user.pk)
+
+    return {'currency': SimpleLazyObject(user_currency), 'currencies': settings.CURRENCIES}
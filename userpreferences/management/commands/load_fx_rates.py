@@ -0,0 +1,55 @@
+import csv
+import datetime
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.cache import bump_rates_version
+from userpreferences.models import ExchangeRate
+
+# Dates per DELETE, within the query parameter limit of SQLite.
+DELETE_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Load exchange rates from a CSV file with a date,base,quote,rate header; '
+            'a rate already loaded for the same pair and date is replaced.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='CSV file of rates, one base/quote pair and date per line.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['file'], newline='', encoding='utf-8') as handle:
+                rows = [self.parse(line, row) for line, row in enumerate(csv.DictReader(handle), start=2)]
+        except OSError as ex:
+            raise CommandError(ex)
+        rows = list({(row.base, row.quote, row.date): row for row in rows}.values())
+        dates = defaultdict(list)
+        for row in rows:
+            dates[row.base, row.quote].append(row.date)
+        with transaction.atomic():
+            for (base, quote), pair_dates in dates.items():
+                for start in range(0, len(pair_dates), DELETE_BATCH_SIZE):
+                    ExchangeRate.objects.filter(base=base, quote=quote,
+                                                date__in=pair_dates[start:start + DELETE_BATCH_SIZE]).delete()
+            ExchangeRate.objects.bulk_create(rows, batch_size=500)
+        bump_rates_version()
+        self.stdout.write(self.style.SUCCESS('Loaded %d rates' % len(rows)))
+
+    def parse(self, line, row):
+        try:
+            date = datetime.date.fromisoformat((row.get('date') or '').strip())
+            rate = Decimal((row.get('rate') or '').strip())
+        except (InvalidOperation, ValueError):
+            raise CommandError('line %d: expected a YYYY-MM-DD date and a numeric rate' % line)
+        base, quote = ((row.get(field) or '').strip().upper() for field in ('base', 'quote'))
+        for code in (base, quote):
+            if code not in settings.CURRENCIES:
+                raise CommandError('line %d: unknown currency %r' % (line, code))
+        if base == quote or not rate.is_finite() or rate <= 0:
+            raise CommandError('line %d: expected a positive rate between two currencies' % line)
+        return ExchangeRate(date=date, base=base, quote=quote, rate=rate)
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import models
+
+from main.money import validate_currency
+
+
+class UserPreference(models.Model):
+    user = models.OneToOneField(to=User, on_delete=models.CASCADE, related_name='preference')
+    currency = models.CharField(max_length=3, default=settings.DEFAULT_CURRENCY, validators=[validate_currency])
+
+    def __str__(self):
+        return '%s: %s' % (self.user, self.currency)
+
+
+class ExchangeRate(models.Model):
+    """How many units of ``quote`` one unit of ``base`` bought on ``date``; loaded by load_fx_rates."""
+    date = models.DateField()
+    base = models.CharField(max_length=3)
+    quote = models.CharField(max_length=3)
+    rate = models.DecimalField(max_digits=24, decimal_places=10)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['base', 'quote', 'date'], name='exchange_rate_unique'),
+        ]
+
+    def __str__(self):
+        return '%s %s/%s %s' % (self.date, self.base, self.quote, self.rate)
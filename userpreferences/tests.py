@@ -0,0 +1,174 @@
+import datetime
+import os
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from expenses.models import Category, Expense, ExpenseRollup
+from main.fx import base_currency, foreign_rollups, rates
+from userincome.models import Source, UserIncome
+from userpreferences.models import ExchangeRate, UserPreference
+
+
+def load_rates(text):
+    handle, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(handle, 'w') as rates_file:
+        rates_file.write(text)
+    try:
+        call_command('load_fx_rates', path, stdout=open(os.devnull, 'w'))
+    finally:
+        os.remove(path)
+
+
+class TestExchangeRates(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_load_replaces_rates_of_the_same_day(self):
+        load_rates('date,base,quote,rate\n2021-03-01,USD,INR,73.5\n2021-03-02,USD,INR,73.0\n')
+        load_rates('date,base,quote,rate\n2021-03-02,usd,inr,72.75\n')
+        self.assertEqual(list(ExchangeRate.objects.order_by('date').values_list('date', 'rate')),
+                         [(datetime.date(2021, 3, 1), Decimal('73.5')), (datetime.date(2021, 3, 2), Decimal('72.75'))])
+
+    def test_load_deletes_replaced_rates_once_per_pair(self):
+        load_rates('date,base,quote,rate\n2021-03-01,USD,INR,73.5\n2021-03-03,USD,INR,73.1\n')
+        lines = ['2021-03-%02d,%s,INR,%d' % (day, base, 70 + day) for day in range(1, 6) for base in ('USD', 'EUR')]
+        with CaptureQueriesContext(connection) as queries:
+            load_rates('date,base,quote,rate\n' + '\n'.join(lines) + '\n')
+        self.assertEqual(sum(query['sql'].startswith('DELETE') for query in queries), 2)
+        self.assertEqual(ExchangeRate.objects.count(), 10)
+        self.assertEqual(ExchangeRate.objects.get(base='USD', date=datetime.date(2021, 3, 3)).rate, Decimal('73'))
+
+    def test_load_rejects_bad_lines(self):
+        for line in ('2021-03-01,USD,XXX,73', '2021-03-01,USD,INR,0', '2021-13-01,USD,INR,73', '2021-03-01,USD,USD,1'):
+            with self.subTest(line=line), self.assertRaisesMessage(CommandError, 'line 2:'):
+                load_rates('date,base,quote,rate\n' + line + '\n')
+        self.assertFalse(ExchangeRate.objects.exists())
+
+    def test_rate_of_the_latest_day_on_or_before(self):
+        load_rates('date,base,quote,rate\n2021-03-01,USD,INR,73.5\n2021-03-05,USD,INR,72\n')
+        march = [datetime.date(2021, 3, day) for day in (1, 4, 5, 9)]
+        found = rates((day, 'USD', 'INR') for day in march)
+        self.assertEqual([found[(day, 'USD', 'INR')] for day in march],
+                         [Decimal('73.5'), Decimal('73.5'), Decimal('72'), Decimal('72')])
+        inverse = rates([(march[0], 'INR', 'USD')])[(march[0], 'INR', 'USD')]
+        self.assertEqual(round(inverse, 6), round(1 / Decimal('73.5'), 6))
+        with self.assertNumQueries(0):
+            rates((day, 'USD', 'INR') for day in march)
+        self.assertEqual(rates([(datetime.date(2021, 2, 28), 'USD', 'INR')]), {})
+
+    def test_loading_rates_expires_cached_rates(self):
+        load_rates('date,base,quote,rate\n2021-03-01,EUR,INR,88\n')
+        day = datetime.date(2021, 3, 1)
+        self.assertEqual(rates([(day, 'EUR', 'INR')])[(day, 'EUR', 'INR')], Decimal('88'))
+        load_rates('date,base,quote,rate\n2021-03-01,EUR,INR,87.25\n')
+        self.assertEqual(rates([(day, 'EUR', 'INR')])[(day, 'EUR', 'INR')], Decimal('87.25'))
+
+
+@override_settings(ASYNC_DB_THREAD_SENSITIVE=True)
+class TestCurrencyTotals(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('sahil', 'sahilharpal1234@gmail.com', 'password123')
+        self.client.login(username='sahil', password='password123')
+        self.rent = Category.objects.create(name='RENT')
+        self.salary = Source.objects.create(name='SALARY')
+        load_rates('date,base,quote,rate\n2021-03-01,USD,INR,70\n2021-03-15,USD,INR,80\n2021-03-01,JPY,INR,0.5\n')
+        for amount, currency, day in [(100, 'INR', 2), (10, 'USD', 2), (1, 'USD', 20), (999, 'JPY', 3)]:
+            Expense.objects.create(amount=amount, currency=currency, description='x', category=self.rent,
+                                   date=datetime.date(2021, 3, day), owner=self.user)
+        self.window = {'start': '2021-03-01', 'end': '2021-03-31'}
+
+    def test_summary_converts_each_day_at_its_rate(self):
+        response = self.client.get(reverse('expense_category_summary'), self.window)
+        # 100 + 10 * 70 + 1 * 80 + 999 * 0.5
+        self.assertEqual(response.json(), dict(self.window, expense_category_data={'RENT': '1379.50'},
+                                               currency='INR', unconverted={}, complete=True))
+
+    def test_trend_in_the_preferred_currency(self):
+        UserPreference.objects.create(user=self.user, currency='USD')
+        load_rates('date,base,quote,rate\n2021-03-01,USD,JPY,140\n')
+        response = self.client.get(reverse('expense_trend'), dict(self.window, granularity='month'))
+        self.assertEqual(response.json()['currency'], 'USD')
+        # 100 / 70 + 10 + 1 + 999 / 140
+        self.assertEqual(response.json()['points'], [{'date': '2021-03-01', 'total': '19.56', 'count': 4}])
+
+    def test_amounts_without_a_rate_are_reported_apart(self):
+        for amount, day in [(5, 4), (2.5, 28)]:
+            Expense.objects.create(amount=amount, currency='GBP', description='x', category=self.rent,
+                                   date=datetime.date(2021, 3, day), owner=self.user)
+        summary = self.client.get(reverse('expense_category_summary'), self.window).json()
+        self.assertEqual((summary['expense_category_data'], summary['unconverted'], summary['complete']),
+                         ({'RENT': '1379.50'}, {'GBP': '7.50'}, False))
+        trend = self.client.get(reverse('expense_trend'), dict(self.window, granularity='month')).json()
+        self.assertEqual((trend['points'][0]['total'], trend['unconverted']), ('1379.50', {'GBP': '7.50'}))
+
+        response = self.client.get(reverse('main'))
+        self.assertEqual(response.context['snapshot']['missing_rates'], ['GBP'])
+        self.assertContains(response, 'Totals leave out amounts in GBP')
+
+    def test_changing_the_preference_expires_cached_totals(self):
+        self.assertEqual(base_currency(self.user.pk), 'INR')
+        self.client.get(reverse('expense_category_summary'), self.window)
+        response = self.client.post(reverse('preferences'), {'currency': 'USD'})
+        self.assertRedirects(response, reverse('preferences'))
+        self.assertEqual(base_currency(self.user.pk), 'USD')
+        load_rates('date,base,quote,rate\n2021-03-01,USD,JPY,140\n')
+        response = self.client.get(reverse('expense_category_summary'), self.window)
+        self.assertEqual(response.json()['currency'], 'USD')
+        self.assertEqual(response.json()['expense_category_data'], {'RENT': '19.56'})
+
+    def test_preference_must_be_a_known_currency(self):
+        response = self.client.post(reverse('preferences'), {'currency': 'XXX'})
+        self.assertContains(response, 'Choose a currency')
+        self.assertFalse(UserPreference.objects.exists())
+
+    def test_dashboard_includes_other_currencies(self):
+        UserIncome.objects.create(amount=20, currency='USD', description='x', source=self.salary,
+                                  date=datetime.date(2021, 3, 16), owner=self.user)
+        response = self.client.get(reverse('main'))
+        snapshot = response.context['snapshot']
+        self.assertEqual(snapshot['currency'], 'INR')
+        self.assertEqual(snapshot['income'], Decimal('1600.00'))
+        # Converted at the rates of the last day of March: 100 + (10 + 1) * 80 + 999 * 0.5
+        self.assertEqual(snapshot['spent'], Decimal('1479.50'))
+        self.assertContains(response, 'Balance (INR)')
+        # One group per month and currency, however many days have rows.
+        groups = foreign_rollups(ExpenseRollup.objects.filter(owner=self.user), 'INR', datetime.date.today())
+        self.assertEqual(sorted((group['month'].isoformat(), group['currency']) for group in groups),
+                         [('2021-03-01', 'JPY'), ('2021-03-01', 'USD')])
+
+    def test_add_expense_in_another_currency(self):
+        self.client.post(reverse('add-expenses'), {'amount': '12.5', 'currency': 'EUR', 'description': 'y',
+                                                   'category': self.rent.pk, 'expense_date': '2021-03-10'})
+        expense = Expense.objects.get(description='y')
+        self.assertEqual((expense.amount, expense.currency), (Decimal('12.50'), 'EUR'))
+
+        response = self.client.post(reverse('add-expenses'), {'amount': '1', 'currency': 'XXX', 'description': 'z',
+                                                              'category': self.rent.pk, 'expense_date': '2021-03-10'})
+        self.assertContains(response, 'Choose a currency')
+
+    def test_api_creates_in_the_preferred_currency(self):
+        UserPreference.objects.create(user=self.user, currency='JPY')
+        batch = {'create': [{'amount': '1200', 'date': '2021-03-10', 'description': 'a', 'category': self.rent.pk},
+                            {'amount': '3.456', 'currency': 'GBP', 'date': '2021-03-10', 'description': 'b',
+                             'category': self.rent.pk}]}
+        response = self.client.post(reverse('api-expenses-batch'), batch, content_type='application/json')
+        self.assertEqual([(row['amount'], row['currency']) for row in response.json()['created']],
+                         [('1200', 'JPY'), ('3.46', 'GBP')])
+
+    def test_forms_offer_the_currencies(self):
+        UserPreference.objects.create(user=self.user, currency='EUR')
+        response = self.client.get(reverse('add-expenses'))
+        self.assertContains(response, '<option value="EUR" selected>EUR</option>', html=True)
+        self.assertContains(response, '<option value="USD" >USD</option>', html=True)
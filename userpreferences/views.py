@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect, render
+
+from .models import UserPreference
+
+
+@login_required(login_url='/auth/login')
+def index(request):
+    if request.method == 'POST':
+        currency = request.POST.get('currency', '')
+        if currency not in settings.CURRENCIES:
+            messages.error(request, 'Choose a currency')
+            return render(request, 'preferences/index.html')
+        UserPreference.objects.update_or_create(user=request.user, defaults={'currency': currency})
+        messages.success(request, 'Preferences saved')
+        return redirect('preferences')
+    return render(request, 'preferences/index.html')